@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Byte Units - parse and format the byte sizes given to and printed by the bench
+tools, e.g. the size bucket edges of plot.py and the cache sizes of
+reuse_distance.py.
+"""
+
+
+def parse_sizes(spec):
+    """
+    Parse a comma-separated list of sizes in bytes.
+
+    Args:
+        spec (str): Sizes, e.g. "65536,1048576,16777216"; empty for none
+
+    Returns:
+        list: Sorted, de-duplicated sizes
+    """
+    return sorted({int(size) for size in spec.split(',') if size.strip()})
+
+
+def format_bytes(num_bytes):
+    """Format a byte count in the largest binary unit up to GiB, e.g. 1.5MiB."""
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if num_bytes < 1024 or unit == 'GiB':
+            return f"{num_bytes:g}{unit}"
+        num_bytes /= 1024
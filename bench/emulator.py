@@ -0,0 +1,633 @@
+#!/usr/bin/env python3
+"""
+Emulator - an in-process stand-in for a SeaweedFS master and volume server.
+
+It speaks just enough of the real protocols for the bench tools and gbprobe:
+
+    master        GET/POST /dir/assign[?count=N&collection=C], GET /dir/lookup?volumeId=N
+    volume        POST/PUT /<fid>[?cm=true] (multipart or raw body), GET /<fid> with Range,
+                  DELETE /<fid>, GET /status; chunk manifest needles (cm=true) are
+                  served as their chunks and delete them, like operation.ChunkManifest
+    volume gRPC   VacuumVolumeCheck, VacuumVolumeCompact, VacuumVolumeCommit and
+                  VacuumVolumeCleanup from gbprobe/volume_server.proto
+
+With replica ports, further volume servers serve the same volumes as replicas:
+/dir/lookup lists every volume on all of them, and writes and deletes through any
+of them apply to all. Replicas may have a read service time of their own, e.g. to
+emulate a replica stalled by a vacuum.
+
+Every request sleeps for a service time drawn from a configurable distribution,
+so client-side overhead can be measured against a server of known speed, with no
+cluster and no network hop. Both servers also answer GET /stats with the number
+of requests served and the service time spent per operation.
+
+Run it, then point run_bench.py or run_test.py at --master http://127.0.0.1:9333
+and gbprobe at --ip 127.0.0.1 --http_port 8080 --grpc_port 18080.
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import signal
+import argparse
+import threading
+from concurrent import futures
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# The generated gRPC modules live next to gbprobe; gRPC support is optional.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gbprobe'))
+try:
+    import grpc
+    import volume_server_pb2
+    import volume_server_pb2_grpc
+except ImportError:
+    grpc = None
+
+DEFAULT_VOLUME_SIZE_LIMIT_MB = 1000
+DEFAULT_WRITABLE_VOLUMES = 7
+# Bytes reported per VacuumVolumeCompact progress message
+COMPACT_PROGRESS_BYTES = 64 << 20
+# Upload content types the volume server gzips, the common cases of util.IsCompressableFileType
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/xml', 'application/javascript')
+
+
+def parse_service_time(spec):
+    """
+    Parse a service time distribution.
+
+    Args:
+        spec (str): "SECONDS" or "const:SECONDS", "exp:MEAN", "uniform:LOW,HIGH" or
+            "lognormal:MEDIAN,SIGMA", all in seconds
+
+    Returns:
+        callable: Returns one service time in seconds per call
+    """
+    kind, _, params = spec.partition(':')
+    if not params:
+        kind, params = 'const', kind
+    values = [float(value) for value in params.split(',')]
+    if kind == 'const':
+        return lambda: values[0]
+    if kind == 'exp':
+        return lambda: random.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'lognormal':
+        median, sigma = values
+        return lambda: random.lognormvariate(0.0, sigma) * median
+    raise ValueError(f"Unknown service time distribution: {spec}")
+
+
+class ServiceTimes:
+    """Service time distributions per operation, plus an optional transfer bandwidth."""
+
+    def __init__(self, assign='0', write='0', read='0', delete='0', bandwidth=0.0):
+        self.samplers = {name: parse_service_time(spec) for name, spec in
+                         (('assign', assign), ('write', write), ('read', read), ('delete', delete))}
+        self.bandwidth = bandwidth
+
+    def sample(self, operation, num_bytes=0):
+        seconds = self.samplers[operation]() if operation in self.samplers else 0.0
+        if self.bandwidth > 0:
+            seconds += num_bytes / self.bandwidth
+        return seconds
+
+
+class Volume:
+    def __init__(self, volume_id, collection=''):
+        self.id = volume_id
+        self.collection = collection
+        self.size = 0  # bytes written, including deleted needles
+        self.file_count = 0
+        self.delete_count = 0
+        self.deleted_bytes = 0
+        self.read_only = False
+        self.compact_revision = 0
+        self.modified_at = int(time.time())
+        # needle key -> (cookie, data or length, bytes on disk, is chunk manifest)
+        self.needles = {}
+
+    def status(self):
+        return {
+            'Id': self.id, 'Size': self.size, 'ReplicaPlacement': {}, 'Ttl': {}, 'Collection': self.collection,
+            'Version': 3, 'FileCount': self.file_count, 'DeleteCount': self.delete_count,
+            'DeletedByteCount': self.deleted_bytes, 'ReadOnly': self.read_only,
+            'CompactRevision': self.compact_revision, 'ModifiedAtSecond': self.modified_at,
+        }
+
+
+def stored_size(data, content_type):
+    """
+    Bytes a needle takes on disk: like the volume server, uploads of a compressible
+    type are gzipped at the fastest level and kept gzipped when that saves 10%.
+    """
+    if data and content_type and content_type.startswith(COMPRESSIBLE_TYPES):
+        compressed = len(gzip.compress(data, compresslevel=1))
+        if compressed * 10 < len(data) * 9:
+            return compressed
+    return len(data)
+
+
+def format_fid(volume_id, key, cookie):
+    # The needle key is written as whole bytes with leading zero bytes dropped.
+    key_hex = f"{key:x}"
+    key_hex = key_hex.zfill(len(key_hex) + len(key_hex) % 2)
+    return f"{volume_id},{key_hex}{cookie:08x}"
+
+
+def parse_fid(fid):
+    """Return (volume id, needle key, cookie) of a fid, or None if it is malformed."""
+    volume_id, _, needle = fid.partition(',')
+    # "<fid>_<delta>" names the needle delta keys after an assign with count > 1.
+    needle, _, delta = needle.partition('_')
+    try:
+        return int(volume_id), int(needle[:-8], 16) + int(delta or 0), int(needle[-8:], 16)
+    except ValueError:
+        return None
+
+
+class VolumeStore:
+    """
+    Volumes of the emulated cluster.
+
+    Every collection has its own writable volumes, created on its first assign.
+    Assignment is round-robin over them; a volume that has reached the size limit
+    turns read-only and a new volume of the collection takes its place.
+    """
+
+    def __init__(self, size_limit, writable_volumes, keep_data=True):
+        self.size_limit = size_limit
+        self.writable_volumes = writable_volumes
+        self.keep_data = keep_data
+        self.lock = threading.Lock()
+        self.volumes = {}
+        self.next_volume_id = 1
+        # collection -> writable volumes, and the slot of the next assign
+        self.writable = {'': [self._create_volume('') for _ in range(writable_volumes)]}
+        self.next_slot = {'': 0}
+        self.next_key = 1
+
+    def _create_volume(self, collection):
+        volume = self.volumes[self.next_volume_id] = Volume(self.next_volume_id, collection)
+        self.next_volume_id += 1
+        return volume
+
+    def assign(self, count=1, collection=''):
+        """Reserve count consecutive needle keys on a writable volume; returns the fid of the first."""
+        with self.lock:
+            writable = self.writable.get(collection)
+            if writable is None:
+                writable = self.writable[collection] = [self._create_volume(collection)
+                                                        for _ in range(self.writable_volumes)]
+            slot = self.next_slot.get(collection, 0)
+            self.next_slot[collection] = (slot + 1) % len(writable)
+            volume = writable[slot]
+            if volume.size >= self.size_limit:
+                volume.read_only = True
+                volume = writable[slot] = self._create_volume(collection)
+            key = self.next_key
+            self.next_key += count
+        return format_fid(volume.id, key, random.getrandbits(32))
+
+    def write(self, fid, data, disk_size=None, manifest=False):
+        parsed = parse_fid(fid)
+        if parsed is None:
+            return None
+        volume_id, key, cookie = parsed
+        with self.lock:
+            volume = self.volumes.get(volume_id)
+            if volume is None:
+                return None
+            disk_size = len(data) if disk_size is None else disk_size
+            # Manifests are always kept: reading and deleting the object needs them.
+            volume.needles[key] = (cookie, data if self.keep_data or manifest else len(data), disk_size, manifest)
+            volume.size += disk_size
+            volume.file_count += 1
+            volume.modified_at = int(time.time())
+        return len(data)
+
+    def read(self, fid):
+        parsed = parse_fid(fid)
+        if parsed is None:
+            return None
+        volume_id, key, cookie = parsed
+        with self.lock:
+            volume = self.volumes.get(volume_id)
+            needle = volume.needles.get(key) if volume else None
+        if needle is None or needle[0] != cookie:
+            return None
+        data = needle[1]
+        return data if isinstance(data, bytes) else bytes(data)
+
+    def read_manifest(self, fid):
+        """Return the parsed chunk manifest stored at fid, or None if fid is no manifest."""
+        parsed = parse_fid(fid)
+        if parsed is None:
+            return None
+        volume_id, key, cookie = parsed
+        with self.lock:
+            volume = self.volumes.get(volume_id)
+            needle = volume.needles.get(key) if volume else None
+        if needle is None or needle[0] != cookie or not needle[3]:
+            return None
+        manifest = json.loads(needle[1])
+        manifest['chunks'] = sorted(manifest.get('chunks') or [], key=lambda chunk: chunk['offset'])
+        return manifest
+
+    def read_chunked(self, manifest):
+        """Assemble the object of a chunk manifest, or None if a chunk is missing."""
+        parts = []
+        for chunk in manifest['chunks']:
+            data = self.read(chunk['fid'])
+            if data is None:
+                return None
+            parts.append(data)
+        return b''.join(parts)
+
+    def delete(self, fid):
+        parsed = parse_fid(fid)
+        if parsed is None:
+            return None
+        volume_id, key, cookie = parsed
+        with self.lock:
+            volume = self.volumes.get(volume_id)
+            needle = volume.needles.get(key) if volume else None
+            if needle is None or needle[0] != cookie:
+                return None
+            del volume.needles[key]
+            size = needle[2]
+            volume.delete_count += 1
+            volume.deleted_bytes += size
+            volume.modified_at = int(time.time())
+        return size
+
+    def garbage_ratio(self, volume_id):
+        with self.lock:
+            volume = self.volumes.get(volume_id)
+            if volume is None or volume.size == 0:
+                return 0.0
+            return volume.deleted_bytes / volume.size
+
+    def commit(self, volume_id):
+        """Drop the deleted bytes of a compacted volume; return (is_read_only, volume_size)."""
+        with self.lock:
+            volume = self.volumes[volume_id]
+            volume.size -= volume.deleted_bytes
+            volume.deleted_bytes = 0
+            volume.delete_count = 0
+            volume.compact_revision += 1
+            return volume.read_only, volume.size
+
+    def status(self):
+        with self.lock:
+            return [volume.status() for volume in self.volumes.values()]
+
+
+class RequestStats:
+    """Requests served and service time spent per operation."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.service_seconds = {}
+
+    def record(self, operation, seconds):
+        with self.lock:
+            self.counts[operation] = self.counts.get(operation, 0) + 1
+            self.service_seconds[operation] = self.service_seconds.get(operation, 0.0) + seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {operation: {'count': count, 'service_seconds': self.service_seconds[operation]}
+                    for operation, count in self.counts.items()}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; like Go servers, send them without Nagle delays.
+    disable_nagle_algorithm = True
+    cluster = None
+    # Overrides the cluster's service times for this server
+    service_times = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_bytes(self, status, data, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _serve(self, operation, num_bytes=0):
+        """Sleep for the operation's service time and account for it."""
+        seconds = (self.service_times or self.cluster.service_times).sample(operation, num_bytes)
+        if seconds > 0:
+            time.sleep(seconds)
+        self.cluster.stats.record(operation, seconds)
+
+
+class MasterHandler(_Handler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/dir/assign':
+            self._serve('assign')
+            query = parse_qs(url.query)
+            count = query.get('count', ['1'])[0]
+            count = max(1, int(count)) if count.isdigit() else 1
+            fid = self.cluster.store.assign(count, query.get('collection', [''])[0])
+            address = self.cluster.volume_address
+            self._send_json(200, {'fid': fid, 'url': address, 'publicUrl': address, 'count': count})
+        elif url.path == '/dir/lookup':
+            volume_id = parse_qs(url.query).get('volumeId', [''])[0].split(',')[0]
+            if volume_id.isdigit() and int(volume_id) in self.cluster.store.volumes:
+                locations = [{'url': address, 'publicUrl': address} for address in self.cluster.volume_addresses]
+                self._send_json(200, {'volumeId': volume_id, 'locations': locations})
+            else:
+                self._send_json(404, {'volumeId': volume_id, 'error': 'volume id not found'})
+        elif url.path == '/stats':
+            self._send_json(200, self.cluster.stats.snapshot())
+        else:
+            self._send_json(404, {'error': f'unknown path {url.path}'})
+
+    do_POST = do_GET
+
+
+class VolumeHandler(_Handler):
+    def _read_upload(self):
+        """Return the uploaded bytes and their content type."""
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        content_type = self.headers.get('Content-Type', '')
+        if not content_type.startswith('multipart/form-data'):
+            return body, content_type
+        # First part of the form: its content follows the part headers.
+        boundary = content_type.split('boundary=', 1)[1].strip('"').encode()
+        start = body.index(b'\r\n\r\n') + 4
+        part_type = ''
+        for header in body[:start].decode('latin-1').split('\r\n'):
+            name, _, value = header.partition(':')
+            if name.strip().lower() == 'content-type':
+                part_type = value.strip()
+        return body[start:body.rindex(b'\r\n--' + boundary)], part_type
+
+    def do_POST(self):
+        data, content_type = self._read_upload()
+        url = urlparse(self.path)
+        fid = url.path.lstrip('/')
+        manifest = parse_qs(url.query).get('cm', [''])[0] == 'true'
+        self._serve('write', len(data))
+        size = self.cluster.store.write(fid, data, stored_size(data, content_type), manifest)
+        if size is None:
+            self._send_json(404, {'error': f'volume of {fid} not found'})
+        else:
+            self._send_json(201, {'name': 'file', 'size': size})
+
+    do_PUT = do_POST
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path
+        if path == '/status':
+            self._send_json(200, {'Version': 'emulator', 'Volumes': self.cluster.store.status()})
+            return
+        if path == '/stats':
+            self._send_json(200, self.cluster.stats.snapshot())
+            return
+        fid = path.lstrip('/')
+        manifest = None
+        if parse_qs(url.query).get('cm', [''])[0] != 'false':
+            manifest = self.cluster.store.read_manifest(fid)
+        if manifest is not None:
+            data = self.cluster.store.read_chunked(manifest)
+        else:
+            data = self.cluster.store.read(fid)
+        if data is None:
+            self._serve('read')
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        byte_range = parse_range(self.headers.get('Range'), len(data))
+        if byte_range is None:
+            self._serve('read', len(data))
+            self._send_bytes(200, data)
+        else:
+            start, end = byte_range
+            self._serve('read', end - start + 1)
+            self._send_bytes(206, data[start:end + 1],
+                             [('Content-Range', f'bytes {start}-{end}/{len(data)}')])
+
+    def do_DELETE(self):
+        self._serve('delete')
+        fid = urlparse(self.path).path.lstrip('/')
+        manifest = self.cluster.store.read_manifest(fid)
+        if manifest is not None:
+            # Like the volume server, delete the chunks before their manifest.
+            for chunk in manifest['chunks']:
+                self.cluster.store.delete(chunk['fid'])
+        size = self.cluster.store.delete(fid)
+        if size is None:
+            self._send_json(404, {'error': 'not found'})
+        else:
+            self._send_json(202, {'size': size})
+
+
+def parse_range(header, length):
+    """Return the inclusive (start, end) of a "bytes=" Range header, or None for the whole object."""
+    if not header or not header.startswith('bytes='):
+        return None
+    start, _, end = header[len('bytes='):].split(',')[0].partition('-')
+    if not start:
+        start, end = max(length - int(end), 0), length - 1
+    else:
+        start, end = int(start), min(int(end), length - 1) if end else length - 1
+    return (start, end) if start <= end else None
+
+
+if grpc is not None:
+    class VacuumServicer(volume_server_pb2_grpc.VolumeServerServicer):
+        """The vacuum methods of the VolumeServer service, over the emulated volumes."""
+
+        def __init__(self, cluster):
+            self.cluster = cluster
+
+        def VacuumVolumeCheck(self, request, context):
+            return volume_server_pb2.VacuumVolumeCheckResponse(
+                garbage_ratio=self.cluster.store.garbage_ratio(request.volume_id))
+
+        def VacuumVolumeCompact(self, request, context):
+            store = self.cluster.store
+            if request.volume_id not in store.volumes:
+                context.abort(grpc.StatusCode.NOT_FOUND, f"volume {request.volume_id} not found")
+            live_bytes = store.volumes[request.volume_id].size - store.volumes[request.volume_id].deleted_bytes
+            processed = 0
+            while True:
+                step = min(COMPACT_PROGRESS_BYTES, live_bytes - processed)
+                if self.cluster.compact_rate > 0:
+                    time.sleep(step / self.cluster.compact_rate)
+                processed += step
+                yield volume_server_pb2.VacuumVolumeCompactResponse(processed_bytes=processed,
+                                                                    load_avg_1m=os.getloadavg()[0])
+                if processed >= live_bytes:
+                    break
+
+        def VacuumVolumeCommit(self, request, context):
+            if request.volume_id not in self.cluster.store.volumes:
+                context.abort(grpc.StatusCode.NOT_FOUND, f"volume {request.volume_id} not found")
+            is_read_only, volume_size = self.cluster.store.commit(request.volume_id)
+            return volume_server_pb2.VacuumVolumeCommitResponse(is_read_only=is_read_only, volume_size=volume_size)
+
+        def VacuumVolumeCleanup(self, request, context):
+            return volume_server_pb2.VacuumVolumeCleanupResponse()
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping a connection, e.g. to cancel a hedged read, are not server errors.
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class LocalCluster:
+    """
+    Master, volume server and optional vacuum gRPC service running in this process.
+
+    Ports of 0 pick free ports; the bound addresses are available once started.
+    """
+
+    def __init__(self, host='127.0.0.1', master_port=9333, volume_port=8080, grpc_port=18080,
+                 size_limit=DEFAULT_VOLUME_SIZE_LIMIT_MB * 1024 * 1024, writable_volumes=DEFAULT_WRITABLE_VOLUMES,
+                 service_times=None, compact_rate=0.0, keep_data=True, replica_ports=(), replica_service_times=None):
+        self.host = host
+        self.store = VolumeStore(size_limit, writable_volumes, keep_data)
+        self.service_times = service_times or ServiceTimes()
+        self.compact_rate = compact_rate
+        self.stats = RequestStats()
+        self._ports = (master_port, volume_port, grpc_port)
+        self._replica_ports = tuple(replica_ports)
+        self.replica_service_times = replica_service_times
+        self._servers = []
+        self._grpc_server = None
+        self.grpc_port = None
+
+    def _start_http(self, handler, port, service_times=None):
+        attributes = {'cluster': self, 'service_times': service_times}
+        server = _HTTPServer((self.host, port), type(handler.__name__, (handler,), attributes))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self._servers.append(server)
+        return server.server_address[1]
+
+    def start(self):
+        master_port, volume_port, grpc_port = self._ports
+        self.volume_port = self._start_http(VolumeHandler, volume_port)
+        self.volume_address = f"{self.host}:{self.volume_port}"
+        # Every volume is on all of these, the first taking the assigned writes
+        self.volume_addresses = [self.volume_address] + [
+            f"{self.host}:{self._start_http(VolumeHandler, port, self.replica_service_times)}"
+            for port in self._replica_ports]
+        self.master_port = self._start_http(MasterHandler, master_port)
+        self.master_url = f"http://{self.host}:{self.master_port}"
+        if grpc is not None and grpc_port is not None:
+            self._grpc_server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+            volume_server_pb2_grpc.add_VolumeServerServicer_to_server(VacuumServicer(self), self._grpc_server)
+            self.grpc_port = self._grpc_server.add_insecure_port(f"{self.host}:{grpc_port}")
+            self._grpc_server.start()
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+        if self._grpc_server is not None:
+            self._grpc_server.stop(grace=None)
+            self._grpc_server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def print_stats(stats):
+    if not stats:
+        print("No requests served")
+    for operation, counters in sorted(stats.items()):
+        count = counters['count']
+        print(f"{operation}: {count} requests, mean service time "
+              f"{counters['service_seconds'] / count * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local stand-in for a SeaweedFS master and volume server')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--master_port', type=int, default=9333, help='Master HTTP port')
+    parser.add_argument('--volume_port', type=int, default=8080, help='Volume server HTTP port')
+    parser.add_argument('--grpc_port', type=int, default=18080, help='Volume server gRPC port')
+    parser.add_argument('--volume_size_limit_mb', type=int, default=DEFAULT_VOLUME_SIZE_LIMIT_MB,
+                        help='Volume size limit in MB')
+    parser.add_argument('--writable_volumes', type=int, default=DEFAULT_WRITABLE_VOLUMES,
+                        help='Number of volumes taking writes at any time')
+    parser.add_argument('--assign_time', default='0', help='Service time of /dir/assign, e.g. exp:0.0005')
+    parser.add_argument('--write_time', default='0', help='Service time of a needle write')
+    parser.add_argument('--read_time', default='0', help='Service time of a needle read')
+    parser.add_argument('--delete_time', default='0', help='Service time of a needle delete')
+    parser.add_argument('--bandwidth', type=float, default=0.0,
+                        help='Transfer bandwidth in bytes per second added to reads and writes (0: unlimited)')
+    parser.add_argument('--compact_rate', type=float, default=0.0,
+                        help='Compaction speed in bytes per second (0: instant)')
+    parser.add_argument('--replica_ports', type=int, nargs='*', default=[],
+                        help='Ports of further volume servers holding replicas of every volume')
+    parser.add_argument('--replica_read_time',
+                        help='Service time of a needle read on the replica volume servers (default: --read_time)')
+    parser.add_argument('--discard_data', action='store_true',
+                        help='Keep only needle sizes and serve zero bytes, to emulate large traces in little memory')
+
+    args = parser.parse_args()
+    service_times = ServiceTimes(args.assign_time, args.write_time, args.read_time, args.delete_time, args.bandwidth)
+    replica_service_times = None
+    if args.replica_read_time is not None:
+        replica_service_times = ServiceTimes(args.assign_time, args.write_time, args.replica_read_time,
+                                             args.delete_time, args.bandwidth)
+    cluster = LocalCluster(args.host, args.master_port, args.volume_port, args.grpc_port,
+                           args.volume_size_limit_mb * 1024 * 1024, args.writable_volumes, service_times,
+                           args.compact_rate, not args.discard_data, args.replica_ports, replica_service_times)
+    with cluster:
+        print(f"Master listening on {cluster.master_url}")
+        print(f"Volume server listening on http://{cluster.volume_address}")
+        for address in cluster.volume_addresses[1:]:
+            print(f"Replica volume server listening on http://{address}")
+        if cluster.grpc_port:
+            print(f"Volume server gRPC listening on {args.host}:{cluster.grpc_port}")
+        else:
+            print("grpcio is not installed; vacuum gRPC methods are disabled")
+        # Stop on SIGTERM the same way as on Ctrl-C, so the request counts are printed.
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+    print_stats(cluster.stats.snapshot())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Garbage Sim - predict per-volume garbage accumulation from a trace without a cluster.
+
+The simulator replays the PUTs and DELETEs of a trace the way run_bench.py issues
+them against the master: every PUT is a new needle on one of the writable volumes
+(round-robin or random placement), a volume stops taking writes once its size
+limit is reached and a new volume takes its place, and a DELETE frees the needle
+of the most recent PUT of the object. A PUT over a live object leaves the earlier
+needle live, as run_bench does.
+
+The garbage ratio of a volume is deleted bytes over all bytes written to it, like
+VacuumVolumeCheck. It is written as the same "Volumes: {...}" time series
+gbprobe logs, so plot.py and interference.py read the simulated log unchanged.
+
+All steps are array operations: volume rollover is found with a binary search
+per volume, and per-volume totals are binned with bincount.
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+import trace_format
+from get_stats import load_trace, OPERATION_KINDS, PUT, DELETE, OTHER
+
+# SeaweedFS master defaults: -volumeSizeLimitMB=30000
+DEFAULT_VOLUME_SIZE_LIMIT_MB = 30000
+DEFAULT_WRITABLE_VOLUMES = 7
+IO_BUFFER_SIZE = 1 << 20
+
+
+def load_ops(trace_file, use_cache=True):
+    """
+    Load the operations of a trace as arrays.
+
+    Returns:
+        tuple: (timestamps, kinds, object indices, sizes); kinds are get_stats
+        PUT/GET/DELETE/OTHER, object indices are dense with -1 for missing ids and
+        sizes are -1 when missing
+    """
+    if trace_format.is_binary_trace(trace_file):
+        trace = trace_format.BinaryTrace(trace_file)
+        records = trace.records
+        table = np.array([OPERATION_KINDS.get(name, OTHER) for name in trace.op_names], dtype=np.int8)
+        return (np.asarray(records['timestamp']), table[records['op']], records['object'].astype(np.int64),
+                np.where(records['nfields'] >= 4, records['size'], -1))
+
+    trace = load_trace(trace_file, use_cache)
+    operation = trace['operation'].cat
+    table = np.array([OPERATION_KINDS.get(name, OTHER) for name in operation.categories], dtype=np.int8)
+    kinds = table[operation.codes.to_numpy()] if len(table) else np.zeros(len(trace), dtype=np.int8)
+    return (trace['timestamp'].to_numpy(), kinds, trace['object_id'].cat.codes.to_numpy().astype(np.int64),
+            trace['size'].to_numpy())
+
+
+def assign_volumes(put_sizes, writable_volumes, size_limit, placement='round_robin', seed=0):
+    """
+    Place PUTs on volumes.
+
+    Each writable slot holds one volume at a time; a PUT goes to the slot's current
+    volume unless that volume already holds size_limit bytes, in which case a new
+    volume replaces it. Volumes 1..writable_volumes exist from the start and later
+    volumes are numbered in the order they take their first PUT.
+
+    Args:
+        put_sizes (numpy.ndarray): Size of each PUT, in trace order
+        writable_volumes (int): Number of volumes taking writes at any time
+        size_limit (int): Volume size limit in bytes
+        placement (str): 'round_robin' or 'random' choice of slot per PUT
+        seed (int): Random seed for random placement
+
+    Returns:
+        tuple: (volume id of each PUT, first PUT index of each volume id starting at 1,
+        -1 for volumes that exist from the start)
+    """
+    count = len(put_sizes)
+    if placement == 'random':
+        slots = np.random.default_rng(seed).integers(writable_volumes, size=count)
+    else:
+        slots = np.arange(count) % writable_volumes
+    order = np.argsort(slots, kind='stable')
+    slot_starts = np.searchsorted(slots[order], np.arange(writable_volumes + 1))
+
+    volume_of_put = np.empty(count, dtype=np.int64)
+    replacements = []  # (first PUT index, PUT indices) of volumes replacing full ones
+    for slot in range(writable_volumes):
+        puts = order[slot_starts[slot]:slot_starts[slot + 1]]
+        # Bytes the slot's volumes hold before each of its PUTs, counted across rollovers.
+        before = np.cumsum(put_sizes[puts]) - put_sizes[puts]
+        start = 0
+        while start < len(puts):
+            end = max(int(np.searchsorted(before, before[start] + size_limit, side='left')), start + 1)
+            if start == 0:
+                volume_of_put[puts[:end]] = slot + 1
+            else:
+                replacements.append((int(puts[start]), puts[start:end]))
+            start = end
+
+    # Volume ids: the initial volume of slot s is s + 1, later ones follow in creation order.
+    replacements.sort(key=lambda replacement: replacement[0])
+    for volume_id, (_, volume_puts) in enumerate(replacements, writable_volumes + 1):
+        volume_of_put[volume_puts] = volume_id
+    first_put = [-1] * writable_volumes + [first for first, _ in replacements]
+    return volume_of_put, np.array(first_put, dtype=np.int64)
+
+
+def match_deletes(kinds, objects, sizes):
+    """
+    Pair every DELETE with the most recent live PUT of its object.
+
+    Returns:
+        tuple: (indices of the DELETEs that free a needle, index of the PUT each one frees)
+    """
+    events = np.flatnonzero(((kinds == PUT) & (sizes >= 0) | (kinds == DELETE)) & (objects >= 0))
+    events = events[np.argsort(objects[events], kind='stable')]
+    is_put = kinds[events] == PUT
+    same_object = objects[events[1:]] == objects[events[:-1]]
+    # A DELETE frees a needle exactly when the previous event of its object is a PUT.
+    frees = np.flatnonzero(~is_put[1:] & is_put[:-1] & same_object) + 1
+    return events[frees], events[frees - 1]
+
+
+def simulate(trace_file, writable_volumes=DEFAULT_WRITABLE_VOLUMES,
+             size_limit=DEFAULT_VOLUME_SIZE_LIMIT_MB * 1024 * 1024, interval=1.0,
+             placement='round_robin', seed=0, use_cache=True):
+    """
+    Simulate volume fill and garbage accumulation for a trace.
+
+    Returns:
+        tuple: (sample offsets in seconds from the first operation, volume ids,
+        garbage ratio matrix of shape (samples, volumes) with NaN before a volume
+        exists, written bytes matrix of the same shape)
+    """
+    timestamps, kinds, objects, sizes = load_ops(trace_file, use_cache)
+    if not len(timestamps):
+        return np.empty(0), np.empty(0, dtype=np.int64), np.empty((0, 0)), np.empty((0, 0))
+
+    puts = np.flatnonzero((kinds == PUT) & (sizes >= 0))
+    volume_of_put, first_put = assign_volumes(sizes[puts], writable_volumes, size_limit, placement, seed)
+    put_volume = np.full(len(kinds), -1, dtype=np.int64)
+    put_volume[puts] = volume_of_put
+    deletes, freed = match_deletes(kinds, objects, sizes)
+
+    interval_ms = max(int(round(interval * 1000)), 1)
+    start = int(timestamps.min())
+    # Sample k is taken interval * k after the first operation and sees the events before it.
+    bins = (timestamps - start) // interval_ms
+    num_bins = int(bins.max()) + 1
+    num_volumes = len(first_put)
+    written = np.bincount((volume_of_put - 1) * num_bins + bins[puts], weights=sizes[puts],
+                          minlength=num_volumes * num_bins).reshape(num_volumes, num_bins)
+    deleted = np.bincount((put_volume[freed] - 1) * num_bins + bins[deletes], weights=sizes[freed],
+                          minlength=num_volumes * num_bins).reshape(num_volumes, num_bins)
+    written = np.cumsum(written, axis=1).T
+    deleted = np.cumsum(deleted, axis=1).T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratios = np.where(written > 0, deleted / written, 0.0)
+
+    # Volumes show up from the first sample after their first PUT.
+    created_bin = np.where(first_put >= 0, bins[puts[np.maximum(first_put, 0)]], 0)
+    ratios[np.arange(num_bins)[:, None] < created_bin[None, :]] = np.nan
+    offsets = np.arange(1, num_bins + 1) * interval_ms / 1000.0
+    return offsets, np.arange(1, num_volumes + 1), ratios, written
+
+
+def write_garbage_log(output_file, start_time, offsets, volume_ids, ratios):
+    """Write the simulated garbage ratios as gbprobe "Volumes: {...}" log lines."""
+    volume_ids = volume_ids.tolist()
+    with open(output_file, 'w', buffering=IO_BUFFER_SIZE) as f:
+        for offset, row in zip(offsets.tolist(), ratios.tolist()):
+            stamp = start_time + timedelta(seconds=offset)
+            volumes = {volume_id: ratio for volume_id, ratio in zip(volume_ids, row) if ratio == ratio}
+            f.write(f"{stamp:%Y-%m-%d %H:%M:%S},{stamp.microsecond // 1000:03d} Volumes: {volumes}\n")
+
+
+def threshold_crossings(offsets, volume_ids, ratios, threshold):
+    """Offset in seconds at which each volume first exceeds threshold, or None."""
+    above = np.nan_to_num(ratios, nan=0.0) > threshold
+    first = np.argmax(above, axis=0)
+    return {volume_id: (float(offsets[index]) if above[index, column] else None)
+            for column, (volume_id, index) in enumerate(zip(volume_ids.tolist(), first.tolist()))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate per-volume garbage ratios of a trace replay')
+    parser.add_argument('trace_file', help='Path to trace file (text or binary)')
+    parser.add_argument('--output', default='garbage_sim.log', help='Output log file in gbprobe format')
+    parser.add_argument('--volume_size_limit_mb', type=int, default=DEFAULT_VOLUME_SIZE_LIMIT_MB,
+                        help='Volume size limit in MB, as the master -volumeSizeLimitMB')
+    parser.add_argument('--writable_volumes', type=int, default=DEFAULT_WRITABLE_VOLUMES,
+                        help='Number of volumes taking writes at any time')
+    parser.add_argument('--placement', choices=['round_robin', 'random'], default='round_robin',
+                        help='How PUTs are spread over the writable volumes')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for random placement')
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds of trace time between samples')
+    parser.add_argument('--start_time', help='Wall clock time of the first operation, '
+                                             '"YYYY-MM-DD HH:MM:SS" (default: now)')
+    parser.add_argument('--vacuum_threshold', type=float,
+                        help='Report when each volume first exceeds this garbage ratio')
+    parser.add_argument('--no_cache', action='store_true', help='Re-parse the trace instead of using the parse cache')
+
+    args = parser.parse_args()
+    start_time = datetime.strptime(args.start_time, '%Y-%m-%d %H:%M:%S') if args.start_time else datetime.now()
+
+    offsets, volume_ids, ratios, written = simulate(
+        args.trace_file, args.writable_volumes, args.volume_size_limit_mb * 1024 * 1024,
+        args.interval, args.placement, args.seed, not args.no_cache)
+    if not len(offsets):
+        print("Error: No operations found in the trace.")
+        return
+
+    write_garbage_log(args.output, start_time, offsets, volume_ids, ratios)
+    print(f"Simulated {len(volume_ids)} volumes over {offsets[-1]:.0f} s of trace time")
+    for volume_id, ratio, size in zip(volume_ids.tolist(), ratios[-1].tolist(), written[-1].tolist()):
+        print(f"Volume {volume_id}: {size / 1e9:.2f} GB written, final garbage ratio {ratio:.4f}")
+    if args.vacuum_threshold is not None:
+        for volume_id, offset in threshold_crossings(offsets, volume_ids, ratios, args.vacuum_threshold).items():
+            if offset is not None:
+                print(f"Volume {volume_id} exceeds garbage ratio {args.vacuum_threshold} "
+                      f"at {start_time + timedelta(seconds=offset)} ({offset:.0f} s)")
+    print(f"Garbage ratios saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
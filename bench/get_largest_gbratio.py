@@ -1,53 +1,206 @@
 #!/usr/bin/env python3
-import ast
-
-def get_largest_garbage_ratio(log_file_path):
-    max_ratio = -float('inf')
-    max_timestamp = ""
-    max_volume = None
-
-    with open(log_file_path, 'r') as file:
-        for line in file:
-            line = line.strip()
-            if not line:
-                continue
-            # The timestamp is formed by the first two tokens (date and time)
-            tokens = line.split(" ", 2)
-            if len(tokens) < 3:
-                continue
-            timestamp = tokens[0] + " " + tokens[1]
-            # The dictionary is given after the text "Volumes: "
-            try:
-                dict_str = line.split("Volumes: ", 1)[1]
-            except IndexError:
-                continue
+"""
+Analyze gbprobe garbage ratio logs in a single streaming pass.
+
+Besides the largest garbage ratio seen, the analyzer keeps a few counters per
+volume and per time window, so memory does not grow with the length of the log:
+the top-k volumes by peak ratio, the time each volume spent above a threshold,
+its growth rate, and the largest ratio of every window.
+
+The analyzer state is cached next to the log through log_cache.load_state(), so
+later runs only read the lines appended since.
+"""
+
+import argparse
+import heapq
+from datetime import datetime
+import log_cache
+
+VOLUMES_MARKER = " Volumes: {"
+
+
+def parse_probe_line(line):
+    """
+    Parse one gbprobe "Volumes: {...}" line without evaluating it.
+
+    Returns:
+        tuple: (timestamp string, list of (volume, ratio) pairs), or None for other lines
+    """
+    head, marker, body = line.partition(VOLUMES_MARKER)
+    if not marker:
+        return None
+    body = body.rstrip()
+    if not body.endswith('}'):
+        return None
+    volumes = []
+    body = body[:-1]
+    if body:
+        for item in body.split(', '):
+            volume, _, ratio = item.partition(': ')
+            volumes.append((int(volume), float(ratio)))
+    # The timestamp is formed by the last two tokens before the marker (date and time)
+    return ' '.join(head.split()[-2:]), volumes
+
+
+def _parse_time(timestamp):
+    return datetime.fromisoformat(timestamp.replace(',', '.'))
+
+
+class VolumeStats:
+    """Running statistics of one volume."""
+
+    __slots__ = ('peak', 'peak_time', 'last_ratio', 'last_seconds', 'first_seconds',
+                 'seconds_above', 'growth', 'samples')
+
+    def __init__(self, seconds):
+        self.peak = -float('inf')
+        self.peak_time = ""
+        self.last_ratio = None
+        self.last_seconds = seconds
+        self.first_seconds = seconds
+        self.seconds_above = 0.0
+        self.growth = 0.0
+        self.samples = 0
+
+    def growth_per_hour(self):
+        """Ratio accumulated per hour observed; drops after compaction are not counted against it."""
+        elapsed = self.last_seconds - self.first_seconds
+        return self.growth / elapsed * 3600 if elapsed > 0 else 0.0
+
+
+class GarbageAnalyzer:
+    """
+    Streaming analysis of gbprobe samples.
+
+    Args:
+        threshold (float): Garbage ratio above which time is accumulated per volume
+        window (float): Window length in seconds for per-window maxima
+    """
 
+    def __init__(self, threshold=0.3, window=3600.0):
+        self.threshold = threshold
+        self.window = window
+        self.volumes = {}
+        # window index -> (max ratio, volume, timestamp)
+        self.window_maxima = {}
+        self.start = None
+        self.samples = 0
+        self.max_ratio = -float('inf')
+        self.max_timestamp = ""
+        self.max_volume = None
+
+    def add_line(self, line):
+        parsed = parse_probe_line(line)
+        if parsed is not None:
+            self.add_sample(*parsed)
+
+    def add_lines(self, lines):
+        for line in lines:
             try:
-                # Convert the string representation of the dictionary into an actual dictionary
-                volumes = ast.literal_eval(dict_str)
-            except Exception as e:
-                print("Error parsing volumes dictionary on line:", line, "\n", e)
-                continue
+                self.add_line(line)
+            except ValueError as e:
+                print("Error parsing volumes on line:", line.strip(), "\n", e)
 
-            # Check each volume's garbage ratio
-            for volume, ratio in volumes.items():
-                if ratio > max_ratio:
-                    max_ratio = ratio
-                    max_timestamp = timestamp
-                    max_volume = volume
+    def add_sample(self, timestamp, volumes):
+        moment = _parse_time(timestamp)
+        if self.start is None:
+            self.start = moment
+        seconds = (moment - self.start).total_seconds()
+        window = int(seconds // self.window)
+        self.samples += 1
 
-    return max_timestamp, max_volume, max_ratio
+        for volume, ratio in volumes:
+            stats = self.volumes.get(volume)
+            if stats is None:
+                stats = self.volumes[volume] = VolumeStats(seconds)
+            elif stats.last_ratio is not None:
+                # The interval since the previous sample is charged to the previous state.
+                if stats.last_ratio > self.threshold:
+                    stats.seconds_above += seconds - stats.last_seconds
+                if ratio > stats.last_ratio:
+                    stats.growth += ratio - stats.last_ratio
+            stats.last_ratio = ratio
+            stats.last_seconds = seconds
+            stats.samples += 1
+            if ratio > stats.peak:
+                stats.peak = ratio
+                stats.peak_time = timestamp
+            # The first occurrence of the maximum wins
+            if ratio > self.max_ratio:
+                self.max_ratio = ratio
+                self.max_timestamp = timestamp
+                self.max_volume = volume
+            current = self.window_maxima.get(window)
+            if current is None or ratio > current[0]:
+                self.window_maxima[window] = (ratio, volume, timestamp)
 
-if __name__ == '__main__':
-    import sys
-    if len(sys.argv) < 2:
-        print("Usage: python script.py <log_file>")
+    def top_volumes(self, k):
+        """The k volumes with the highest peak ratio, as (volume, VolumeStats) pairs."""
+        return heapq.nlargest(k, self.volumes.items(), key=lambda item: item[1].peak)
+
+
+def analyze_log(log_file_path, threshold=0.3, window=3600.0, use_cache=True):
+    """
+    Run the analyzer over a gbprobe log.
+
+    Args:
+        log_file_path (str): Path to the gbprobe log
+        threshold (float): Garbage ratio above which time is accumulated per volume
+        window (float): Window length in seconds for per-window maxima
+        use_cache (bool): Reuse and extend the analyzer state cached next to the log
+
+    Returns:
+        GarbageAnalyzer: The analyzer after every line of the log
+    """
+    return log_cache.load_state(log_file_path, f"gbratio-{threshold:g}-{window:g}",
+                                lambda: GarbageAnalyzer(threshold, window), GarbageAnalyzer.add_lines, use_cache)
+
+
+def get_largest_garbage_ratio(log_file_path, use_cache=True):
+    analyzer = analyze_log(log_file_path, use_cache=use_cache)
+    return analyzer.max_timestamp, analyzer.max_volume, analyzer.max_ratio
+
+
+def print_report(analyzer, top_k):
+    print(f"Top {top_k} volumes by peak garbage ratio:")
+    for volume, stats in analyzer.top_volumes(top_k):
+        print(f"  Volume {volume}: peak {stats.peak:.4f} at {stats.peak_time}, "
+              f"above {analyzer.threshold} for {stats.seconds_above:.0f} s, "
+              f"growth {stats.growth_per_hour():.4f}/h")
+    print(f"Maximum garbage ratio per {analyzer.window:g} s window:")
+    for window in sorted(analyzer.window_maxima):
+        ratio, volume, timestamp = analyzer.window_maxima[window]
+        print(f"  Window {window}: {ratio:.4f} on volume {volume} at {timestamp}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyze garbage ratios logged by gbprobe')
+    parser.add_argument('log_file', help='Path to gbprobe log file')
+    parser.add_argument('--top_k', type=int, default=0, help='Report the k volumes with the highest peak ratio')
+    parser.add_argument('--threshold', type=float, default=0.3, help='Garbage ratio for the time-above report')
+    parser.add_argument('--window', type=float, default=3600.0, help='Window length in seconds for per-window maxima')
+    parser.add_argument('--no_cache', action='store_true', help='Re-read the log instead of using the cached analyzer state')
+
+    args = parser.parse_args()
+    try:
+        analyzer = analyze_log(args.log_file, args.threshold, args.window, not args.no_cache)
+    except FileNotFoundError:
+        print(f"Error: File {args.log_file} not found.")
+        return
+
+    if analyzer.max_timestamp:
+        print("Timestamp:", analyzer.max_timestamp)
+        print("Volume:", analyzer.max_volume)
+        print("Garbage Ratio:", analyzer.max_ratio)
     else:
-        log_file = sys.argv[1]
-        timestamp, volume, ratio = get_largest_garbage_ratio(log_file)
-        if timestamp:
-            print("Timestamp:", timestamp)
-            print("Volume:", volume)
-            print("Garbage Ratio:", ratio)
-        else:
-            print("No valid data found in the log file.")
\ No newline at end of file
+        print("No valid data found in the log file.")
+        return
+    if args.top_k > 0:
+        print_report(analyzer, args.top_k)
+
+
+if __name__ == '__main__':
+    # Run through the module, so the cached analyzer state refers to get_largest_gbratio
+    # classes rather than __main__ ones and is shared with importers of the module.
+    import get_largest_gbratio
+    get_largest_gbratio.main()
@@ -1,79 +1,323 @@
 #!/usr/bin/env python3
-import sys
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
 import numpy as np
-from collections import defaultdict
-
-def process_log(filename):
-    total_requests = 0
-    count_get = 0
-    count_put = 0
-    count_delete = 0
-    get_size_total = 0
-    put_size_total = 0
-    deleted_size_total = 0
-
-    # Dictionary to store the most recent PUT size for each object id.
-    put_history = {}
-
-    # Dictionaries to store request counts for each operation keyed by timestamp.
-    time_counts_get = defaultdict(int)
-    time_counts_put = defaultdict(int)
-    time_counts_delete = defaultdict(int)
-
-    with open(filename, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            parts = line.split()
-            if len(parts) < 2:
-                continue
-
-            # The first field is the timestamp.
+import pandas as pd
+import log_cache
+import trace_format
+import id_codec
+
+def parse_trace_lines(lines):
+    """
+    Parse trace lines into a typed DataFrame with one row per counted request.
+
+    Lines without an integer timestamp and an operation are skipped. Missing
+    object ids are stored as None and missing or malformed sizes as -1.
+    """
+    timestamps = []
+    operations = []
+    object_ids = []
+    sizes = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        try:
+            timestamp = int(parts[0])
+        except ValueError:
+            continue
+        size = -1
+        if len(parts) >= 4:
             try:
-                timestamp = int(parts[0])
+                size = int(parts[3])
             except ValueError:
-                continue
-
-            total_requests += 1
-            operation = parts[1]
-
-            if operation == 'REST.PUT.OBJECT':
-                count_put += 1
-                time_counts_put[timestamp] += 1
-                # The data size is in the fourth field.
-                if len(parts) >= 4:
-                    try:
-                        size = int(parts[3])
-                        put_size_total += size
-                        object_id = parts[2]
-                        # Update the record for this object id.
-                        put_history[object_id] = size
-                    except ValueError:
-                        pass
-
-            elif operation == 'REST.GET.OBJECT':
-                count_get += 1
-                time_counts_get[timestamp] += 1
-                # The data size is in the fourth field.
-                if len(parts) >= 4:
-                    try:
-                        size = int(parts[3])
-                        get_size_total += size
-                    except ValueError:
-                        pass
-
-            elif operation == 'REST.DELETE.OBJECT':
-                count_delete += 1
-                time_counts_delete[timestamp] += 1
-                if len(parts) >= 3:
-                    object_id = parts[2]
-                    # Find the most recent PUT for this object.
-                    if object_id in put_history:
-                        deleted_size_total += put_history[object_id]
-                        # Remove the record after deletion.
-                        del put_history[object_id]
+                pass
+        timestamps.append(timestamp)
+        operations.append(parts[1])
+        object_ids.append(parts[2] if len(parts) >= 3 else None)
+        sizes.append(size)
+
+    return pd.DataFrame({
+        'timestamp': np.array(timestamps, dtype=np.int64),
+        'operation': pd.Categorical(operations),
+        'object_id': pd.Categorical(object_ids),
+        'size': np.array(sizes, dtype=np.int64),
+    })
+
+# Operation kinds used by the aggregation; every other operation counts only towards the total.
+OTHER, PUT, GET, DELETE = range(4)
+OPERATION_KINDS = {'REST.PUT.OBJECT': PUT, 'REST.GET.OBJECT': GET, 'REST.DELETE.OBJECT': DELETE}
+DEFAULT_BIN_MS = 1000
+
+def load_trace(filename, use_cache=True):
+    return log_cache.load(filename, 'stats', parse_trace_lines, use_cache)
+
+def _kinds(op_codes, op_names):
+    """Map operation codes to OTHER/PUT/GET/DELETE."""
+    table = np.array([OPERATION_KINDS.get(name, OTHER) for name in op_names], dtype=np.int8)
+    return table[op_codes] if len(table) else np.zeros(len(op_codes), dtype=np.int8)
+
+def _bin_counts(bin_index, mask, num_bins, weights=None):
+    return np.bincount(bin_index[mask], weights=None if weights is None else weights[mask],
+                       minlength=num_bins)[:num_bins]
+
+def aggregate(timestamps, kinds, objects, has_object, sizes, bin_ms=DEFAULT_BIN_MS):
+    """
+    Compute a mergeable partial aggregate over consecutive trace operations.
+
+    Deleted-bytes accounting depends on PUTs that may precede the chunk. Deletes of
+    objects PUT within the chunk are resolved here; for the rest the partial records
+    which objects start with a DELETE and the state every touched object is left in.
+    Object state is kept in sorted key arrays, not in per-object Python objects.
+
+    Args:
+        timestamps (numpy.ndarray): Timestamp of each operation
+        kinds (numpy.ndarray): OTHER/PUT/GET/DELETE kind of each operation
+        objects (numpy.ndarray): uint64 object key of each operation, see id_codec
+        has_object (numpy.ndarray): Whether each operation carries an object id
+        sizes (numpy.ndarray): Size of each operation, -1 when missing
+        bin_ms (int): Heat map bin width in trace milliseconds
+
+    Returns:
+        dict: Partial aggregate, see merge_partials()
+    """
+    is_put = kinds == PUT
+    is_get = kinds == GET
+    is_delete = kinds == DELETE
+    valid_size = sizes >= 0
+
+    partial = {
+        'total': len(kinds),
+        'count_put': int(is_put.sum()),
+        'count_get': int(is_get.sum()),
+        'count_delete': int(is_delete.sum()),
+        'put_size': int(sizes[is_put & valid_size].sum()),
+        'get_size': int(sizes[is_get & valid_size].sum()),
+    }
+
+    # Heat map rows are GET, PUT, DELETE; columns are fixed-width time bins starting at first_bin.
+    bin_index = np.floor_divide(timestamps, bin_ms)
+    first_bin = int(bin_index.min()) if len(bin_index) else 0
+    bin_index = bin_index - first_bin
+    num_bins = int(bin_index.max()) + 1 if len(bin_index) else 0
+    weights = sizes.astype(np.float64)
+    requests = np.zeros((3, num_bins), dtype=np.int64)
+    byte_heat = np.zeros((3, num_bins), dtype=np.float64)
+    for row, mask in enumerate((is_get, is_put, is_delete)):
+        requests[row] = _bin_counts(bin_index, mask, num_bins)
+    byte_heat[0] = _bin_counts(bin_index, is_get & valid_size, num_bins, weights)
+    byte_heat[1] = _bin_counts(bin_index, is_put & valid_size, num_bins, weights)
+
+    # Only PUTs with a valid size and DELETEs with an object id affect the PUT history.
+    # Grouping these events by object (stable, so in trace order within an object), a
+    # DELETE removes the object's most recent PUT exactly when the event before it is
+    # that PUT; a DELETE opening its group is resolved against earlier chunks.
+    events = np.flatnonzero((is_put & valid_size) | (is_delete & has_object))
+    order = np.argsort(objects[events], kind='stable')
+    events = events[order]
+    keys = objects[events]
+    event_is_put = is_put[events]
+    event_sizes = sizes[events]
+    event_bins = bin_index[events]
+    same_object = np.zeros(len(events), dtype=bool)
+    same_object[1:] = keys[1:] == keys[:-1]
+    after_put = np.zeros(len(events), dtype=bool)
+    after_put[1:] = event_is_put[:-1]
+    last_event = np.ones(len(events), dtype=bool)
+    last_event[:-1] = ~same_object[1:]
+
+    resolved = np.flatnonzero(~event_is_put & same_object & after_put)
+    deleted_sizes = event_sizes[resolved - 1]
+    byte_heat[2] = np.bincount(event_bins[resolved], weights=deleted_sizes.astype(np.float64),
+                               minlength=num_bins)[:num_bins]
+    leading = ~event_is_put & ~same_object
+    live = last_event & event_is_put
+
+    partial['first_bin'] = first_bin
+    partial['requests'] = requests
+    partial['bytes'] = byte_heat
+    partial['deleted_size'] = int(deleted_sizes.sum())
+    # Keys in these arrays are sorted and unique.
+    partial['leading_deletes'] = (keys[leading], event_bins[leading] + first_bin)
+    partial['final_live'] = (keys[live], event_sizes[live])
+    partial['final_deleted'] = keys[last_event & ~event_is_put]
+    return partial
+
+def merge_partials(partials, bin_ms=DEFAULT_BIN_MS):
+    """
+    Merge partial aggregates of consecutive chunks, in trace order.
+
+    Returns:
+        dict: Totals with the same counter keys as a partial aggregate, plus the merged
+        heat maps 'requests' and 'bytes' covering bins first_bin onwards
+    """
+    totals = {key: 0 for key in ('total', 'count_put', 'count_get', 'count_delete',
+                                 'put_size', 'get_size', 'deleted_size')}
+    heats = []
+    resolved_bins = []
+    resolved_bytes = []
+    # Most recent PUT size of every object live after the chunks merged so far, sorted by key
+    history_keys = np.empty(0, dtype=np.uint64)
+    history_sizes = np.empty(0, dtype=np.int64)
+    for partial in partials:
+        for key in totals:
+            totals[key] += partial[key]
+        if partial['requests'].shape[1]:
+            heats.append((partial['first_bin'], partial['requests'], partial['bytes']))
+
+        leading_keys, leading_bins = partial['leading_deletes']
+        position = np.minimum(np.searchsorted(history_keys, leading_keys), max(len(history_keys) - 1, 0))
+        found = history_keys[position] == leading_keys if len(history_keys) else np.zeros(len(leading_keys), bool)
+        totals['deleted_size'] += int(history_sizes[position[found]].sum())
+        resolved_bins.append(leading_bins[found])
+        resolved_bytes.append(history_sizes[position[found]])
+
+        live_keys, live_sizes = partial['final_live']
+        # Objects the chunk touched are replaced by their state at the end of the chunk.
+        touched = np.concatenate((leading_keys, partial['final_deleted'], live_keys))
+        keep = ~np.isin(history_keys, touched)
+        history_keys = np.concatenate((history_keys[keep], live_keys))
+        history_sizes = np.concatenate((history_sizes[keep], live_sizes))
+        order = np.argsort(history_keys, kind='stable')
+        history_keys = history_keys[order]
+        history_sizes = history_sizes[order]
+
+    first_bin = min((first for first, _, _ in heats), default=0)
+    num_bins = max((first + heat.shape[1] for first, heat, _ in heats), default=first_bin) - first_bin
+    requests = np.zeros((3, num_bins), dtype=np.int64)
+    byte_heat = np.zeros((3, num_bins), dtype=np.float64)
+    for first, partial_requests, partial_bytes in heats:
+        columns = slice(first - first_bin, first - first_bin + partial_requests.shape[1])
+        requests[:, columns] += partial_requests
+        byte_heat[:, columns] += partial_bytes
+    resolved_bins = np.concatenate(resolved_bins) if resolved_bins else np.empty(0, dtype=np.int64)
+    if len(resolved_bins):
+        np.add.at(byte_heat[2], resolved_bins - first_bin, np.concatenate(resolved_bytes).astype(np.float64))
+
+    totals.update(first_bin=first_bin, bin_ms=bin_ms, requests=requests, bytes=byte_heat)
+    return totals
+
+def _aggregate_frame(trace, bin_ms):
+    """Aggregate a frame from parse_trace_lines(), keyed by id_codec object keys."""
+    operation = trace['operation']
+    kinds = _kinds(operation.cat.codes.to_numpy(), list(operation.cat.categories))
+    # Each distinct id is encoded once; keys are the same in every chunk.
+    object_codes = trace['object_id'].cat.codes.to_numpy()
+    category_keys = id_codec.encode_array(list(trace['object_id'].cat.categories))
+    has_object = object_codes >= 0
+    objects = np.where(has_object, category_keys[np.maximum(object_codes, 0)] if len(category_keys) else 0,
+                       0).astype(np.uint64)
+    return aggregate(trace['timestamp'].to_numpy(), kinds, objects, has_object, trace['size'].to_numpy(), bin_ms)
+
+def _iter_chunk_lines(filename, start, end):
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        position = start
+        for raw in f:
+            if position >= end:
+                break
+            position += len(raw)
+            yield raw.decode('utf-8', errors='replace')
+
+def _aggregate_text_chunk(chunk):
+    filename, start, end, bin_ms = chunk
+    return _aggregate_frame(parse_trace_lines(_iter_chunk_lines(filename, start, end)), bin_ms)
+
+def _aggregate_binary_chunk(chunk):
+    filename, start, stop, bin_ms = chunk
+    trace = trace_format.BinaryTrace(filename)
+    records = trace.records[start:stop]
+    # Interned object indexes are global to the file, so they are valid keys across chunks.
+    return aggregate(np.asarray(records['timestamp']), _kinds(records['op'], trace.op_names),
+                     records['object'].astype(np.uint64), np.ones(len(records), dtype=bool),
+                     np.asarray(records['size']), bin_ms)
+
+def split_text_chunks(filename, num_chunks):
+    """Split a text file into num_chunks (filename, start, end) byte ranges aligned to line boundaries."""
+    size = os.path.getsize(filename)
+    bounds = [0]
+    with open(filename, 'rb') as f:
+        for i in range(1, num_chunks):
+            position = size * i // num_chunks
+            # Reading from the previous byte lands on the next line start, or on position itself
+            # when it already is one.
+            f.seek(max(position - 1, 0))
+            f.readline()
+            bounds.append(max(f.tell(), bounds[-1]))
+    bounds.append(size)
+    return [(filename, start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+def compute_stats(filename, use_cache=True, workers=1, bin_ms=DEFAULT_BIN_MS):
+    """
+    Compute the trace statistics, serially or with a pool of worker processes.
+
+    With more than one worker the trace is split into contiguous chunks (line-aligned
+    byte ranges of a text trace, record ranges of a binary trace) whose partial
+    aggregates are merged in order, giving exactly the serial totals.
+
+    Returns:
+        dict: Totals as returned by merge_partials()
+    """
+    binary = trace_format.is_binary_trace(filename)
+    if workers <= 1:
+        if binary:
+            return merge_partials([_aggregate_binary_chunk((filename, 0, None, bin_ms))], bin_ms)
+        return merge_partials([_aggregate_frame(load_trace(filename, use_cache), bin_ms)], bin_ms)
+
+    if binary:
+        count = len(trace_format.BinaryTrace(filename))
+        bounds = np.linspace(0, count, workers + 1).astype(int)
+        chunks = [(filename, int(start), int(stop), bin_ms) for start, stop in zip(bounds, bounds[1:]) if stop > start]
+        worker = _aggregate_binary_chunk
+    else:
+        chunks = [chunk + (bin_ms,) for chunk in split_text_chunks(filename, workers)]
+        worker = _aggregate_text_chunk
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return merge_partials(executor.map(worker, chunks), bin_ms)
+
+def plot_heatmap(stats, weight='requests', output_file='heatmap.png'):
+    """
+    Plot the binned request heat map.
+
+    Args:
+        stats (dict): Totals from compute_stats()
+        weight (str): 'requests', 'bytes' or 'both' (one panel each)
+        output_file (str): Path to save the plot
+    """
+    panels = ['requests', 'bytes'] if weight == 'both' else [weight]
+    labels = {'requests': 'Number of requests', 'bytes': 'Bytes'}
+    bin_seconds = stats['bin_ms'] / 1000.0
+    num_bins = stats['requests'].shape[1]
+    # Bins are evenly spaced, so the x axis is plain time since the first bin.
+    extent = [0, num_bins * bin_seconds, -0.5, 2.5]
+
+    fig, axes = plt.subplots(len(panels), 1, figsize=(10, 4 * len(panels)), squeeze=False)
+    for ax, panel in zip(axes[:, 0], panels):
+        # Rows are GET, PUT, DELETE; origin 'lower' puts the first row at the bottom.
+        image = ax.imshow(stats[panel], aspect='auto', interpolation='nearest', cmap='viridis',
+                          origin='lower', extent=extent)
+        fig.colorbar(image, ax=ax, label=labels[panel] + ' per bin')
+        ax.set_yticks([0, 1, 2])
+        ax.set_yticklabels(['REST.GET.OBJECT', 'REST.PUT.OBJECT', 'REST.DELETE.OBJECT'])
+        ax.set_xlabel(f"Time since trace timestamp {stats['first_bin'] * stats['bin_ms']} ms (seconds)")
+        ax.set_ylabel("Operation")
+        ax.set_title(f"Heat Map of {labels[panel]} over Time ({bin_seconds:g} s bins)")
+    fig.tight_layout()
+    fig.savefig(output_file)
+    print("Plots saved to "+output_file)
+    plt.show()
+
+def process_log(filename, use_cache=True, workers=1, bin_ms=DEFAULT_BIN_MS, weight='requests'):
+    stats = compute_stats(filename, use_cache, workers, bin_ms)
+    total_requests = stats['total']
+    count_put = stats['count_put']
+    count_get = stats['count_get']
+    count_delete = stats['count_delete']
+    put_size_total = stats['put_size']
+    get_size_total = stats['get_size']
+    deleted_size_total = stats['deleted_size']
 
     # Print the computed statistics.
     print("Total requests:", total_requests)
@@ -84,39 +328,22 @@ def process_log(filename):
     print("Total GET data size:", get_size_total)
     print("Total deleted object size:", deleted_size_total)
 
-    # Create a union of timestamps from all three operation types.
-    union_timestamps = sorted(set(time_counts_get.keys()) | set(time_counts_put.keys()) | set(time_counts_delete.keys()))
-    
-    # For each timestamp in the union, get counts or use 0 if no entry exists.
-    get_counts = [time_counts_get.get(ts, 0) for ts in union_timestamps]
-    put_counts = [time_counts_put.get(ts, 0) for ts in union_timestamps]
-    delete_counts = [time_counts_delete.get(ts, 0) for ts in union_timestamps]
-
-    # Build a 2D array for the heat map where rows are operations and columns are time indexes.
-    # The row order is: GET, PUT, DELETE.
-    data = np.array([get_counts, put_counts, delete_counts])
-
-    # Plot the heat map.
-    plt.figure()
-    # Set origin to 'lower' so that the first row is at the bottom.
-    plt.imshow(data, aspect='auto', interpolation='nearest', cmap='viridis', origin='lower')
-    plt.colorbar(label='Number of requests')
-    # Set y ticks to show operation names.
-    plt.yticks([0, 1, 2], ['REST.GET.OBJECT', 'REST.PUT.OBJECT', 'REST.DELETE.OBJECT'])
-    # Show a subset of x ticks if there are many timestamps.
-    tick_step = max(1, len(union_timestamps) // 10)
-    xtick_positions = list(range(0, len(union_timestamps), tick_step))
-    xtick_labels = [str(union_timestamps[i]) for i in xtick_positions]
-    plt.xticks(xtick_positions, xtick_labels, rotation=45)
-    plt.xlabel("Timestamps (index)")
-    plt.ylabel("Operation")
-    plt.title("Heat Map of Requests over Time")
-    plt.savefig("heatmap.png")
-    print("Plots saved to "+"heatmap.png")
-    plt.show()
+    plot_heatmap(stats, weight)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize a trace and plot a request heat map')
+    parser.add_argument('log_file', help='Path to trace file (text or binary)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for chunked parallel statistics (0 for one per CPU)')
+    parser.add_argument('--no_cache', action='store_true', help='Re-parse the trace instead of using the parse cache')
+    parser.add_argument('--bin_ms', type=int, default=DEFAULT_BIN_MS, help='Heat map time bin width in milliseconds')
+    parser.add_argument('--weight', choices=['requests', 'bytes', 'both'], default='requests',
+                        help='Heat map weighting: request counts, bytes (GET/PUT sizes and deleted object sizes), or both')
+
+    args = parser.parse_args()
+    workers = args.workers if args.workers > 0 else os.cpu_count()
+    process_log(args.log_file, not args.no_cache, workers, args.bin_ms, args.weight)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: {} log_file".format(sys.argv[0]))
-        sys.exit(1)
-    process_log(sys.argv[1])
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Id Codec - compact integer keys for trace object ids.
+
+Object ids in the IBM traces are 16-character hex strings. As dict keys they
+cost a str object plus a dict entry per object; encode() turns them into 64-bit
+integers instead.
+
+Any other id (not hex, not exactly 16 characters, or with upper-case digits) is
+hashed to 64 bits with BLAKE2b. Two distinct canonical ids never share a key, but
+a hashed id can collide with another hashed id or with a canonical id; at 64 bits
+that takes billions of distinct ids to become likely.
+
+Tools that see the whole trace up front keep keys in sorted numpy uint64 arrays
+and look them up with lookup_sorted() (np.searchsorted). IdMap/IdSet are for
+tables updated one key at a time, like the object locations of run_bench: flat
+arrays (an open-addressing table with linear probing) of 9 bytes plus 8 per value
+column per slot, with 1.3 to 2.7 slots per key. Their probing is pure Python,
+about ten times slower than a dict.
+"""
+
+import hashlib
+from array import array
+import numpy as np
+
+MASK64 = (1 << 64) - 1
+# Fibonacci hashing multiplier, spreads sequential and clustered ids over the table
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+
+_EMPTY, _LIVE, _DELETED = 0, 1, 2
+MIN_CAPACITY = 1024
+MAX_LOAD = 0.75
+
+
+def encode(object_id):
+    """
+    Encode an object id (str or bytes) as an unsigned 64-bit integer key.
+
+    Returns:
+        int: int(object_id, 16) for canonical ids of 16 lower-case hex digits,
+        otherwise a 64-bit BLAKE2b hash of the id
+    """
+    # Only canonical ids map to their value: shorter ids would collide with their
+    # zero-padded form and upper-case ones with their lower-case form. isascii()
+    # and isalnum() reject the signs, underscores, whitespace and non-ASCII digits
+    # int() would accept.
+    if (len(object_id) == 16 and object_id.isascii() and object_id.isalnum()
+            and object_id == object_id.lower()):
+        try:
+            return int(object_id, 16)
+        except ValueError:
+            pass
+    if isinstance(object_id, str):
+        object_id = object_id.encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(object_id, digest_size=8).digest(), 'little')
+
+
+def encode_array(object_ids):
+    """Encode a sequence of object ids into a numpy uint64 array."""
+    return np.fromiter((encode(object_id) for object_id in object_ids), dtype=np.uint64, count=len(object_ids))
+
+
+def hash_key(key, seed=0):
+    """
+    Mix a key into a uniformly distributed 64-bit hash (splitmix64 finalizer).
+
+    Unlike the keys themselves, hashes are suitable for spatial sampling: an
+    object is sampled at rate R when hash_key(key) < R * 2**64.
+    """
+    z = (key + seed * _HASH_MULTIPLIER) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+def hash_keys(keys, seed=0):
+    """Vectorized hash_key() over a numpy uint64 array, with one seed or an array of seeds per key."""
+    if np.ndim(seed):
+        # Wraps modulo 2**64 like the masked product of hash_key().
+        offset = np.asarray(seed).astype(np.uint64) * np.uint64(_HASH_MULTIPLIER)
+    else:
+        offset = np.uint64((seed * _HASH_MULTIPLIER) & MASK64)
+    z = np.asarray(keys, dtype=np.uint64) + offset
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def lookup_sorted(sorted_keys, keys):
+    """
+    Find keys in a sorted uint64 key array.
+
+    Returns:
+        numpy.ndarray: Index of every key in sorted_keys, -1 where it is missing
+    """
+    keys = np.asarray(keys, dtype=np.uint64)
+    positions = np.searchsorted(sorted_keys, keys)
+    found = positions < len(sorted_keys)
+    found[found] = sorted_keys[positions[found]] == keys[found]
+    return np.where(found, positions, -1)
+
+
+def sampling_threshold(rate):
+    """Hash threshold below which keys are sampled at rate, or None when every key is."""
+    if rate >= 1:
+        return None
+    return int(rate * (1 << 64))
+
+
+def format_id(key):
+    """Format a key of a 16-character hex id back into the id."""
+    return f"{key:016x}"
+
+
+class IdMap:
+    """
+    Hash table from 64-bit integer keys to fixed-width tuples of int64 values.
+
+    With width 1 values are plain ints. Not thread-safe: callers sharing a map
+    between threads must hold a lock around every access.
+    """
+
+    def __init__(self, width=1, capacity=MIN_CAPACITY):
+        self.width = width
+        self._size = 0
+        self._used = 0  # live and deleted slots
+        self._allocate(max(MIN_CAPACITY, 1 << (int(capacity) - 1).bit_length()))
+
+    def _allocate(self, capacity):
+        self._shift = 64 - (capacity.bit_length() - 1)
+        self._mask = capacity - 1
+        self._keys = array('Q', bytes(8 * capacity))
+        self._values = array('q', bytes(8 * capacity * self.width))
+        self._state = bytearray(capacity)
+
+    def _slot(self, key):
+        return ((key * _HASH_MULTIPLIER) & MASK64) >> self._shift
+
+    def _find(self, key):
+        """Slot holding key, or -1."""
+        keys, state, mask = self._keys, self._state, self._mask
+        slot = self._slot(key)
+        while True:
+            slot_state = state[slot]
+            if slot_state == _EMPTY:
+                return -1
+            if slot_state == _LIVE and keys[slot] == key:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _value(self, slot):
+        if self.width == 1:
+            return self._values[slot]
+        start = slot * self.width
+        return tuple(self._values[start:start + self.width])
+
+    def _resize(self, capacity):
+        keys, values, state, width = self._keys, self._values, self._state, self.width
+        self._allocate(capacity)
+        self._size = self._used = 0
+        for slot in range(len(state)):
+            if state[slot] == _LIVE:
+                self._insert(keys[slot], values[slot * width:(slot + 1) * width])
+
+    def _insert(self, key, values):
+        if (self._used + 1) > MAX_LOAD * (self._mask + 1):
+            # Grow when mostly live, otherwise rebuild in place to drop deleted slots.
+            self._resize((self._mask + 1) * (2 if self._size + 1 > MAX_LOAD / 2 * (self._mask + 1) else 1))
+        keys, state, mask = self._keys, self._state, self._mask
+        slot = self._slot(key)
+        free = -1
+        while True:
+            slot_state = state[slot]
+            if slot_state == _EMPTY:
+                break
+            if slot_state == _LIVE:
+                if keys[slot] == key:
+                    free = slot
+                    break
+            elif free < 0:
+                free = slot
+            slot = (slot + 1) & mask
+        if free < 0:
+            free = slot
+            self._used += 1
+        if state[free] != _LIVE:
+            self._size += 1
+        state[free] = _LIVE
+        keys[free] = key
+        self._values[free * self.width:(free + 1) * self.width] = array('q', values)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __getitem__(self, key):
+        slot = self._find(key)
+        if slot < 0:
+            raise KeyError(key)
+        return self._value(slot)
+
+    def __setitem__(self, key, value):
+        self._insert(key, (value,) if self.width == 1 else value)
+
+    def get(self, key, default=None):
+        slot = self._find(key)
+        return default if slot < 0 else self._value(slot)
+
+    def pop(self, key, default=None):
+        """Remove key and return its value, or default if it is not present."""
+        slot = self._find(key)
+        if slot < 0:
+            return default
+        value = self._value(slot)
+        self._state[slot] = _DELETED
+        self._size -= 1
+        return value
+
+    def __delitem__(self, key):
+        slot = self._find(key)
+        if slot < 0:
+            raise KeyError(key)
+        self._state[slot] = _DELETED
+        self._size -= 1
+
+    def keys(self):
+        keys, state = self._keys, self._state
+        return (keys[slot] for slot in range(len(state)) if state[slot] == _LIVE)
+
+    def items(self):
+        state = self._state
+        return ((self._keys[slot], self._value(slot)) for slot in range(len(state)) if state[slot] == _LIVE)
+
+    def nbytes(self):
+        """Memory held by the table arrays."""
+        return self._keys.itemsize * len(self._keys) + self._values.itemsize * len(self._values) + len(self._state)
+
+
+class IdSet(IdMap):
+    """Set of 64-bit integer keys, an IdMap without values."""
+
+    def __init__(self, capacity=MIN_CAPACITY):
+        super().__init__(width=0, capacity=capacity)
+
+    def add(self, key):
+        self._insert(key, ())
+
+    def discard(self, key):
+        self.pop(key)
+
+    def __iter__(self):
+        return self.keys()
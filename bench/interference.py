@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Compaction Interference - time-join benchmark operations, gbprobe garbage samples
+and vacuum progress to measure how each compaction affects foreground traffic.
+
+For every compaction window (from a "Vacuum start" to its "Vacuum commit" line in
+the gbprobe log) the report compares the operations completed inside the window
+with those completed in an equally long baseline window just before it, and
+relates the latency degradation and throughput loss to the bytes reclaimed.
+"""
+
+import re
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+import log_cache
+from plot import parse_performance_log, parse_garbage_log
+
+VACUUM_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) Vacuum (start|compact|commit|cleanup): (.*)')
+
+
+def _parse_vacuum_lines(lines):
+    """
+    Parse gbprobe vacuum event lines into a DataFrame.
+
+    Args:
+        lines (iterable): Lines of the gbprobe log
+
+    Returns:
+        pandas.DataFrame: One row per vacuum event with timestamp, event, volume and
+        the numeric fields of the event (NaN where an event does not carry them)
+    """
+    data = []
+    for line in lines:
+        match = VACUUM_PATTERN.match(line.strip())
+        if not match:
+            continue
+        row = {
+            'timestamp': datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S,%f'),
+            'event': match.group(2),
+        }
+        for item in match.group(3).split():
+            key, _, value = item.partition('=')
+            if key == 'is_read_only':
+                row[key] = value == 'True'
+            else:
+                row[key] = float(value)
+        data.append(row)
+
+    columns = ['timestamp', 'event', 'volume', 'garbage_ratio', 'size', 'processed_bytes',
+               'load_avg_1m', 'is_read_only', 'volume_size']
+    df = pd.DataFrame(data, columns=columns)
+    if not df.empty:
+        df = df.astype({'event': 'category', 'volume': 'int64'})
+    return df
+
+
+def parse_vacuum_log(log_file, use_cache=True):
+    """
+    Parse vacuum events written by gbprobe --vacuum_threshold.
+
+    Args:
+        log_file (str): Path to the gbprobe log file
+        use_cache (bool): Reuse the parse cache stored next to the log file
+
+    Returns:
+        pandas.DataFrame: DataFrame of vacuum events ordered by timestamp
+    """
+    try:
+        return log_cache.load(log_file, 'vacuum', _parse_vacuum_lines, use_cache)
+    except FileNotFoundError:
+        print(f"Error: File {log_file} not found.")
+    except Exception as e:
+        print(f"Error processing vacuum log file: {e}")
+
+    return pd.DataFrame()
+
+
+def build_compaction_windows(vacuum_df):
+    """
+    Pair every "start" event with the next "commit" or "cleanup" of the same volume.
+
+    Progress events are summarised into the window: the last processed_bytes value
+    and the mean and peak load_avg_1m reported while compacting.
+
+    Args:
+        vacuum_df (pandas.DataFrame): DataFrame of vacuum events
+
+    Returns:
+        pandas.DataFrame: One row per compaction window ordered by start time
+    """
+    events = vacuum_df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+    # Number windows per volume: every start event opens a new window.
+    events['window'] = (events['event'] == 'start').astype(int).groupby(events['volume']).cumsum()
+    events = events[events['window'] > 0]
+
+    grouped = events.groupby(['volume', 'window'], sort=False)
+    starts = events[events['event'] == 'start'].set_index(['volume', 'window'])
+    ends = events[events['event'].isin(['commit', 'cleanup'])].groupby(['volume', 'window']).first()
+    progress = events[events['event'] == 'compact'].groupby(['volume', 'window'])
+
+    windows = pd.DataFrame({
+        'start': starts['timestamp'],
+        'garbage_ratio_before': starts['garbage_ratio'],
+        'size_before': starts['size'],
+    })
+    windows['end'] = ends['timestamp']
+    windows['outcome'] = ends['event'].astype(str)
+    windows['size_after'] = ends['volume_size']
+    windows['processed_bytes'] = progress['processed_bytes'].last()
+    windows['load_avg_mean'] = progress['load_avg_1m'].mean()
+    windows['load_avg_peak'] = progress['load_avg_1m'].max()
+    windows['progress_events'] = grouped.size()
+
+    # A window still open at the end of the log runs until its last event.
+    windows['end'] = windows['end'].fillna(grouped['timestamp'].max())
+    windows['outcome'] = windows['outcome'].fillna('incomplete')
+    windows = windows.reset_index().sort_values('start', kind='stable').reset_index(drop=True)
+    windows['duration'] = (windows['end'] - windows['start']).dt.total_seconds()
+    return windows
+
+
+def _attach_windows(performance_df, windows, column):
+    """
+    As-of join each operation onto the most recent window starting at or before it.
+
+    Args:
+        performance_df (pandas.DataFrame): Operations ordered by timestamp
+        windows (pandas.DataFrame): Windows with 'start', 'end' and 'window_id' columns
+        column (str): Name of the output column holding the window id, -1 when outside every window
+
+    Returns:
+        pandas.DataFrame: performance_df with the window id column added
+    """
+    joined = pd.merge_asof(performance_df, windows[['start', 'end', 'window_id']],
+                           left_on='timestamp', right_on='start', direction='backward')
+    inside = joined['window_id'].notna() & (joined['timestamp'] <= joined['end'])
+    performance_df[column] = np.where(inside, joined['window_id'], -1).astype(np.int64)
+    return performance_df
+
+
+def _summarize_ops(ops, duration):
+    """Latency percentiles and throughput of a set of operations over duration seconds."""
+    if ops.empty or duration <= 0:
+        return {'ops': len(ops), 'p50': np.nan, 'p99': np.nan, 'ops_per_sec': np.nan, 'bytes_per_sec': np.nan}
+    latency = ops['time_used'].to_numpy()
+    return {
+        'ops': len(ops),
+        'p50': float(np.percentile(latency, 50)),
+        'p99': float(np.percentile(latency, 99)),
+        'ops_per_sec': len(ops) / duration,
+        'bytes_per_sec': ops['size'].sum() / duration,
+    }
+
+
+def correlate(performance_df, garbage_df, vacuum_df):
+    """
+    Build the per-compaction interference report.
+
+    Args:
+        performance_df (pandas.DataFrame): DataFrame with performance data
+        garbage_df (pandas.DataFrame): DataFrame with garbage ratios per volume
+        vacuum_df (pandas.DataFrame): DataFrame of vacuum events
+
+    Returns:
+        pandas.DataFrame: One row per compaction window
+    """
+    windows = build_compaction_windows(vacuum_df)
+    windows['window_id'] = np.arange(len(windows))
+    # As-of merges need identical key resolutions across the three streams.
+    windows[['start', 'end']] = windows[['start', 'end']].astype('datetime64[ns]')
+
+    # Baseline windows of equal length immediately before each compaction.
+    baseline = windows[['window_id', 'start']].copy()
+    baseline['end'] = windows['start']
+    baseline['start'] = windows['start'] - pd.to_timedelta(windows['duration'], unit='s')
+
+    ops = performance_df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+    ops['timestamp'] = ops['timestamp'].astype('datetime64[ns]')
+    ops = _attach_windows(ops, windows, 'window')
+    ops = _attach_windows(ops, baseline.sort_values('start', kind='stable'), 'baseline')
+    # Operations overlapping another compaction are not a clean baseline.
+    ops.loc[ops['window'] >= 0, 'baseline'] = -1
+
+    rows = []
+    for window in windows.itertuples(index=False):
+        during = _summarize_ops(ops[ops['window'] == window.window_id], window.duration)
+        before = _summarize_ops(ops[ops['baseline'] == window.window_id], window.duration)
+        rows.append({
+            'during_ops': during['ops'],
+            'baseline_ops': before['ops'],
+            'p50_during': during['p50'],
+            'p50_baseline': before['p50'],
+            'p99_during': during['p99'],
+            'p99_baseline': before['p99'],
+            'ops_per_sec_during': during['ops_per_sec'],
+            'ops_per_sec_baseline': before['ops_per_sec'],
+            'bytes_per_sec_during': during['bytes_per_sec'],
+            'bytes_per_sec_baseline': before['bytes_per_sec'],
+        })
+    report = pd.concat([windows, pd.DataFrame(rows, index=windows.index)], axis=1)
+
+    report['p50_degradation'] = report['p50_during'] / report['p50_baseline']
+    report['p99_degradation'] = report['p99_during'] / report['p99_baseline']
+    report['throughput_loss'] = 1 - report['bytes_per_sec_during'] / report['bytes_per_sec_baseline']
+
+    # Garbage ratio reported by the probe just before the start and just after the end of each window.
+    if not garbage_df.empty:
+        samples = garbage_df.drop(columns=['seconds_elapsed'], errors='ignore').sort_values('timestamp')
+        samples['timestamp'] = samples['timestamp'].astype('datetime64[ns]')
+        before = pd.merge_asof(report[['start']], samples, left_on='start', right_on='timestamp', direction='backward')
+        after = pd.merge_asof(report[['end']], samples, left_on='end', right_on='timestamp', direction='forward')
+        columns = [f'vol_{volume}' for volume in report['volume']]
+        report['probe_ratio_before'] = [before.at[i, col] if col in before else np.nan for i, col in enumerate(columns)]
+        report['probe_ratio_after'] = [after.at[i, col] if col in after else np.nan for i, col in enumerate(columns)]
+
+    report['bytes_reclaimed'] = report['size_before'] - report['size_after']
+    report['reclaimed_bytes_per_interference_sec'] = report['bytes_reclaimed'] / report['duration']
+    return report.drop(columns=['window_id'])
+
+
+def print_report(report):
+    if report.empty:
+        print("No compaction windows found.")
+        return
+    for row in report.itertuples(index=False):
+        print(f"Volume {row.volume} compaction {row.start} -> {row.end} ({row.duration:.1f} s, {row.outcome})")
+        print(f"  ops during/baseline: {row.during_ops}/{row.baseline_ops}")
+        print(f"  p50 latency: {row.p50_during:.4f} s vs {row.p50_baseline:.4f} s (x{row.p50_degradation:.2f})")
+        print(f"  p99 latency: {row.p99_during:.4f} s vs {row.p99_baseline:.4f} s (x{row.p99_degradation:.2f})")
+        print(f"  throughput: {row.bytes_per_sec_during / 1e6:.2f} MB/s vs {row.bytes_per_sec_baseline / 1e6:.2f} MB/s "
+              f"(loss {row.throughput_loss:.1%})")
+        print(f"  load_avg_1m mean/peak: {row.load_avg_mean:.2f}/{row.load_avg_peak:.2f}")
+        print(f"  bytes reclaimed: {row.bytes_reclaimed:.0f} "
+              f"({row.reclaimed_bytes_per_interference_sec / 1e6:.2f} MB per second of interference)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Correlate compactions with foreground benchmark performance')
+    parser.add_argument('--perf_log', required=True, help='Path to performance log file')
+    parser.add_argument('--garbage_log', required=True, help='Path to gbprobe log file with garbage ratios')
+    parser.add_argument('--vacuum_log', help='Path to gbprobe log file with vacuum events (defaults to --garbage_log)')
+    parser.add_argument('--output', default='interference_report.csv', help='Output CSV report file name')
+    parser.add_argument('--no_cache', action='store_true', help='Re-parse log files instead of using the parse cache')
+
+    args = parser.parse_args()
+    use_cache = not args.no_cache
+
+    performance_df = parse_performance_log(args.perf_log, use_cache)
+    garbage_df = parse_garbage_log(args.garbage_log, use_cache)
+    vacuum_df = parse_vacuum_log(args.vacuum_log or args.garbage_log, use_cache)
+
+    if performance_df.empty or vacuum_df.empty:
+        print("Error: Need both performance data and vacuum events to correlate.")
+        return
+
+    report = correlate(performance_df, garbage_df, vacuum_df)
+    print_report(report)
+    report.to_csv(args.output, index=False)
+    print(f"Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Parsed-log cache - persist the typed, columnar result of parsing a text log
+next to the log itself, so repeated runs of plot.py and the stats tools can
+reload it instead of re-parsing.
+
+A cache entry is keyed by the absolute path, size and mtime of the source log.
+When the log has only grown since the entry was written (the bytes just before
+the last parsed offset are unchanged), only the appended lines are parsed and
+concatenated onto the cached frame. A final line without a trailing newline is
+parsed, but re-parsed on the next run in case it was still being written.
+
+Streaming analyses that fold a log into a small state instead of a frame go
+through load_state(), which caches the state with the same handling.
+"""
+
+import os
+import copy
+import pickle
+import hashlib
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = '.parsed'
+# Number of bytes before the last parsed offset used to detect a rewritten log
+TAIL_PROBE_BYTES = 4096
+
+
+def cache_path(log_file, kind):
+    """
+    Return the path of the cache file for a log and parser kind.
+
+    Args:
+        log_file (str): Path to the source log file
+        kind (str): Name of the parser producing the cached frame
+
+    Returns:
+        str: Path of the cache file next to the source log
+    """
+    return f"{log_file}.{kind}{CACHE_SUFFIX}"
+
+
+def _tail_digest(f, offset):
+    """Digest of the bytes immediately preceding offset in an open binary file."""
+    start = max(0, offset - TAIL_PROBE_BYTES)
+    f.seek(start)
+    return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+def _iter_complete_lines(f, progress):
+    """
+    Yield decoded lines from the current position of a binary file, stopping
+    at a trailing line that has no newline (it is stored in progress['partial']).
+    progress['offset'] is advanced past every line that is yielded.
+    """
+    for raw in f:
+        if not raw.endswith(b'\n'):
+            progress['partial'] = raw.decode('utf-8', errors='replace')
+            break
+        progress['offset'] += len(raw)
+        yield raw.decode('utf-8', errors='replace')
+
+
+def _parse_from(f, offset, parse_lines):
+    """
+    Parse lines starting at offset.
+
+    Returns:
+        tuple: (frame, offset after the last complete line, number of rows
+        at the end of frame that came from an unterminated final line)
+    """
+    f.seek(offset)
+    progress = {'offset': offset, 'partial': None}
+    frame = parse_lines(_iter_complete_lines(f, progress))
+    if progress['partial'] is None:
+        return frame, progress['offset'], 0
+    partial = parse_lines([progress['partial']])
+    return _concat(frame, partial), progress['offset'], len(partial)
+
+
+def _concat(cached, appended):
+    """Append newly parsed rows while keeping categorical columns categorical."""
+    # Imported here: load_state() callers start in milliseconds and never need pandas.
+    import pandas as pd
+    if appended.empty:
+        return cached
+    if cached.empty:
+        return appended
+    categorical = [col for col in cached.columns
+                   if isinstance(cached[col].dtype, pd.CategoricalDtype)]
+    frame = pd.concat([cached, appended], ignore_index=True)
+    for col in categorical:
+        frame[col] = frame[col].astype('category')
+    return frame
+
+
+def _load_entry(path, kind, source):
+    try:
+        with open(path, 'rb') as f:
+            entry = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if not isinstance(entry, dict):
+        return None
+    if entry.get('version') != CACHE_VERSION or entry.get('kind') != kind or entry.get('source') != source:
+        return None
+    return entry
+
+
+def _store_entry(path, entry):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: could not write parse cache {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load(log_file, kind, parse_lines, use_cache=True):
+    """
+    Parse a log file, reusing and extending the on-disk cache when possible.
+
+    Args:
+        log_file (str): Path to the source log file
+        kind (str): Name of the parser, used to keep caches of different parsers apart
+        parse_lines (callable): Function taking an iterable of text lines and
+            returning a pandas.DataFrame with one row per parsed record
+        use_cache (bool): When False, always parse from scratch and leave the cache untouched
+
+    Returns:
+        pandas.DataFrame: Parsed rows of the whole log
+
+    Raises:
+        FileNotFoundError: If the log file does not exist
+    """
+    st = os.stat(log_file)
+    if not use_cache:
+        with open(log_file, 'rb') as f:
+            frame, _, _ = _parse_from(f, 0, parse_lines)
+        return frame
+
+    source = os.path.abspath(log_file)
+    path = cache_path(log_file, kind)
+    entry = _load_entry(path, kind, source)
+
+    if entry is not None and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+        return entry['frame']
+
+    with open(log_file, 'rb') as f:
+        if entry is not None and st.st_size >= entry['offset'] and _tail_digest(f, entry['offset']) == entry['digest']:
+            cached = entry['frame']
+            if entry['partial_rows']:
+                cached = cached.iloc[:len(cached) - entry['partial_rows']]
+            appended, offset, partial_rows = _parse_from(f, entry['offset'], parse_lines)
+            frame = _concat(cached, appended)
+        else:
+            frame, offset, partial_rows = _parse_from(f, 0, parse_lines)
+        digest = _tail_digest(f, offset)
+
+    _store_entry(path, {
+        'version': CACHE_VERSION,
+        'kind': kind,
+        'source': source,
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'offset': offset,
+        'digest': digest,
+        'partial_rows': partial_rows,
+        'frame': frame,
+    })
+    return frame
+
+
+def load_state(log_file, kind, new_state, feed_lines, use_cache=True):
+    """
+    Fold a log file into a state object, reusing and extending the on-disk cache when possible.
+
+    The cache holds the state after the last complete line; a grown log with an
+    unchanged prefix is fed from there on. An unterminated final line is fed into
+    a copy of that state only, so it is fed again once it is complete.
+
+    Args:
+        log_file (str): Path to the source log file
+        kind (str): Name of the analysis, including any parameters the state depends on
+        new_state (callable): Returns the state of an empty log
+        feed_lines (callable): Takes a state and an iterable of text lines and
+            updates the state in place
+        use_cache (bool): When False, always feed the whole log and leave the cache untouched
+
+    Returns:
+        The state after the whole log
+
+    Raises:
+        FileNotFoundError: If the log file does not exist
+    """
+    st = os.stat(log_file)
+    source = os.path.abspath(log_file)
+    path = cache_path(log_file, kind)
+    entry = _load_entry(path, kind, source) if use_cache else None
+
+    if entry is not None and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+        state, offset, partial = entry['state'], entry['offset'], entry['partial']
+    else:
+        with open(log_file, 'rb') as f:
+            if entry is not None and st.st_size >= entry['offset'] and _tail_digest(f, entry['offset']) == entry['digest']:
+                state, offset = entry['state'], entry['offset']
+            else:
+                state, offset = new_state(), 0
+            f.seek(offset)
+            progress = {'offset': offset, 'partial': None}
+            feed_lines(state, _iter_complete_lines(f, progress))
+            offset, partial = progress['offset'], progress['partial']
+            digest = _tail_digest(f, offset)
+        if use_cache:
+            _store_entry(path, {
+                'version': CACHE_VERSION,
+                'kind': kind,
+                'source': source,
+                'size': st.st_size,
+                'mtime_ns': st.st_mtime_ns,
+                'offset': offset,
+                'digest': digest,
+                'partial': partial,
+                'state': state,
+            })
+
+    if partial is not None:
+        state = copy.deepcopy(state)
+        feed_lines(state, [partial])
+    return state
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Microbench - time the hot paths of the bench and probe tooling on synthetic inputs.
+
+Cases:
+
+    patterned_content   run_test.generate_patterned_content for one payload
+    trace_tokenize      trace_format.parse_line over every line of a text trace
+    stats_parse         get_stats.parse_trace_lines over a text trace
+    plot_performance    plot.py performance log parser
+    plot_garbage        plot.py garbage log parser
+    plot_trace          plot.py trace parser
+    process_log         get_stats.process_log on the synthetic trace (heat map included)
+    gbprobe_sweep       one gbprobe probe: GET /status and VacuumVolumeCheck for every
+                        volume of an in-process emulator.LocalCluster
+
+Inputs are generated into a scratch directory, which is also the working
+directory while the cases run, so the files the tools write as a side effect
+(temp/, garbage.log, heatmap.png) stay out of the tree. Parse caches are bypassed.
+
+Every run is appended as one JSON line to the results file, with the git commit,
+the input sizes and the best and median time per case, and is compared with the
+most recent earlier run of the same case and input sizes.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime, timedelta
+import matplotlib
+matplotlib.use('Agg')
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS_FILE = os.path.join(BENCH_DIR, 'microbench.jsonl')
+OPERATIONS = ['REST.GET.OBJECT', 'REST.PUT.OBJECT', 'REST.DELETE.OBJECT', 'REST.HEAD.OBJECT']
+IO_BUFFER_SIZE = 1 << 20
+
+
+def write_synthetic_trace(path, num_ops, num_objects, seed=0):
+    """Write a text trace with a GET/PUT/DELETE/HEAD mix over num_objects objects."""
+    rng = random.Random(seed)
+    object_ids = [f"{rng.getrandbits(64):016x}" for _ in range(num_objects)]
+    timestamp = 0
+    with open(path, 'w', buffering=IO_BUFFER_SIZE) as f:
+        for _ in range(num_ops):
+            timestamp += rng.randint(0, 20)
+            operation = rng.choices(OPERATIONS, weights=(60, 25, 10, 5))[0]
+            object_id = rng.choice(object_ids)
+            size = rng.randint(1, 1 << 20)
+            if operation == 'REST.GET.OBJECT' and rng.random() < 0.3:
+                start = rng.randrange(size)
+                f.write(f"{timestamp} {operation} {object_id} {size} {start} {rng.randint(start, size - 1)}\n")
+            elif operation in ('REST.GET.OBJECT', 'REST.PUT.OBJECT'):
+                f.write(f"{timestamp} {operation} {object_id} {size}\n")
+            else:
+                f.write(f"{timestamp} {operation} {object_id}\n")
+
+
+def write_synthetic_performance_log(path, num_lines, seed=0):
+    """Write run_bench.py "METHOD,object,size,seconds,throughput" log lines."""
+    rng = random.Random(seed)
+    moment = datetime(2025, 1, 1)
+    with open(path, 'w', buffering=IO_BUFFER_SIZE) as f:
+        for _ in range(num_lines):
+            moment += timedelta(microseconds=rng.randint(0, 20000))
+            size = rng.randint(1, 1 << 20)
+            elapsed = rng.uniform(0.001, 0.1)
+            f.write(f"{moment:%Y-%m-%d %H:%M:%S},{moment.microsecond // 1000:03d} "
+                    f"{rng.choice(('PUT', 'GET', 'DELETE'))},{rng.getrandbits(64):016x},{size},"
+                    f"{elapsed},{size / elapsed:.2f}\n")
+
+
+def write_synthetic_garbage_log(path, num_lines, num_volumes, seed=0):
+    """Write gbprobe "Volumes: {...}" log lines, one per second."""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    with open(path, 'w', buffering=IO_BUFFER_SIZE) as f:
+        for index in range(num_lines):
+            moment = start + timedelta(seconds=index)
+            volumes = {volume: rng.random() for volume in range(1, num_volumes + 1)}
+            f.write(f"{moment:%Y-%m-%d %H:%M:%S},000 Volumes: {volumes}\n")
+
+
+def time_case(func, repeat):
+    """Run func repeat times; return the wall times in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _case_patterned_content(inputs, params):
+    from run_test import generate_patterned_content
+    size = params['payload_bytes']
+    return lambda: generate_patterned_content(size), size, 'bytes'
+
+
+def _case_trace_tokenize(inputs, params):
+    import trace_format
+
+    def run():
+        with open(inputs['trace'], 'r', buffering=IO_BUFFER_SIZE) as f:
+            for line in f:
+                trace_format.parse_line(line)
+    return run, params['ops'], 'lines'
+
+
+def _case_stats_parse(inputs, params):
+    from get_stats import parse_trace_lines
+
+    def run():
+        with open(inputs['trace'], 'r', buffering=IO_BUFFER_SIZE) as f:
+            parse_trace_lines(f)
+    return run, params['ops'], 'lines'
+
+
+def _case_plot_parser(kind):
+    def case(inputs, params):
+        import plot
+        parser = {'performance': plot.parse_performance_log, 'garbage': plot.parse_garbage_log,
+                  'trace': plot.parse_trace_log}[kind]
+        count = params['log_lines'] if kind != 'trace' else params['ops']
+        return lambda: parser(inputs[kind], use_cache=False), count, 'lines'
+    return case
+
+
+def _case_process_log(inputs, params):
+    from get_stats import process_log
+    return lambda: process_log(inputs['trace'], use_cache=False), params['ops'], 'lines'
+
+
+def _case_gbprobe_sweep(inputs, params):
+    import emulator
+    if emulator.grpc is None:
+        return None
+    import requests
+    from gbprobe import VolumeServerClient
+
+    cluster = emulator.LocalCluster(master_port=0, volume_port=0, grpc_port=0,
+                                    writable_volumes=params['volumes'], keep_data=False).start()
+    # Fill every volume with a few needles and delete some, so checks see real ratios.
+    payload = b'\0' * 4096
+    for index in range(params['volumes'] * 8):
+        fid = cluster.store.assign()
+        cluster.store.write(fid, payload)
+        if index % 3 == 0:
+            cluster.store.delete(fid)
+    client = VolumeServerClient(f"{cluster.host}:{cluster.grpc_port}")
+    session = requests.Session()
+    status_url = f"http://{cluster.volume_address}/status"
+
+    def run():
+        volumes = session.get(status_url).json()['Volumes']
+        {volume['Id']: client.vacuum_volume_check(volume['Id']) for volume in volumes}
+
+    def cleanup():
+        client.close()
+        session.close()
+        cluster.stop()
+    return run, params['volumes'], 'volumes', cleanup
+
+
+# name -> factory(inputs, params) returning (func, items per call, item unit[, cleanup]) or None to skip
+CASES = {
+    'patterned_content': _case_patterned_content,
+    'trace_tokenize': _case_trace_tokenize,
+    'stats_parse': _case_stats_parse,
+    'plot_performance': _case_plot_parser('performance'),
+    'plot_garbage': _case_plot_parser('garbage'),
+    'plot_trace': _case_plot_parser('trace'),
+    'process_log': _case_process_log,
+    'gbprobe_sweep': _case_gbprobe_sweep,
+}
+
+
+def run_suite(case_names, params, repeat, workdir):
+    """
+    Generate the inputs in workdir and time the selected cases.
+
+    Args:
+        case_names (list): Names of the cases to run, keys of CASES
+        params (dict): Input sizes: ops, objects, log_lines, volumes, payload_bytes, seed
+        repeat (int): Timed runs per case
+        workdir (str): Scratch directory for inputs and side-effect files
+
+    Returns:
+        list: One result dict per case that ran
+    """
+    inputs = {kind: os.path.join(workdir, f"{kind}.log") for kind in ('trace', 'performance', 'garbage')}
+    write_synthetic_trace(inputs['trace'], params['ops'], params['objects'], params['seed'])
+    write_synthetic_performance_log(inputs['performance'], params['log_lines'], params['seed'])
+    write_synthetic_garbage_log(inputs['garbage'], params['log_lines'], params['volumes'], params['seed'])
+
+    results = []
+    for name in case_names:
+        case = CASES[name](inputs, params)
+        if case is None:
+            print(f"{name}: skipped (grpcio is not installed)")
+            continue
+        func, items, unit = case[:3]
+        try:
+            # The tools print summaries; keep them out of the report.
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                # One untimed run warms up imports and the page cache.
+                func()
+                times = time_case(func, repeat)
+        finally:
+            if len(case) > 3:
+                case[3]()
+        best = min(times)
+        results.append({'case': name, 'best': best, 'median': statistics.median(times), 'repeat': repeat,
+                        'items': items, 'unit': unit, 'rate': items / best if best > 0 else None})
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_results(path):
+    """Read all stored runs, oldest first; a missing file has none."""
+    try:
+        with open(path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def previous_result(runs, case, params):
+    """Most recent stored result of case with the same input sizes, or None."""
+    for run in reversed(runs):
+        if run['params'] != params:
+            continue
+        for result in run['results']:
+            if result['case'] == case:
+                return run, result
+    return None
+
+
+def print_results(results, runs, params):
+    print(f"{'Case':<20} {'Best (s)':>10} {'Median (s)':>11} {'Rate':>16} {'vs previous':>22}")
+    for result in results:
+        rate = f"{result['rate']:.0f} {result['unit']}/s" if result['rate'] else '-'
+        comparison = ''
+        previous = previous_result(runs, result['case'], params)
+        if previous is not None:
+            run, old = previous
+            comparison = f"{(result['best'] - old['best']) / old['best']:+.1%} ({run.get('revision') or '?'})"
+        print(f"{result['case']:<20} {result['best']:>10.4f} {result['median']:>11.4f} {rate:>16} {comparison:>22}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the hot paths of the bench and probe tools')
+    parser.add_argument('cases', nargs='*', help=f"Cases to run (default: all): {', '.join(CASES)}")
+    parser.add_argument('--ops', type=int, default=200_000, help='Operations in the synthetic trace')
+    parser.add_argument('--objects', type=int, default=20_000, help='Distinct objects in the synthetic trace')
+    parser.add_argument('--log_lines', type=int, default=100_000, help='Lines of the synthetic performance and garbage logs')
+    parser.add_argument('--volumes', type=int, default=32, help='Volumes in the garbage log and the gbprobe sweep')
+    parser.add_argument('--payload_bytes', type=int, default=16 << 20, help='Size of the generated patterned payload')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic inputs')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case')
+    parser.add_argument('--results', default=DEFAULT_RESULTS_FILE, help='JSON lines file the results are appended to')
+    parser.add_argument('--label', help='Free-form label stored with the run')
+    parser.add_argument('--no_save', action='store_true', help='Compare with stored runs but do not store this one')
+
+    args = parser.parse_args()
+    unknown = [name for name in args.cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+    params = {'ops': args.ops, 'objects': args.objects, 'log_lines': args.log_lines, 'volumes': args.volumes,
+              'payload_bytes': args.payload_bytes, 'seed': args.seed}
+
+    results_file = os.path.abspath(args.results)
+    runs = load_results(results_file)
+    sys.path.insert(0, BENCH_DIR)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='microbench') as workdir:
+        os.chdir(workdir)
+        try:
+            results = run_suite(args.cases or list(CASES), params, args.repeat, workdir)
+        finally:
+            os.chdir(cwd)
+
+    print_results(results, runs, params)
+    if not args.no_save:
+        run = {'time': datetime.now().isoformat(timespec='seconds'), 'revision': git_revision(),
+               'label': args.label, 'python': platform.python_version(), 'host': platform.node(),
+               'params': params, 'results': results}
+        with open(results_file, 'a') as f:
+            f.write(json.dumps(run) + '\n')
+        print(f"Results appended to {results_file}")
+
+
+if __name__ == "__main__":
+    main()
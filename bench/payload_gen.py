@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Payload Gen - upload payloads of tunable entropy built from pre-generated blocks.
+
+os.urandom payloads never compress, so the volume server's gzip path and the
+on-disk footprint of real data are never exercised. Payloads here are laid out
+from blocks of block_size bytes:
+
+    compressibility   fraction of every block that is a repeated filler pattern;
+                      the rest is random, so gzip shrinks a block to about
+                      (1 - compressibility) of its size
+    duplicate_ratio   fraction of the blocks that repeat one of the blocks just
+                      before them, within gzip's 32 KiB window, so duplicates
+                      compress away; with block_size above 32 KiB they cannot
+
+Only the distinct blocks are generated; the payload is assembled from them once,
+before the replay, and operations upload slices of it.
+
+The volume server only gzips needles whose file name or mime type marks them as
+compressible (e.g. text/plain), see util.IsCompressableFileType, and only keeps
+the result when it saves at least 10%.
+"""
+
+import io
+import gzip
+import random
+import argparse
+
+DEFAULT_BLOCK_SIZE = 4096
+# Compressible and random bytes alternate in runs of this length within a block
+RUN_LENGTH = 256
+FILLER = b'SeaweedFS bench payload filler. '
+# Deflate back-references reach at most this many bytes back
+GZIP_WINDOW = 32 << 10
+
+
+def generate_block(block_size, compressibility, rng):
+    """One block whose compressible share is filler and the rest random bytes."""
+    random_run = RUN_LENGTH - int(round(RUN_LENGTH * compressibility))
+    filler = (FILLER * (RUN_LENGTH // len(FILLER) + 1))[:RUN_LENGTH - random_run]
+    runs = -(-block_size // RUN_LENGTH)
+    noise = rng.randbytes(random_run * runs)
+    block = b''.join(noise[run * random_run:(run + 1) * random_run] + filler for run in range(runs))
+    return block[:block_size]
+
+
+def build_payload(size, compressibility=0.0, duplicate_ratio=0.0, block_size=DEFAULT_BLOCK_SIZE, seed=0):
+    """
+    Build a payload buffer.
+
+    Args:
+        size (int): Payload size in bytes
+        compressibility (float): Fraction of every block that compresses away, in [0, 1]
+        duplicate_ratio (float): Fraction of blocks repeating a block within the gzip window before them, in [0, 1)
+        block_size (int): Block size in bytes
+        seed (int): Seed of the random content and the block layout
+
+    Returns:
+        bytes: The payload
+    """
+    rng = random.Random(seed)
+    num_blocks = -(-size // block_size) if size > 0 else 0
+    # Duplicates repeat one of the blocks starting at most GZIP_WINDOW bytes back.
+    window = max(1, GZIP_WINDOW // block_size)
+    layout = []
+    for _ in range(num_blocks):
+        if layout and rng.random() < duplicate_ratio:
+            layout.append(rng.choice(layout[-window:]))
+        else:
+            layout.append(generate_block(block_size, compressibility, rng))
+    payload = b''.join(layout)
+    return payload[:size] if len(payload) > size else payload
+
+
+def gzip_ratio(data, sample_size=1 << 20):
+    """Gzipped over original size of the first sample_size bytes of data."""
+    sample = data[:sample_size]
+    if not sample:
+        return float('nan')
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as f:
+        f.write(sample)
+    return len(buffer.getvalue()) / len(sample)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a payload of tunable compressibility')
+    parser.add_argument('output_file', help='Path to write the payload to')
+    parser.add_argument('--size', type=int, required=True, help='Payload size in bytes')
+    parser.add_argument('--compressibility', type=float, default=0.5, help='Fraction of each block that compresses away')
+    parser.add_argument('--duplicate_ratio', type=float, default=0.0, help='Fraction of blocks repeating a block within the 32 KiB gzip window before them')
+    parser.add_argument('--block_size', type=int, default=DEFAULT_BLOCK_SIZE, help='Block size in bytes')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    args = parser.parse_args()
+    payload = build_payload(args.size, args.compressibility, args.duplicate_ratio, args.block_size, args.seed)
+    with open(args.output_file, 'wb') as f:
+        f.write(payload)
+    print(f"Wrote {len(payload)} bytes to {args.output_file}, gzip ratio {gzip_ratio(payload):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,16 +9,19 @@ import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from datetime import datetime, timedelta
+from datetime import datetime
 import numpy as np
+import log_cache
+import trace_format
+from byte_units import parse_sizes, format_bytes
 
-def parse_performance_log(log_file):
+def _parse_performance_lines(lines):
     """
-    Parse the performance log file and extract timestamp and throughput information.
-    
+    Parse performance log lines into a typed DataFrame.
+
     Args:
-        log_file (str): Path to the performance log file
-        
+        lines (iterable): Lines of the performance log
+
     Returns:
         pandas.DataFrame: DataFrame containing timestamp and throughput data
     """
@@ -26,79 +29,110 @@ def parse_performance_log(log_file):
     # Pattern matches: timestamp, method, object id, size, time used, throughput
     pattern = r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) ([A-Z]+),([a-f0-9]+),(\d+),(\d+\.\d+),(\d+\.\d+)'
     
+    for line in lines:
+        match = re.match(pattern, line.strip())
+        if match:
+            timestamp = datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S,%f')
+            method = match.group(2)
+            obj_id = match.group(3)
+            size = int(match.group(4))
+            time_used = float(match.group(5))
+            throughput = float(match.group(6))
+            
+            data.append({
+                'timestamp': timestamp,
+                'method': method,
+                'obj_id': obj_id,
+                'size': size,
+                'time_used': time_used,
+                'throughput': throughput
+            })
+    
+    df = pd.DataFrame(data)
+    if not df.empty:
+        df = df.astype({'method': 'category', 'obj_id': 'category', 'size': 'int64'})
+    return df
+
+def parse_performance_log(log_file, use_cache=True):
+    """
+    Parse the performance log file and extract timestamp and throughput information.
+    
+    Args:
+        log_file (str): Path to the performance log file
+        use_cache (bool): Reuse the parse cache stored next to the log file
+        
+    Returns:
+        pandas.DataFrame: DataFrame containing timestamp and throughput data
+    """
     try:
-        with open(log_file, 'r') as f:
-            for line in f:
-                match = re.match(pattern, line.strip())
-                if match:
-                    timestamp = datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S,%f')
-                    method = match.group(2)
-                    obj_id = match.group(3)
-                    size = int(match.group(4))
-                    time_used = float(match.group(5))
-                    throughput = float(match.group(6))
-                    
-                    data.append({
-                        'timestamp': timestamp,
-                        'method': method,
-                        'obj_id': obj_id,
-                        'size': size,
-                        'time_used': time_used,
-                        'throughput': throughput
-                    })
+        return log_cache.load(log_file, 'perf', _parse_performance_lines, use_cache)
     except FileNotFoundError:
         print(f"Error: File {log_file} not found.")
     except Exception as e:
         print(f"Error processing performance log file: {e}")
     
+    return pd.DataFrame()
+
+def _parse_garbage_lines(lines):
+    """
+    Parse garbage log lines into a DataFrame with one column per volume.
+
+    Args:
+        lines (iterable): Lines of the garbage log
+
+    Returns:
+        pandas.DataFrame: DataFrame containing timestamp and garbage ratios for each volume server
+    """
+    data = []
+    # Pattern matches: timestamp and volumes dictionary
+    pattern = r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) Volumes: \{(.+)\}'
+    
+    for line in lines:
+        match = re.match(pattern, line.strip())
+        if match:
+            timestamp = datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S,%f')
+            volumes_str = match.group(2)
+            
+            # Parse the volumes dictionary
+            volumes = {}
+            for item in volumes_str.split(', '):
+                key, value = item.split(': ')
+                volumes[f'vol_{key}'] = float(value)
+            
+            # Build the row with the timestamp and the garbage ratios per volume server
+            row = {'timestamp': timestamp}
+            row.update(volumes)
+            data.append(row)
+    
     return pd.DataFrame(data)
 
-def parse_garbage_log(log_file):
+def parse_garbage_log(log_file, use_cache=True):
     """
     Parse the garbage log file and extract timestamp and garbage ratios per volume server.
     
     Args:
         log_file (str): Path to the garbage log file
+        use_cache (bool): Reuse the parse cache stored next to the log file
         
     Returns:
         pandas.DataFrame: DataFrame containing timestamp and garbage ratios for each volume server
     """
-    data = []
-    # Pattern matches: timestamp and volumes dictionary
-    pattern = r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) Volumes: \{(.+)\}'
-    
     try:
-        with open(log_file, 'r') as f:
-            for line in f:
-                match = re.match(pattern, line.strip())
-                if match:
-                    timestamp = datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S,%f')
-                    volumes_str = match.group(2)
-                    
-                    # Parse the volumes dictionary
-                    volumes = {}
-                    for item in volumes_str.split(', '):
-                        key, value = item.split(': ')
-                        volumes[f'vol_{key}'] = float(value)
-                    
-                    # Build the row with the timestamp and the garbage ratios per volume server
-                    row = {'timestamp': timestamp}
-                    row.update(volumes)
-                    data.append(row)
+        return log_cache.load(log_file, 'garbage', _parse_garbage_lines, use_cache)
     except FileNotFoundError:
         print(f"Error: File {log_file} not found.")
     except Exception as e:
         print(f"Error processing garbage log file: {e}")
     
-    return pd.DataFrame(data)
+    return pd.DataFrame()
 
-def parse_trace_log(log_file):
+def _parse_trace_lines(lines):
     """
-    Parse the trace log file and extract numeric timestamp, method, and object id.
-    
+    Parse trace log lines into a typed DataFrame.
+
     Args:
-        log_file (str): Path to the trace log file
-        
+        lines (iterable): Lines of the trace log
+
     Returns:
         pandas.DataFrame: DataFrame containing numeric timestamp, method, and object id
     """
@@ -106,28 +140,54 @@ def parse_trace_log(log_file):
     # Pattern matches: numeric timestamp, method, object id with optional remaining fields
     pattern = r'(\d+)\s+(REST\.[A-Z]+\.[A-Z]+)\s+([a-f0-9]+).*'
     
+    for line in lines:
+        line = line.strip()
+        match = re.match(pattern, line)
+        if match:
+            numeric_timestamp = int(match.group(1))
+            method = match.group(2)
+            obj_id = match.group(3)
+            
+            data.append({
+                'numeric_timestamp': numeric_timestamp,
+                'method': method,
+                'obj_id': obj_id
+            })
+    
+    df = pd.DataFrame(data)
+    if not df.empty:
+        df = df.astype({'numeric_timestamp': 'int64', 'method': 'category', 'obj_id': 'category'})
+    return df
+
+def parse_trace_log(log_file, use_cache=True):
+    """
+    Parse the trace log file and extract numeric timestamp, method, and object id.
+    
+    Args:
+        log_file (str): Path to the trace log file (text or binary)
+        use_cache (bool): Reuse the parse cache stored next to a text log file
+        
+    Returns:
+        pandas.DataFrame: DataFrame containing numeric timestamp, method, and object id
+    """
+    df = pd.DataFrame()
     try:
-        with open(log_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                match = re.match(pattern, line)
-                if match:
-                    numeric_timestamp = int(match.group(1))
-                    method = match.group(2)
-                    obj_id = match.group(3)
-                    
-                    data.append({
-                        'numeric_timestamp': numeric_timestamp,
-                        'method': method,
-                        'obj_id': obj_id
-                    })
+        if trace_format.is_binary_trace(log_file):
+            trace = trace_format.BinaryTrace(log_file)
+            df = pd.DataFrame({
+                'numeric_timestamp': np.asarray(trace.records['timestamp']),
+                'method': pd.Categorical.from_codes(trace.records['op'], categories=trace.op_names)
+                            .remove_unused_categories(),
+                'obj_id': pd.Categorical.from_codes(trace.records['object'], categories=trace.object_ids),
+            })
+        else:
+            df = log_cache.load(log_file, 'trace', _parse_trace_lines, use_cache)
     except FileNotFoundError:
         print(f"Error: File {log_file} not found.")
     except Exception as e:
         print(f"Error processing trace log file: {e}")
     
     # Print summary to verify we are capturing DELETE operations
-    df = pd.DataFrame(data)
     if not df.empty:
         method_counts = df['method'].value_counts()
         print(f"Method counts in trace log: {method_counts}")
@@ -158,14 +218,9 @@ def synchronize_timestamps(performance_df, trace_df):
     # Create a copy of the trace DataFrame
     synced_trace_df = trace_df.copy()
     
-    # Function to convert numeric timestamps to datetime
-    def convert_to_datetime(numeric_ts):
-        ms_diff = numeric_ts - trace_first_numeric
-        ms_diff_int = int(ms_diff)
-        return perf_first_timestamp + timedelta(milliseconds=ms_diff_int)
-    
-    # Apply the conversion function to create a new datetime timestamp column
-    synced_trace_df['timestamp'] = synced_trace_df['numeric_timestamp'].apply(convert_to_datetime)
+    # Convert numeric millisecond timestamps to datetimes offset from the first performance entry
+    ms_diff = synced_trace_df['numeric_timestamp'] - trace_first_numeric
+    synced_trace_df['timestamp'] = perf_first_timestamp + pd.to_timedelta(ms_diff, unit='ms')
     
     # Print the first few DELETE events after synchronization to verify
     delete_events = synced_trace_df[synced_trace_df['method'].str.contains('DELETE')]
@@ -205,22 +260,19 @@ def normalize_timestamps(performance_df, garbage_df, trace_df):
     global_min_timestamp = min(min_timestamps)
     print(f"Global minimum timestamp: {global_min_timestamp}")
     
-    def timestamp_to_seconds(ts):
-        if isinstance(ts, datetime):
-            delta = ts - global_min_timestamp
-            return delta.total_seconds()
-        return None
+    def timestamp_to_seconds(timestamps):
+        return (timestamps - global_min_timestamp).dt.total_seconds()
     
     if not performance_df.empty and 'timestamp' in performance_df.columns:
-        performance_df['seconds_elapsed'] = performance_df['timestamp'].apply(timestamp_to_seconds)
+        performance_df['seconds_elapsed'] = timestamp_to_seconds(performance_df['timestamp'])
         print(f"Performance log time range: 0 to {performance_df['seconds_elapsed'].max():.2f} seconds")
     
     if not garbage_df.empty and 'timestamp' in garbage_df.columns:
-        garbage_df['seconds_elapsed'] = garbage_df['timestamp'].apply(timestamp_to_seconds)
+        garbage_df['seconds_elapsed'] = timestamp_to_seconds(garbage_df['timestamp'])
         print(f"Garbage log time range: 0 to {garbage_df['seconds_elapsed'].max():.2f} seconds")
     
     if not trace_df.empty and 'timestamp' in trace_df.columns:
-        trace_df['seconds_elapsed'] = trace_df['timestamp'].apply(timestamp_to_seconds)
+        trace_df['seconds_elapsed'] = timestamp_to_seconds(trace_df['timestamp'])
         print(f"Trace log time range: 0 to {trace_df['seconds_elapsed'].max():.2f} seconds")
     
     return performance_df, garbage_df, trace_df
@@ -317,6 +369,112 @@ def plot_data_normalized(performance_df, garbage_df, trace_df, output_file, bin_
     print(f"Plots saved to {output_file}")
     plt.show()
 
+def size_bucket_labels(size_edges):
+    """Human readable labels for the buckets delimited by size_edges."""
+    if not size_edges:
+        return ['all sizes']
+    labels = [f"<{format_bytes(size_edges[0])}"]
+    labels += [f"{format_bytes(lo)}-{format_bytes(hi)}" for lo, hi in zip(size_edges, size_edges[1:])]
+    labels.append(f">={format_bytes(size_edges[-1])}")
+    return labels
+
+def compute_latency_bands(performance_df, bin_size, size_edges, quantiles=(0.5, 0.95, 0.99)):
+    """
+    Compute per-bin latency percentiles and operation rates, split by method and object size bucket.
+    
+    Binning and bucketing are integer array operations and the percentiles come from a
+    single grouped quantile, so the cost stays vectorized for tens of millions of operations.
+    
+    Args:
+        performance_df (pandas.DataFrame): DataFrame with performance data and seconds_elapsed
+        bin_size (float): Time interval in seconds of each bin
+        size_edges (list): Object size bucket edges in bytes
+        quantiles (tuple): Latency quantiles to compute
+        
+    Returns:
+        tuple: (bands, rates) where bands is indexed by (method, size_bucket, bin) with one
+        column per quantile in seconds plus 'ops', and rates is indexed by (method, bin) with
+        column 'ops_per_sec'. Both carry a 'bin_center' column in seconds.
+    """
+    frame = pd.DataFrame({
+        'method': performance_df['method'].astype(str).to_numpy(),
+        'size_bucket': np.searchsorted(np.asarray(size_edges, dtype=np.int64),
+                                       performance_df['size'].to_numpy(), side='right'),
+        'bin': np.floor_divide(performance_df['seconds_elapsed'].to_numpy(), bin_size).astype(np.int64),
+        'latency': performance_df['time_used'].to_numpy(dtype=np.float64),
+    })
+    
+    grouped = frame.groupby(['method', 'size_bucket', 'bin'], sort=True)['latency']
+    bands = grouped.quantile(list(quantiles)).unstack()
+    bands.columns = [f"p{q * 100:g}" for q in quantiles]
+    bands['ops'] = grouped.size()
+    bands['bin_center'] = (bands.index.get_level_values('bin').to_numpy() + 0.5) * bin_size
+    
+    rates = frame.groupby(['method', 'bin'], sort=True).size().to_frame('ops')
+    rates['ops_per_sec'] = rates['ops'] / bin_size
+    rates['bin_center'] = (rates.index.get_level_values('bin').to_numpy() + 0.5) * bin_size
+    return bands, rates
+
+def plot_latency_bands(performance_df, output_file, bin_size, size_edges):
+    """
+    Plot p50/p95/p99 latency bands per time bin for each object size bucket, with an ops/s panel.
+    
+    Args:
+        performance_df (pandas.DataFrame): DataFrame with performance data and seconds_elapsed
+        output_file (str): Path to save the output plot file
+        bin_size (float): Time interval in seconds of each bin
+        size_edges (list): Object size bucket edges in bytes
+    """
+    if performance_df.empty or 'seconds_elapsed' not in performance_df.columns:
+        print("No valid performance data found for latency bands.")
+        return
+    
+    bands, rates = compute_latency_bands(performance_df, bin_size, size_edges)
+    labels = size_bucket_labels(size_edges)
+    buckets = sorted(bands.index.get_level_values('size_bucket').unique())
+    colors = {'GET': 'blue', 'PUT': 'green'}
+    x_max = performance_df['seconds_elapsed'].max()
+    
+    fig, axes = plt.subplots(len(buckets) + 1, 1, figsize=(12, 3.5 * (len(buckets) + 1)), sharex=True, squeeze=False)
+    axes = axes[:, 0]
+    
+    for ax, bucket in zip(axes, buckets):
+        bucket_bands = bands.xs(bucket, level='size_bucket')
+        for method in bucket_bands.index.get_level_values('method').unique():
+            method_bands = bucket_bands.xs(method, level='method')
+            color = colors.get(method)
+            x = method_bands['bin_center']
+            line, = ax.plot(x, method_bands['p50'] * 1000, linestyle='-', color=color,
+                            label=f'{method} p50 ({int(method_bands["ops"].sum())} ops)')
+            color = line.get_color()
+            ax.fill_between(x, method_bands['p50'] * 1000, method_bands['p95'] * 1000, color=color, alpha=0.3,
+                            label=f'{method} p50-p95')
+            ax.fill_between(x, method_bands['p95'] * 1000, method_bands['p99'] * 1000, color=color, alpha=0.12,
+                            label=f'{method} p95-p99')
+            ax.plot(x, method_bands['p99'] * 1000, linestyle=':', color=color, label=f'{method} p99')
+        ax.set_yscale('log')
+        ax.set_ylabel('Latency (ms)')
+        ax.set_title(f'Latency percentiles per {bin_size:.1f} s bin, object size {labels[bucket]}')
+        ax.grid(True, which='both', alpha=0.4)
+        ax.legend(fontsize='small', ncol=2)
+    
+    ops_ax = axes[-1]
+    for method in rates.index.get_level_values('method').unique():
+        method_rates = rates.xs(method, level='method')
+        ops_ax.plot(method_rates['bin_center'], method_rates['ops_per_sec'], marker='.', linestyle='-',
+                    color=colors.get(method), label=method)
+    ops_ax.set_xlabel('Time (seconds)')
+    ops_ax.set_ylabel('Operations/s')
+    ops_ax.set_title(f'Completed operations per second (binned every {bin_size:.1f} seconds)')
+    ops_ax.grid(True)
+    ops_ax.legend()
+    ops_ax.set_xlim(0, x_max)
+    
+    plt.tight_layout()
+    plt.savefig(output_file)
+    print(f"Latency plots saved to {output_file}")
+    plt.show()
+
 def main():
     parser = argparse.ArgumentParser(description='Process and plot log files')
     parser.add_argument('--perf_log', required=True, help='Path to performance log file')
@@ -324,12 +482,17 @@ def main():
     parser.add_argument('--trace_log', required=True, help='Path to trace log file')
     parser.add_argument('--output', default='log_analysis_plots.png', help='Output plot file name')
     parser.add_argument('--bin_size', type=float, default=10, help='Bin size in seconds for throughput averaging')
+    parser.add_argument('--size_buckets', default='65536,1048576,16777216',
+                        help='Comma-separated object size bucket edges in bytes for latency bands')
+    parser.add_argument('--latency_output', default='latency_bands.png', help='Output latency band plot file name')
+    parser.add_argument('--no_cache', action='store_true', help='Re-parse log files instead of using the parse cache')
     
     args = parser.parse_args()
     
-    performance_df = parse_performance_log(args.perf_log)
-    garbage_df = parse_garbage_log(args.garbage_log)
-    trace_df = parse_trace_log(args.trace_log)
+    use_cache = not args.no_cache
+    performance_df = parse_performance_log(args.perf_log, use_cache)
+    garbage_df = parse_garbage_log(args.garbage_log, use_cache)
+    trace_df = parse_trace_log(args.trace_log, use_cache)
     
     if performance_df.empty and garbage_df.empty and trace_df.empty:
         print("Error: No valid data found in log files.")
@@ -341,6 +504,7 @@ def main():
     performance_df, garbage_df, trace_df = normalize_timestamps(performance_df, garbage_df, trace_df)
     
     plot_data_normalized(performance_df, garbage_df, trace_df, args.output, args.bin_size)
+    plot_latency_bands(performance_df, args.latency_output, args.bin_size, parse_sizes(args.size_buckets))
 
 if __name__ == "__main__":
     main()
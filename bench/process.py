@@ -1,78 +1,254 @@
-def process_traces(file_path):
-    # Dictionary to store the most recent PUT for each object_id
-    most_recent_puts = {}
-    
-    # List to store the result (matched PUT-DELETE pairs)
-    result = []
-    
-    # First pass: process all traces and identify the most recent PUTs
-    with open(file_path, 'r') as file:
-        for line in file:
-            line = line.strip()
-            if not line:
-                continue
-                
-            parts = line.split()
-            if len(parts) >= 3:
-                timestamp = int(parts[0])
-                operation = parts[1]
-                object_id = parts[2]
-                
-                if "PUT" in operation:
-                    # Store this as the most recent PUT for this object_id
-                    most_recent_puts[object_id] = {
-                        'timestamp': timestamp,
-                        'operation': operation,
-                        'object_id': object_id,
-                        'line': line
-                    }
-    
-    # Second pass: find DELETEs and match with their most recent PUTs
-    with open(file_path, 'r') as file:
-        for line in file:
-            line = line.strip()
-            if not line:
-                continue
-                
-            parts = line.split()
-            if len(parts) >= 3:
-                timestamp = int(parts[0])
+import os
+import sys
+import heapq
+import struct
+import argparse
+import tempfile
+from array import array
+import numpy as np
+import trace_format
+import id_codec
+
+# Matched trace lines buffered in memory before a sorted run is spilled to disk
+DEFAULT_MAX_RECORDS_IN_MEMORY = 4_000_000
+# On-disk run record: timestamp and byte offset of the trace line in the input file
+RUN_RECORD = struct.Struct('<qq')
+IO_BUFFER_SIZE = 1 << 20
+# PUT and DELETE lines paired per numpy batch, see pair_traces()
+PAIR_CHUNK = 1 << 20
+
+def _pair_chunk(keys, timestamps, offsets, is_put, live):
+    """
+    Pair the DELETEs of a chunk of PUT and DELETE lines with their PUTs.
+
+    A stable sort by object key lists the operations of every object in trace
+    order: a DELETE pairs with the PUT just before it, or, for an object's first
+    operation in the chunk, with its live PUT from earlier chunks.
+
+    Args:
+        keys, timestamps, offsets, is_put (numpy.ndarray): Columns of the lines, in trace order
+        live (tuple): (sorted keys, timestamps, offsets) of the objects live before the chunk
+
+    Returns:
+        tuple: ((PUT timestamps, PUT offsets, DELETE timestamps, DELETE offsets) of the
+        pairs, live objects after the chunk)
+    """
+    order = np.argsort(keys, kind='stable')
+    keys, timestamps, offsets, is_put = keys[order], timestamps[order], offsets[order], is_put[order]
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    last = np.ones(len(keys), dtype=bool)
+    last[:-1] = first[1:]
+
+    deletes = np.flatnonzero(~is_put & ~first)
+    deletes = deletes[is_put[deletes - 1]]
+    carried = np.flatnonzero(~is_put & first)
+    live_keys, live_timestamps, live_offsets = live
+    live_index = id_codec.lookup_sorted(live_keys, keys[carried])
+    carried, live_index = carried[live_index >= 0], live_index[live_index >= 0]
+    pairs = (np.concatenate([timestamps[deletes - 1], live_timestamps[live_index]]),
+             np.concatenate([offsets[deletes - 1], live_offsets[live_index]]),
+             np.concatenate([timestamps[deletes], timestamps[carried]]),
+             np.concatenate([offsets[deletes], offsets[carried]]))
+
+    # Objects of the chunk are live afterwards exactly when their last operation is a PUT.
+    keep = np.ones(len(live_keys), dtype=bool)
+    touched = id_codec.lookup_sorted(live_keys, keys[last])
+    keep[touched[touched >= 0]] = False
+    added = np.flatnonzero(last & is_put)
+    live_keys = np.concatenate([live_keys[keep], keys[added]])
+    # Two sorted runs: the stable sort merges them in linear time.
+    merge = np.argsort(live_keys, kind='stable')
+    live = (live_keys[merge], np.concatenate([live_timestamps[keep], timestamps[added]])[merge],
+            np.concatenate([live_offsets[keep], offsets[added]])[merge])
+    return pairs, live
+
+
+def pair_traces(file_path, chunk_lines=PAIR_CHUNK):
+    """
+    Pair every DELETE with the most recent preceding PUT of the same object in one pass.
+
+    PUT and DELETE lines are paired chunk_lines at a time with numpy; between chunks
+    only the live objects are kept, as sorted arrays of key, timestamp and byte
+    offset of their latest PUT. An object is no longer live once it has been deleted.
+
+    Yields:
+        tuple: (timestamp, offset) of the PUT line and then of the DELETE line of each pair
+    """
+    live = (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    keys, timestamps, offsets, is_put = array('Q'), array('q'), array('q'), bytearray()
+    offset = 0
+
+    with open(file_path, 'rb', buffering=IO_BUFFER_SIZE) as file:
+        while True:
+            lines = file.readlines(IO_BUFFER_SIZE)
+            for line in lines:
+                line_offset = offset
+                offset += len(line)
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
                 operation = parts[1]
-                object_id = parts[2]
-                
-                if "DELETE" in operation:
-                    # If we have a matching PUT, add the pair to the result
-                    if object_id in most_recent_puts:
-                        result.append(most_recent_puts[object_id])
-                        result.append({
-                            'timestamp': timestamp,
-                            'operation': operation,
-                            'object_id': object_id,
-                            'line': line
-                        })
-    
-    # Sort the result by timestamp
-    result.sort(key=lambda x: x['timestamp'])
-    
-    # Return the formatted result as a list of lines
-    return [trace['line'] for trace in result]
+                if b"PUT" in operation:
+                    put = 1
+                elif b"DELETE" in operation:
+                    put = 0
+                else:
+                    continue
+                try:
+                    timestamp = int(parts[0])
+                except ValueError:
+                    continue
+                keys.append(id_codec.encode(parts[2]))
+                timestamps.append(timestamp)
+                offsets.append(line_offset)
+                is_put.append(put)
+            if len(keys) >= chunk_lines or (not lines and keys):
+                pairs, live = _pair_chunk(np.frombuffer(keys, dtype=np.uint64), np.frombuffer(timestamps, dtype=np.int64),
+                                          np.frombuffer(offsets, dtype=np.int64),
+                                          np.frombuffer(is_put, dtype=np.uint8).astype(bool), live)
+                keys, timestamps, offsets, is_put = array('Q'), array('q'), array('q'), bytearray()
+                for put_timestamp, put_offset, delete_timestamp, delete_offset in zip(*(column.tolist() for column in pairs)):
+                    yield (put_timestamp, put_offset)
+                    yield (delete_timestamp, delete_offset)
+            if not lines:
+                return
+
+def pair_binary_trace(trace):
+    """
+    Binary trace counterpart of pair_traces(), keyed by interned object index.
+
+    Interned indices are dense, so the latest PUT of every object lives in flat
+    per-index arrays, with -1 marking objects that are not live.
+
+    Yields:
+        tuple: (timestamp, record index) of the PUT record and then of the DELETE record of each pair
+    """
+    put_codes = {code for code, name in enumerate(trace.op_names) if "PUT" in name}
+    delete_codes = {code for code, name in enumerate(trace.op_names) if "DELETE" in name}
+    put_timestamps = array('q', [0]) * trace.id_count
+    put_indices = array('q', [-1]) * trace.id_count
+    records = trace.records
+
+    for chunk_start in range(0, len(records), trace_format.ITER_CHUNK):
+        chunk = records[chunk_start:chunk_start + trace_format.ITER_CHUNK]
+        for index, (timestamp, object_index, op) in enumerate(zip(chunk['timestamp'].tolist(),
+                                                                  chunk['object'].tolist(),
+                                                                  chunk['op'].tolist()), chunk_start):
+            if op in put_codes:
+                put_timestamps[object_index] = timestamp
+                put_indices[object_index] = index
+            elif op in delete_codes:
+                put_index = put_indices[object_index]
+                if put_index >= 0:
+                    put_indices[object_index] = -1
+                    yield (put_timestamps[object_index], put_index)
+                    yield (timestamp, index)
+
+def _spill_run(records, tmp_dir):
+    """Sort records and write them to a temporary run file; return its path."""
+    records.sort()
+    fd, path = tempfile.mkstemp(prefix='put_del_run_', dir=tmp_dir)
+    with os.fdopen(fd, 'wb', buffering=IO_BUFFER_SIZE) as run:
+        pack = RUN_RECORD.pack
+        for record in records:
+            run.write(pack(*record))
+    return path
+
+def _read_run(path):
+    with open(path, 'rb', buffering=IO_BUFFER_SIZE) as run:
+        while True:
+            chunk = run.read(RUN_RECORD.size * 4096)
+            if not chunk:
+                break
+            yield from RUN_RECORD.iter_unpack(chunk)
+
+def sort_records(records, max_in_memory, tmp_dir=None):
+    """
+    Sort (timestamp, offset) records, falling back to an external merge sort.
+
+    Records are sorted in memory until more than max_in_memory are buffered; the
+    buffer is then spilled as a sorted run and all runs are merged at the end.
+
+    Yields:
+        tuple: (timestamp, offset) records in ascending order
+    """
+    buffer = []
+    run_paths = []
+    try:
+        for record in records:
+            buffer.append(record)
+            if len(buffer) >= max_in_memory:
+                run_paths.append(_spill_run(buffer, tmp_dir))
+                buffer = []
+
+        if not run_paths:
+            buffer.sort()
+            yield from buffer
+            return
+
+        if buffer:
+            run_paths.append(_spill_run(buffer, tmp_dir))
+            buffer = []
+        print(f"Merging {len(run_paths)} sorted runs")
+        yield from heapq.merge(*(_read_run(path) for path in run_paths))
+    finally:
+        for path in run_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+def process_traces(file_path, output_file, max_in_memory=DEFAULT_MAX_RECORDS_IN_MEMORY, tmp_dir=None):
+    """
+    Write matched PUT-DELETE pairs of a trace to output_file, ordered by timestamp.
+
+    The output has the same format, text or binary, as the input trace.
+
+    Returns:
+        int: Number of matched pairs written
+    """
+    if trace_format.is_binary_trace(file_path):
+        trace = trace_format.BinaryTrace(file_path)
+        records_written = 0
+        with trace_format.TraceWriter(output_file, op_names=trace.op_names, object_ids=trace.object_ids,
+                                      meta={'source': os.path.basename(file_path)}) as writer:
+            batch = []
+            for _, index in sort_records(pair_binary_trace(trace), max_in_memory, tmp_dir):
+                batch.append(index)
+                if len(batch) >= trace_format.ITER_CHUNK:
+                    writer.write_records(trace.records[batch])
+                    records_written += len(batch)
+                    batch = []
+            writer.write_records(trace.records[batch])
+            records_written += len(batch)
+        return records_written // 2
+
+    lines_written = 0
+    with open(file_path, 'rb') as source, open(output_file, 'wb', buffering=IO_BUFFER_SIZE) as out:
+        for _, offset in sort_records(pair_traces(file_path), max_in_memory, tmp_dir):
+            # Offsets of time-ordered traces are read back nearly sequentially
+            source.seek(offset)
+            out.write(source.readline().rstrip() + b'\n')
+            lines_written += 1
+    return lines_written // 2
 
 def main():
-    input_file = 'IBMObjectStoreTrace002Part0'
-    output_file = input_file + '_PUT_DEL'
-    
+    parser = argparse.ArgumentParser(description='Extract matched PUT-DELETE pairs from a trace file.')
+    parser.add_argument('input_file', help='Path to trace file (text or binary)')
+    parser.add_argument('output_file', nargs='?', help='Path to output file (default: <input>_PUT_DEL)')
+    parser.add_argument('--max_in_memory', type=int, default=DEFAULT_MAX_RECORDS_IN_MEMORY,
+                        help='Matched lines sorted in memory before spilling sorted runs to disk')
+    parser.add_argument('--tmp_dir', help='Directory for sorted runs (default: system temp directory)')
+
+    args = parser.parse_args()
+    output_file = args.output_file or args.input_file + '_PUT_DEL'
+
     try:
-        matched_traces = process_traces(input_file)
-        
-        # Write the result to the output file
-        with open(output_file, 'w') as file:
-            for line in matched_traces:
-                file.write(line + '\n')
-        
-        print(f"Processing complete. Matched traces written to {output_file}")
-    
+        pairs = process_traces(args.input_file, output_file, args.max_in_memory, args.tmp_dir)
+        print(f"Processing complete. {pairs} matched pairs written to {output_file}")
+
     except Exception as e:
         print(f"Error: {e}")
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
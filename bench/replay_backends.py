@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Replay Backends - issue trace operations through the S3 gateway or the filer.
+
+run_bench.py replays a trace against the master and volume servers directly.
+The backends here take the same operations to the layers production traffic
+goes through, so identical traces can be compared per layer:
+
+    S3Backend       `weed s3`: PUT/GET/DELETE /<bucket>/<object id>, signed with AWS
+                    Signature Version 4 (UNSIGNED-PAYLOAD, as SeaweedFS accepts)
+    FilerBackend    filer HTTP API: multipart POST, GET and DELETE of /<prefix>/<object id>
+
+Both log PUT and GET timings in the "METHOD,object,size,seconds,throughput"
+format of run_bench.py, save GET responses under ./temp like it, and share one
+pooled requests session across all operation threads.
+"""
+
+import io
+import hmac
+import time
+import hashlib
+import logging
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, quote
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 256
+DEFAULT_REGION = 'us-east-1'
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+
+
+def pooled_session(pool_size=DEFAULT_POOL_SIZE):
+    """A requests session keeping up to pool_size connections per host alive."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _hmac(key, message):
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+
+class SigV4Signer:
+    """
+    AWS Signature Version 4 request signing for a single region and service.
+
+    The signing key only depends on the date, so it is derived once per day.
+    """
+
+    def __init__(self, access_key, secret_key, region=DEFAULT_REGION, service='s3'):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.service = service
+        self._signing_key = (None, None)
+
+    def _key(self, date):
+        cached_date, key = self._signing_key
+        if cached_date != date:
+            key = _hmac(('AWS4' + self.secret_key).encode('utf-8'), date)
+            for part in (self.region, self.service, 'aws4_request'):
+                key = _hmac(key, part)
+            self._signing_key = (date, key)
+        return key
+
+    def sign(self, method, url, headers=None, payload_hash=UNSIGNED_PAYLOAD, now=None):
+        """
+        Return the headers to send with a request: the given headers plus Host,
+        X-Amz-Date, X-Amz-Content-Sha256 and Authorization.
+
+        Args:
+            method (str): HTTP method
+            url (str): Full request URL with an already percent-encoded path
+            headers (dict): Extra headers; they are sent but not signed
+            payload_hash (str): Hex SHA-256 of the body, or UNSIGNED-PAYLOAD
+            now (datetime): Signing time in UTC (default: now)
+
+        Returns:
+            dict: Request headers
+        """
+        parts = urlsplit(url)
+        amz_date = (now or datetime.now(timezone.utc)).strftime('%Y%m%dT%H%M%SZ')
+        date = amz_date[:8]
+        signed = {'host': parts.netloc, 'x-amz-content-sha256': payload_hash, 'x-amz-date': amz_date}
+        signed_names = ';'.join(sorted(signed))
+        query = '&'.join(sorted(
+            f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+            for name, _, value in (item.partition('=') for item in parts.query.split('&') if item)))
+        canonical_request = '\n'.join([
+            method, parts.path or '/', query,
+            ''.join(f"{name}:{signed[name]}\n" for name in sorted(signed)),
+            signed_names, payload_hash,
+        ])
+        scope = f"{date}/{self.region}/{self.service}/aws4_request"
+        string_to_sign = '\n'.join(['AWS4-HMAC-SHA256', amz_date, scope,
+                                    hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()])
+        signature = hmac.new(self._key(date), string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+        result = dict(headers or {})
+        result.update({
+            'Host': parts.netloc,
+            'X-Amz-Date': amz_date,
+            'X-Amz-Content-Sha256': payload_hash,
+            'Authorization': f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                             f"SignedHeaders={signed_names}, Signature={signature}",
+        })
+        return result
+
+
+def upload_part(data, content_type=None):
+    """Multipart file tuple of an upload, with a part Content-Type when one is given."""
+    if content_type:
+        return ('file', io.BytesIO(data), content_type)
+    return ('file', io.BytesIO(data))
+
+
+def _log_transfer(method, object_id, size, elapsed):
+    throughput = size / elapsed if elapsed > 0 else 0
+    logging.info(f"{method},{object_id},{size},{elapsed},{throughput:.2f}")
+
+
+def _save_response(object_id, range_start, range_end, content):
+    if range_start is not None and range_end is not None:
+        output_path = f"./temp/{object_id}_range_{range_start}_{range_end}"
+    else:
+        output_path = f"./temp/{object_id}_full"
+    with open(output_path, 'wb') as f:
+        f.write(content)
+    logging.debug(f"Saved response to {output_path}")
+
+
+class _HttpBackend:
+    """Shared PUT/GET/DELETE flow; subclasses build the requests."""
+
+    name = None
+
+    def __init__(self, payload, pool_size=DEFAULT_POOL_SIZE, content_type=None):
+        # payload(size) returns the bytes uploaded for an object of that size
+        self.payload = payload
+        self.content_type = content_type
+        self.session = pooled_session(pool_size)
+
+    def setup(self):
+        """Prepare the target before the replay (e.g. create the bucket)."""
+
+    def _request(self, method, object_id, data=None, headers=None):
+        raise NotImplementedError
+
+    def put(self, object_id, size_bytes, timestamp=None):
+        logging.debug(f"Executing {self.name} PUT for object {object_id} with size {size_bytes} bytes")
+        try:
+            data = self.payload(size_bytes)
+            start_time = time.time()
+            response = self._request('PUT', object_id, data=data)
+            elapsed = time.time() - start_time
+            if response.status_code in (200, 201):
+                _log_transfer('PUT', object_id, size_bytes, elapsed)
+            else:
+                logging.error(f"{self.name} PUT for {object_id} failed with status code "
+                              f"{response.status_code}. Response: {response.text}")
+        except Exception as e:
+            logging.error(f"Error during {self.name} PUT operation for object {object_id}: {e}")
+
+    def get(self, object_id, range_start=None, range_end=None):
+        logging.debug(f"Executing {self.name} GET for object {object_id}")
+        headers = {}
+        if range_start is not None and range_end is not None:
+            headers['Range'] = f'bytes={range_start}-{range_end}'
+        try:
+            start_time = time.time()
+            response = self._request('GET', object_id, headers=headers)
+            elapsed = time.time() - start_time
+            if response.status_code in (200, 206):
+                _log_transfer('GET', object_id, len(response.content), elapsed)
+                _save_response(object_id, range_start, range_end, response.content)
+            else:
+                logging.error(f"{self.name} GET for {object_id} failed with status code "
+                              f"{response.status_code}. Response: {response.text}")
+        except Exception as e:
+            logging.error(f"Error during {self.name} GET operation: {e}")
+
+    def delete(self, object_id):
+        logging.debug(f"Executing {self.name} DELETE for object {object_id}")
+        try:
+            response = self._request('DELETE', object_id)
+            if response.status_code in (200, 202, 204):
+                logging.debug(f"{self.name} DELETE for {object_id} completed successfully")
+            else:
+                logging.error(f"{self.name} DELETE for {object_id} failed with status code "
+                              f"{response.status_code}. Response: {response.text}")
+        except Exception as e:
+            logging.error(f"Error during {self.name} DELETE operation: {e}")
+
+
+class S3Backend(_HttpBackend):
+    """
+    Replay through the S3 API of `weed s3`.
+
+    Args:
+        endpoint (str): S3 endpoint, e.g. http://localhost:8333
+        bucket (str): Bucket holding the trace objects; created by setup()
+        access_key (str): Access key id; requests are sent unsigned when empty
+        secret_key (str): Secret access key
+        payload (callable): Returns the bytes to upload for a size
+        region (str): Signing region
+        pool_size (int): Connections kept alive to the endpoint
+        content_type (str): Content-Type of uploads (default: none sent)
+    """
+
+    name = 'S3'
+
+    def __init__(self, endpoint, bucket, access_key, secret_key, payload, region=DEFAULT_REGION,
+                 pool_size=DEFAULT_POOL_SIZE, content_type=None):
+        super().__init__(payload, pool_size, content_type)
+        self.base_url = f"{endpoint.rstrip('/')}/{quote(bucket, safe='')}"
+        self.signer = SigV4Signer(access_key, secret_key, region) if access_key else None
+
+    def _send(self, method, url, data=None, headers=None):
+        if self.signer is not None:
+            headers = self.signer.sign(method, url, headers)
+        return self.session.request(method, url, data=data, headers=headers)
+
+    def _request(self, method, object_id, data=None, headers=None):
+        if data is not None and self.content_type:
+            headers = dict(headers or {}, **{'Content-Type': self.content_type})
+        return self._send(method, f"{self.base_url}/{quote(object_id, safe='-_.~')}", data, headers)
+
+    def setup(self):
+        response = self._send('PUT', self.base_url)
+        # 409 means the bucket exists already
+        if response.status_code not in (200, 409):
+            logging.error(f"Creating bucket {self.base_url} failed with status code "
+                          f"{response.status_code}. Response: {response.text}")
+
+
+class FilerBackend(_HttpBackend):
+    """
+    Replay through the filer HTTP API.
+
+    Args:
+        filer_addr (str): Filer address, e.g. http://localhost:8888
+        prefix (str): Directory the trace objects are written to
+        payload (callable): Returns the bytes to upload for a size
+        pool_size (int): Connections kept alive to the filer
+        content_type (str): Content-Type of uploads (default: none sent)
+    """
+
+    name = 'Filer'
+
+    def __init__(self, filer_addr, prefix, payload, pool_size=DEFAULT_POOL_SIZE, content_type=None):
+        super().__init__(payload, pool_size, content_type)
+        prefix = prefix.strip('/')
+        self.base_url = filer_addr.rstrip('/') + (f"/{quote(prefix)}" if prefix else '')
+
+    def _request(self, method, object_id, data=None, headers=None):
+        url = f"{self.base_url}/{quote(object_id, safe='-_.~')}"
+        if method == 'PUT':
+            # The filer takes uploads as multipart POSTs, like the volume servers.
+            return self.session.post(url, files={'file': upload_part(data, self.content_type)})
+        return self.session.request(method, url, headers=headers)
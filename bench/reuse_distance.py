@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Reuse Distance - byte-weighted LRU reuse distances and miss ratio curves of the
+GET operations of a trace.
+
+Every GET is mapped to the cache blocks it reads: range GETs to the blocks its
+range covers, full GETs to all blocks of the object (or, with block size 0, each
+GET to the whole object). The reuse distance of an access is the number of bytes
+of distinct blocks accessed since the previous access to the same block, plus
+the block itself, so an LRU cache of C bytes hits exactly the accesses with a
+distance of at most C.
+
+Distances come from a Fenwick tree indexed by access time holding the size of
+each block at its most recent access: the bytes touched since time p are the
+live total minus the prefix sum up to p, an O(log n) query. For very large
+traces objects can be sampled spatially (SHARDS): only objects whose hashed id
+falls under the rate are analyzed and distances are scaled by 1 / rate.
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import trace_format
+import id_codec
+from byte_units import parse_sizes, format_bytes
+
+DEFAULT_BLOCK_SIZE = 1 << 20
+# Default sampling aims at this many sampled GETs
+DEFAULT_TARGET_OPS = 2_000_000
+IO_BUFFER_SIZE = 1 << 20
+GET_PATTERN = b'REST.GET.OBJECT'
+
+
+def count_text_gets(trace_file):
+    """
+    Count the GET operations of a text trace with a byte scan of the file.
+
+    Far cheaper than parsing the lines; used to pick the default sampling rate.
+    """
+    pattern = GET_PATTERN
+    count = 0
+    tail = b''
+    with open(trace_file, 'rb') as f:
+        while True:
+            block = f.read(IO_BUFFER_SIZE)
+            if not block:
+                return count
+            data = tail + block
+            count += data.count(pattern)
+            # Too short to hold a match itself, so no match is counted twice.
+            tail = data[-(len(pattern) - 1):]
+
+
+def _load_text_gets(trace_file, threshold, seed):
+    keys, sizes, range_starts, range_ends = [], [], [], []
+    total = 0
+    with open(trace_file, 'r', buffering=IO_BUFFER_SIZE) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 3 or parts[1] != 'REST.GET.OBJECT':
+                continue
+            op = trace_format.parse_fields(parts)
+            if op is None:
+                continue
+            total += 1
+            key = id_codec.encode(op.object_id)
+            if threshold is not None and id_codec.hash_key(key, seed) >= threshold:
+                continue
+            keys.append(key)
+            sizes.append(-1 if op.size is None else op.size)
+            has_range = op.range_start is not None and op.range_end is not None
+            range_starts.append(op.range_start if has_range else -1)
+            range_ends.append(op.range_end if has_range else -1)
+    return (np.array(keys, dtype=np.uint64), np.array(sizes, dtype=np.int64),
+            np.array(range_starts, dtype=np.int64), np.array(range_ends, dtype=np.int64), total)
+
+
+def _load_binary_gets(trace_file, threshold, seed):
+    trace = trace_format.BinaryTrace(trace_file)
+    get = trace.records[trace.records['op'] == trace.op_code('REST.GET.OBJECT')]
+    total = len(get)
+    objects = get['object'].astype(np.int64)
+    if threshold is not None:
+        sampled = id_codec.hash_keys(id_codec.encode_array(trace.object_ids), seed) < np.uint64(threshold)
+        keep = sampled[objects]
+        get, objects = get[keep], objects[keep]
+    has_size = get['nfields'] >= 4
+    has_range = get['nfields'] >= 6
+    return (objects.astype(np.uint64), np.where(has_size, get['size'], -1),
+            np.where(has_range, get['range_start'], -1), np.where(has_range, get['range_end'], -1), total)
+
+
+def load_gets(trace_file, rate=1.0, seed=0):
+    """
+    Load the GET operations of the objects sampled at rate.
+
+    Returns:
+        tuple: (object keys, sizes, range starts, range ends, GETs in the full trace);
+        missing sizes and ranges are -1
+    """
+    threshold = id_codec.sampling_threshold(rate)
+    if trace_format.is_binary_trace(trace_file):
+        return _load_binary_gets(trace_file, threshold, seed)
+    return _load_text_gets(trace_file, threshold, seed)
+
+
+def expand_blocks(objects, sizes, range_starts, range_ends, block_size):
+    """
+    Map GET operations to the cache items they access.
+
+    Args:
+        objects (numpy.ndarray): Object key of each GET
+        sizes (numpy.ndarray): Object size of each GET, -1 when unknown
+        range_starts (numpy.ndarray): First byte of each range GET, -1 for full GETs
+        range_ends (numpy.ndarray): Last byte (inclusive) of each range GET
+        block_size (int): Cache block size in bytes; 0 caches whole objects
+
+    Returns:
+        tuple: (dense item id, item size in bytes) per access, in trace order
+    """
+    has_range = (range_starts >= 0) & (range_ends >= range_starts)
+    # Objects of unknown size extend at least to the end of the range read from them.
+    object_sizes = np.where(sizes >= 0, sizes, np.where(has_range, range_ends + 1, 0))
+    valid = object_sizes > 0
+    objects, object_sizes = objects[valid], object_sizes[valid]
+    range_starts, range_ends, has_range = range_starts[valid], range_ends[valid], has_range[valid]
+    _, object_index = np.unique(objects, return_inverse=True)
+    object_index = object_index.ravel()
+
+    if block_size <= 0:
+        return object_index, object_sizes
+
+    first = np.where(has_range, range_starts // block_size, 0)
+    last = np.where(has_range, np.minimum(range_ends, object_sizes - 1) // block_size,
+                    (object_sizes - 1) // block_size)
+    last = np.maximum(last, first)
+    counts = last - first + 1
+    access = np.repeat(np.arange(len(counts)), counts)
+    # Block number within the object: position of each expanded access within its GET.
+    offsets = np.arange(len(access)) - np.repeat(np.cumsum(counts) - counts, counts)
+    blocks = first[access] + offsets
+    block_sizes = np.clip(object_sizes[access] - blocks * block_size, 1, block_size)
+    items = object_index[access].astype(np.int64) * (int(last.max()) + 1 if len(last) else 1) + blocks
+    _, item_ids = np.unique(items, return_inverse=True)
+    return item_ids.ravel(), block_sizes
+
+
+def reuse_distances(items, item_sizes):
+    """
+    Byte-weighted LRU reuse distance of every access.
+
+    Args:
+        items (numpy.ndarray): Dense item id of each access, in trace order
+        item_sizes (numpy.ndarray): Size in bytes of the item at each access
+
+    Returns:
+        numpy.ndarray: Distance in bytes of each access, -1 for first accesses
+    """
+    n = len(items)
+    # Previous access to the same item, found by a stable sort on the item id.
+    order = np.argsort(items, kind='stable')
+    previous = np.full(n, -1, dtype=np.int64)
+    same = items[order[1:]] == items[order[:-1]]
+    previous[order[1:][same]] = order[:-1][same]
+    previous_sizes = np.where(previous >= 0, item_sizes[np.maximum(previous, 0)], 0)
+
+    distances = np.full(n, -1, dtype=np.int64)
+    # Fenwick tree over access times (1-based); slot t holds the size of the item
+    # whose most recent access is t.
+    tree = [0] * (n + 1)
+    live = 0
+    for time, (prev, size, prev_size) in enumerate(zip(previous.tolist(), item_sizes.tolist(),
+                                                       previous_sizes.tolist()), 1):
+        if prev >= 0:
+            prev += 1
+            prefix = 0
+            k = prev
+            while k:
+                prefix += tree[k]
+                k &= k - 1
+            distances[time - 1] = live - prefix + size
+            k = prev
+            while k <= n:
+                tree[k] -= prev_size
+                k += k & -k
+            live -= prev_size
+        k = time
+        while k <= n:
+            tree[k] += size
+            k += k & -k
+        live += size
+    return distances
+
+
+def miss_ratio_curve(distances, access_sizes, cache_sizes, rate=1.0):
+    """
+    LRU miss ratios at each cache size.
+
+    Args:
+        distances (numpy.ndarray): Reuse distances from reuse_distances(), -1 for first accesses
+        access_sizes (numpy.ndarray): Bytes read by each access
+        cache_sizes (list): Cache sizes in bytes
+        rate (float): Sampling rate; sampled distances are scaled by 1 / rate
+
+    Returns:
+        pandas.DataFrame: cache_size, miss_ratio and byte_miss_ratio per cache size
+    """
+    reuse = distances >= 0
+    scaled = distances[reuse] / rate
+    order = np.argsort(scaled)
+    scaled = scaled[order]
+    reuse_bytes = np.cumsum(access_sizes[reuse][order])
+    total_accesses = len(distances)
+    total_bytes = access_sizes.sum()
+    cold_accesses = total_accesses - len(scaled)
+    cold_bytes = total_bytes - (reuse_bytes[-1] if len(reuse_bytes) else 0)
+
+    # Accesses with a distance of at most the cache size hit.
+    hits = np.searchsorted(scaled, cache_sizes, side='right')
+    hit_bytes = np.where(hits > 0, reuse_bytes[np.maximum(hits - 1, 0)] if len(reuse_bytes) else 0, 0)
+    return pd.DataFrame({
+        'cache_size': cache_sizes,
+        'miss_ratio': (total_accesses - hits) / total_accesses if total_accesses else np.nan,
+        'byte_miss_ratio': (total_bytes - hit_bytes) / total_bytes if total_bytes else np.nan,
+        'cold_miss_ratio': cold_accesses / total_accesses if total_accesses else np.nan,
+        'cold_byte_miss_ratio': cold_bytes / total_bytes if total_bytes else np.nan,
+    })
+
+
+def default_cache_sizes(distances, rate=1.0, points=24):
+    """Log-spaced cache sizes from 1 MiB up to the largest reuse distance."""
+    largest = distances.max() / rate if len(distances) else 0
+    largest = max(largest, 1 << 21)
+    return np.unique(np.geomspace(1 << 20, largest, points).astype(np.int64)).tolist()
+
+
+def plot_mrc(curve, output_file):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.plot(curve['cache_size'], curve['miss_ratio'], marker='o', label='Miss ratio')
+    ax.plot(curve['cache_size'], curve['byte_miss_ratio'], marker='s', label='Byte miss ratio')
+    ax.set_xscale('log')
+    ax.set_ylim(0, 1.05)
+    ax.set_xlabel('LRU cache size (bytes)')
+    ax.set_ylabel('Miss ratio')
+    ax.set_title('Miss Ratio Curve of GET Operations')
+    ax.grid(True, which='both', alpha=0.3)
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(output_file)
+    print(f"Plot saved to {output_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute LRU reuse distances and miss ratio curves of trace GETs')
+    parser.add_argument('trace_file', help='Path to trace file (text or binary)')
+    parser.add_argument('--block_size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help='Cache block size in bytes; 0 caches whole objects')
+    parser.add_argument('--cache_sizes', help='Comma-separated cache sizes in bytes (default: log-spaced)')
+    parser.add_argument('--rate', type=float,
+                        help=f'Object sampling rate in (0, 1] (default: about {DEFAULT_TARGET_OPS} sampled GETs)')
+    parser.add_argument('--seed', type=int, default=0, help='Hash seed of the object sampling')
+    parser.add_argument('--output', default='mrc.csv', help='Output CSV file name')
+    parser.add_argument('--plot', default='mrc.png', help='Output plot file name')
+
+    args = parser.parse_args()
+
+    rate = args.rate
+    if rate is None:
+        # Binary traces know their GET count up front; text traces are counted with a byte scan.
+        if trace_format.is_binary_trace(args.trace_file):
+            trace = trace_format.BinaryTrace(args.trace_file)
+            gets = int(np.count_nonzero(trace.records['op'] == trace.op_code('REST.GET.OBJECT')))
+        else:
+            gets = count_text_gets(args.trace_file)
+        rate = min(1.0, DEFAULT_TARGET_OPS / gets) if gets else 1.0
+    if not 0 < rate <= 1:
+        parser.error('--rate must be in (0, 1]')
+
+    objects, sizes, range_starts, range_ends, total = load_gets(args.trace_file, rate, args.seed)
+    items, item_sizes = expand_blocks(objects, sizes, range_starts, range_ends, args.block_size)
+    print(f"Sampled {len(objects)} of {total} GET operations (rate {rate:g}), {len(items)} block accesses")
+    distances = reuse_distances(items, item_sizes)
+
+    cache_sizes = parse_sizes(args.cache_sizes) if args.cache_sizes else default_cache_sizes(distances, rate)
+    curve = miss_ratio_curve(distances, item_sizes, cache_sizes, rate)
+    for row in curve.itertuples(index=False):
+        print(f"{format_bytes(row.cache_size):>12}: miss ratio {row.miss_ratio:.4f}, "
+              f"byte miss ratio {row.byte_miss_ratio:.4f}")
+    curve.to_csv(args.output, index=False)
+    print(f"Miss ratio curve saved to {args.output}")
+    plot_mrc(curve, args.plot)
+
+
+if __name__ == "__main__":
+    main()
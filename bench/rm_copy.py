@@ -1,41 +1,12 @@
 import sys
-import os
+from trace_filter import MethodFilter, run_pipeline, default_output_file
 
-def remove_head_methods(input_file, output_file=None):
+def remove_copy_methods(input_file, output_file=None):
     # If no output file specified, create a name based on the input file
     if output_file is None:
-        base, ext = os.path.splitext(input_file)
-        output_file = f"{base}_no_head{ext}"
+        output_file = default_output_file(input_file, "no_copy")
     
-    try:
-        # Count lines for statistics
-        total_lines = 0
-        removed_lines = 0
-        
-        # Open input file for reading and output file for writing
-        with open(input_file, 'r') as infile, open(output_file, 'w') as outfile:
-            for line in infile:
-                total_lines += 1
-                fields = line.strip().split()
-                
-                # Check if this is a line with a method containing "HEAD"
-                if len(fields) >= 2 and "COPY" in fields[1]:
-                    removed_lines += 1
-                    continue  # Skip this line
-                
-                # Write lines without HEAD to the output file
-                outfile.write(line)
-        
-        print(f"Processing complete!")
-        print(f"Total lines processed: {total_lines}")
-        print(f"Lines removed: {removed_lines}")
-        print(f"Remaining lines: {total_lines - removed_lines}")
-        print(f"Output written to: {output_file}")
-        
-    except FileNotFoundError:
-        print(f"Error: File '{input_file}' not found.")
-    except Exception as e:
-        print(f"Error processing file: {e}")
+    run_pipeline(input_file, output_file, [MethodFilter("COPY")])
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -45,4 +16,4 @@ if __name__ == "__main__":
         input_file = input("Enter the path to your trace file: ")
         output_file = input("Enter the path for output file (leave empty for automatic naming): ").strip() or None
     
-    remove_head_methods(input_file, output_file)
\ No newline at end of file
+    remove_copy_methods(input_file, output_file)
\ No newline at end of file
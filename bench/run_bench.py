@@ -1,11 +1,25 @@
 #!/usr/bin/env python3
 import os
+import json
 import time
 import requests
 import argparse
-import io
+import math
+import random
+import socket
 import logging
 import threading
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from urllib3 import HTTPConnectionPool
+from urllib3.connection import HTTPConnection
+import trace_format
+import id_codec
+import payload_gen
+from replay_backends import S3Backend, FilerBackend, upload_part, pooled_session, DEFAULT_POOL_SIZE, DEFAULT_REGION
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -19,51 +33,974 @@ logging.basicConfig(
 # Create temp directory if it does not exist (for GET responses)
 os.makedirs("./temp", exist_ok=True)
 
-# Global dictionary to store object_id -> (fid, public_url) mappings
-object_mappings = {}
-# Global dictionary to store object_id -> size mapping for PUT operations
-object_sizes = {}
+# Object ids are stored as id_codec integer keys, see id_codec.encode()
+# Global table to store object key -> packed (fid, public_url) location, see pack_location()
+object_mappings = id_codec.IdMap(width=3)
+# Global table to store object key -> size mapping for PUT operations
+object_sizes = id_codec.IdMap()
+# Size of the copy currently stored for each uploaded object, by object key. object_sizes
+# holds the size of the last PUT in the whole trace, which differs for re-PUT objects.
+stored_sizes = id_codec.IdMap()
+# Locations whose fid does not fit the packed form, by object key
+irregular_locations = {}
+# Distinct publicUrl values; packed locations refer to them by index
+public_urls = []
+public_url_index = {}
+# Operation threads update the tables concurrently
+mappings_lock = threading.Lock()
 # Global variable for the largest in-memory buffer for PUT operations
 largest_file_data = None
 largest_put_size = 0
+# Payload content: None for os.urandom, otherwise payload_gen.build_payload() keyword arguments
+payload_options = None
+# Content-Type of uploaded parts; the volume server only gzips compressible types
+payload_content_type = None
+
+def pack_location(object_key, fid, public_url):
+    """
+    Pack an assigned fid and its publicUrl into the integers stored in object_mappings.
+
+    A fid "<volume id>,<needle key hex><8 hex digit cookie>" becomes (volume id,
+    needle key, cookie | publicUrl index << 32). Must be called with mappings_lock held.
+    """
+    server = public_url_index.get(public_url)
+    if server is None:
+        server = public_url_index[public_url] = len(public_urls)
+        public_urls.append(public_url)
+    volume_id, _, needle = fid.partition(',')
+    try:
+        location = (int(volume_id), int(needle[:-8], 16), int(needle[-8:], 16) | server << 32)
+        if unpack_location(object_key, location) == (fid, public_url):
+            return location
+    except ValueError:
+        pass
+    irregular_locations[object_key] = (fid, public_url)
+    return (-1, 0, 0)
+
+def unpack_location(object_key, location):
+    """Return the (fid, public_url) packed by pack_location()."""
+    volume_id, needle_key, packed = location
+    if volume_id < 0:
+        return irregular_locations[object_key]
+    # The needle key is written as whole bytes with leading zero bytes dropped.
+    key_hex = f"{needle_key:x}"
+    key_hex = key_hex.zfill(len(key_hex) + len(key_hex) % 2)
+    return f"{volume_id},{key_hex}{packed & 0xFFFFFFFF:08x}", public_urls[packed >> 32]
+
+def lookup_location(object_id):
+    """Return (fid, public_url) of an uploaded object, or None if it has no mapping."""
+    object_key = id_codec.encode(object_id)
+    with mappings_lock:
+        location = object_mappings.get(object_key)
+        return None if location is None else unpack_location(object_key, location)
 
 def prepare_memory_buffer(trace_file):
     """Scan the trace file for PUT operations and pre-create a largest in-memory buffer."""
     global largest_file_data, largest_put_size, object_sizes
     logging.debug(f"Scanning trace file for PUT operations: {trace_file}")
     largest_put_size = 0
-    with open(trace_file, 'r') as f:
-        lines = f.readlines()
-    for line in lines:
-        parts = line.strip().split()
-        if len(parts) < 3:
-            continue
-        if parts[1] == "REST.PUT.OBJECT":
-            object_id = parts[2]
-            if len(parts) >= 4:
-                size_bytes = int(parts[3])
-                object_sizes[object_id] = size_bytes
-                if size_bytes > largest_put_size:
-                    largest_put_size = size_bytes
+    for op in trace_format.iter_ops(trace_file):
+        if op.operation == "REST.PUT.OBJECT":
+            if op.size is not None:
+                object_sizes[id_codec.encode(op.object_id)] = op.size
+                if op.size > largest_put_size:
+                    largest_put_size = op.size
             else:
-                logging.error(f"Missing size for PUT operation in line: {line}")
+                logging.error(f"Missing size for PUT operation: {op}")
     if largest_put_size > 0:
-        largest_file_data = os.urandom(largest_put_size)
+        largest_file_data = make_payload(largest_put_size)
         logging.debug(f"Created in-memory buffer of size {largest_put_size} bytes")
 
-def put_object(master_addr, object_id, size_bytes):
+def make_payload(size):
+    """Build the upload buffer: random bytes, or payload_gen blocks when payload_options is set."""
+    if payload_options is None:
+        return os.urandom(size)
+    return payload_gen.build_payload(size, **payload_options)
+
+class AssignPolicy:
+    """
+    /dir/assign parameters of each PUT.
+
+    The static parameters (collection, replication, ttl, dataCenter, rack) go with
+    every assign. With classify_by set, the collection is chosen per PUT from
+    classes, a list of (upper bound or None, collection): by the object size in
+    bytes for 'size', or for 'lifetime' by the seconds until the trace deletes the
+    object again (objects that are never deleted fall in the unbounded class).
+    """
+
+    def __init__(self, collection=None, replication=None, ttl=None, data_center=None, rack=None,
+                 classify_by=None, classes=None):
+        self.base = {name: value for name, value in (('collection', collection), ('replication', replication),
+                                                     ('ttl', ttl), ('dataCenter', data_center), ('rack', rack))
+                     if value}
+        self.classify_by = classify_by
+        self.classes = classes or []
+        # Sorted hashes of (object key, PUT timestamp) and the lifetime in ms of each, filled by prepare()
+        self.lifetime_keys = np.empty(0, dtype=np.uint64)
+        self.lifetimes = np.empty(0, dtype=np.int64)
+
+    @staticmethod
+    def parse_classes(spec):
+        """Parse "BOUND=COLLECTION,...,COLLECTION"; the entry without a bound takes everything above the others."""
+        classes = []
+        for item in spec.split(','):
+            bound, _, name = item.strip().rpartition('=')
+            if name:
+                classes.append((float(bound) if bound else None, name))
+        return sorted(classes, key=lambda entry: math.inf if entry[0] is None else entry[0])
+
+    def prepare(self, trace_file):
+        """
+        Find the lifetime of every PUT that the trace later deletes: sorted stably by
+        object key, a DELETE ends the lifetime of the PUT just before it.
+        """
+        if self.classify_by != 'lifetime':
+            return
+        keys, timestamps, is_put = array('Q'), array('q'), bytearray()
+        for op in trace_format.iter_ops(trace_file):
+            if op.operation in ("REST.PUT.OBJECT", "REST.DELETE.OBJECT"):
+                keys.append(id_codec.encode(op.object_id))
+                timestamps.append(op.timestamp)
+                is_put.append(op.operation == "REST.PUT.OBJECT")
+        keys, timestamps = np.frombuffer(keys, dtype=np.uint64), np.frombuffer(timestamps, dtype=np.int64)
+        is_put = np.frombuffer(is_put, dtype=np.uint8).astype(bool)
+        order = np.argsort(keys, kind='stable')
+        keys, timestamps, is_put = keys[order], timestamps[order], is_put[order]
+        deletes = np.flatnonzero(~is_put[1:] & is_put[:-1] & (keys[1:] == keys[:-1])) + 1
+        hashes = id_codec.hash_keys(keys[deletes - 1], timestamps[deletes - 1])
+        order = np.argsort(hashes)
+        self.lifetime_keys = hashes[order]
+        self.lifetimes = (timestamps[deletes] - timestamps[deletes - 1])[order]
+
+    def collection(self, object_id, size_bytes, timestamp=None):
+        timestamps = None if timestamp is None else np.array([timestamp], dtype=np.int64)
+        return self.collections(np.array([id_codec.encode(object_id)], dtype=np.uint64), [size_bytes], timestamps)[0]
+
+    def collections(self, object_keys, sizes, timestamps=None):
+        """Collection of many PUTs at once, given as arrays of object keys, sizes and trace timestamps."""
+        default = self.base.get('collection')
+        if self.classify_by == 'size':
+            values = np.asarray(sizes, dtype=np.float64)
+        elif self.classify_by == 'lifetime' and timestamps is not None:
+            index = id_codec.lookup_sorted(self.lifetime_keys, id_codec.hash_keys(object_keys, timestamps))
+            values = np.full(len(index), math.inf)
+            values[index >= 0] = self.lifetimes[index[index >= 0]] / 1000
+        else:
+            return [default] * len(object_keys)
+        # The first class whose bound is at least the value; the unbounded class takes everything.
+        bounds = np.array([math.inf if bound is None else bound for bound, _ in self.classes])
+        names = [name for _, name in self.classes] + [default]
+        return [names[index] for index in np.searchsorted(bounds, values).tolist()]
+
+    def params(self, object_id, size_bytes, timestamp=None):
+        """Query parameters of the assign for one PUT."""
+        params = dict(self.base)
+        collection = self.collection(object_id, size_bytes, timestamp)
+        if collection:
+            params['collection'] = collection
+        return params
+
+class VolumeLoad:
+    """Requests and bytes per volume and per volume server, taken from the volume id of each fid."""
+
+    KINDS = ('write', 'read', 'delete')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # volume id or server -> [writes, reads, deletes, write bytes, read bytes, delete bytes]
+        self.volumes = {}
+        self.servers = {}
+        self.collections = {}
+
+    def record(self, kind, fid, public_url, num_bytes, collection=None):
+        try:
+            volume_id = int(fid.partition(',')[0])
+        except ValueError:
+            return
+        column = self.KINDS.index(kind)
+        with self.lock:
+            for table, key in ((self.volumes, volume_id), (self.servers, public_url)):
+                counters = table.get(key)
+                if counters is None:
+                    counters = table[key] = [0] * 6
+                counters[column] += 1
+                counters[3 + column] += num_bytes
+            if collection is not None:
+                self.collections.setdefault(volume_id, collection)
+
+    @staticmethod
+    def skew(table, column):
+        """Largest over mean of a counter column; 1.0 is perfectly even."""
+        values = [counters[column] for counters in table.values()]
+        mean = sum(values) / len(values) if values else 0
+        return max(values) / mean if mean else float('nan')
+
+    def report(self):
+        if not self.volumes:
+            return
+        print("Per-volume load (garbage = deleted / written bytes):")
+        for volume_id in sorted(self.volumes):
+            writes, reads, deletes, write_bytes, read_bytes, delete_bytes = self.volumes[volume_id]
+            collection = self.collections.get(volume_id) or '-'
+            garbage = delete_bytes / write_bytes if write_bytes else float('nan')
+            print(f"  Volume {volume_id} ({collection}): {writes} writes {write_bytes} B, {reads} reads {read_bytes} B, "
+                  f"{deletes} deletes {delete_bytes} B, garbage {garbage:.3f}")
+        print("Per-server load:")
+        for server in sorted(self.servers):
+            writes, reads, deletes, write_bytes, read_bytes, delete_bytes = self.servers[server]
+            print(f"  {server}: {writes} writes {write_bytes} B, {reads} reads {read_bytes} B, "
+                  f"{deletes} deletes {delete_bytes} B")
+        print(f"Skew (max / mean): volume write bytes {self.skew(self.volumes, 3):.2f}, "
+              f"read bytes {self.skew(self.volumes, 4):.2f}, delete bytes {self.skew(self.volumes, 5):.2f}; "
+              f"server write bytes {self.skew(self.servers, 3):.2f}, read bytes {self.skew(self.servers, 4):.2f}")
+
+    def report_disk_usage(self):
+        """
+        Compare the bytes written to each volume with its size on disk from the
+        volume servers' /status. The on-disk size also counts needle headers and
+        anything written to the volume outside this run.
+        """
+        disk = {}
+        for server in sorted(self.servers):
+            try:
+                volumes = requests.get(f"http://{server}/status").json().get("Volumes") or []
+            except Exception as e:
+                logging.error(f"Error fetching /status of {server}: {e}")
+                continue
+            for volume in volumes:
+                disk[volume.get("Id")] = volume.get("Size", 0)
+        logical_total = disk_total = 0
+        print("Logical vs on-disk bytes per volume:")
+        for volume_id in sorted(self.volumes):
+            if volume_id not in disk:
+                continue
+            logical, on_disk = self.volumes[volume_id][3], disk[volume_id]
+            logical_total += logical
+            disk_total += on_disk
+            ratio = on_disk / logical if logical else float('nan')
+            print(f"  Volume {volume_id}: {logical} B written, {on_disk} B on disk ({ratio:.3f})")
+        if logical_total:
+            print(f"  Total: {logical_total} B written, {disk_total} B on disk ({disk_total / logical_total:.3f})")
+
+    def write_csv(self, path):
+        with open(path, 'w') as f:
+            f.write("scope,key,collection,writes,reads,deletes,write_bytes,read_bytes,delete_bytes\n")
+            for volume_id in sorted(self.volumes):
+                f.write(f"volume,{volume_id},{self.collections.get(volume_id) or ''},"
+                        + ','.join(map(str, self.volumes[volume_id])) + "\n")
+            for server in sorted(self.servers):
+                f.write(f"server,{server},," + ','.join(map(str, self.servers[server])) + "\n")
+
+class QueueRejected(Exception):
+    """A request was turned away by a full client-side queue or timed out waiting in it."""
+
+class _ServerQueue:
+    def __init__(self, now):
+        self.in_flight = 0
+        # Events of the requests waiting for a slot, first come first served
+        self.waiters = deque()
+        self.requests = 0
+        self.queued = 0
+        self.rejected = 0
+        self.max_depth = 0
+        # Time integral of the queue depth, for the mean depth since the first request
+        self.depth_seconds = 0.0
+        self.first_seen = self.last_change = now
+        self.waits_ms = array('d')
+
+    def depth_changed(self, now, delta):
+        self.depth_seconds += len(self.waiters) * (now - self.last_change)
+        self.last_change = now
+        if delta > 0:
+            self.max_depth = max(self.max_depth, len(self.waiters))
+
+class InflightLimiter:
+    """
+    Client-side in-flight limits with explicit FIFO queues, one per volume server
+    publicUrl and one for the master.
+
+    A request beyond the limit of its target waits in the target's queue until a
+    running request hands its slot over. With queue_limit set, a request finding
+    that many already waiting is rejected; with queue_timeout_ms set, one waiting
+    longer is. Both raise QueueRejected. Request timings are taken inside the slot,
+    so they hold server service time only and queueing is counted here instead.
+    """
+
+    def __init__(self, server_limit=None, master_limit=None, queue_limit=None, queue_timeout_ms=None):
+        self.server_limit = server_limit
+        self.master_limit = master_limit
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout_ms / 1000 if queue_timeout_ms is not None else None
+        self.lock = threading.Lock()
+        # target -> _ServerQueue
+        self.queues = {}
+        self.masters = set()
+
+    @contextmanager
+    def slot(self, target, master=False):
+        """Hold an in-flight slot of target (a publicUrl, or the master address with master=True)."""
+        limit = self.master_limit if master else self.server_limit
+        if limit is None:
+            yield
+            return
+        ticket = None
+        start = time.time()
+        with self.lock:
+            queue = self.queues.get(target)
+            if queue is None:
+                queue = self.queues[target] = _ServerQueue(start)
+                if master:
+                    self.masters.add(target)
+            queue.requests += 1
+            if queue.in_flight < limit and not queue.waiters:
+                queue.in_flight += 1
+                queue.waits_ms.append(0.0)
+            elif self.queue_limit is not None and len(queue.waiters) >= self.queue_limit:
+                queue.rejected += 1
+                raise QueueRejected(f"Client queue of {target} is full ({len(queue.waiters)} waiting)")
+            else:
+                ticket = threading.Event()
+                queue.depth_changed(start, 1)
+                queue.waiters.append(ticket)
+                queue.queued += 1
+        if ticket is not None:
+            ticket.wait(self.queue_timeout)
+            now = time.time()
+            with self.lock:
+                # The slot is handed over under the lock, so is_set() is final here.
+                if not ticket.is_set():
+                    queue.depth_changed(now, -1)
+                    queue.waiters.remove(ticket)
+                    queue.rejected += 1
+                    raise QueueRejected(f"Waited {(now - start) * 1000:.0f} ms in the client queue of {target}")
+                queue.waits_ms.append((now - start) * 1000)
+        try:
+            yield
+        finally:
+            with self.lock:
+                if queue.waiters:
+                    queue.depth_changed(time.time(), -1)
+                    queue.waiters.popleft().set()
+                else:
+                    queue.in_flight -= 1
+
+    def _rows(self):
+        now = time.time()
+        with self.lock:
+            for target in sorted(self.queues, key=lambda target: (target not in self.masters, target)):
+                queue = self.queues[target]
+                waits = sorted(queue.waits_ms)
+                elapsed = now - queue.first_seen
+                depth_seconds = queue.depth_seconds + len(queue.waiters) * (now - queue.last_change)
+                percentile = lambda q: waits[min(len(waits) - 1, int(len(waits) * q / 100))] if waits else 0.0
+                yield (target, 'master' if target in self.masters else 'server', queue.requests, queue.queued,
+                       queue.rejected, percentile(50), percentile(99), waits[-1] if waits else 0.0,
+                       depth_seconds / elapsed if elapsed > 0 else 0.0, queue.max_depth)
+
+    def report(self):
+        if not self.queues:
+            return
+        limit = lambda value: 'unlimited' if value is None else value
+        print(f"Client-side queues (in-flight limit {limit(self.server_limit)} per server, "
+              f"{limit(self.master_limit)} for the master):")
+        for target, kind, requests_, queued, rejected, p50, p99, max_wait, mean_depth, max_depth in self._rows():
+            print(f"  {kind} {target}: {requests_} requests, {queued} queued, {rejected} rejected, "
+                  f"wait p50 {p50:.1f} ms p99 {p99:.1f} ms max {max_wait:.1f} ms, "
+                  f"depth mean {mean_depth:.2f} max {max_depth}")
+
+    def write_csv(self, path):
+        with open(path, 'w') as f:
+            f.write("target,kind,requests,queued,rejected,wait_p50_ms,wait_p99_ms,wait_max_ms,mean_depth,max_depth\n")
+            for row in self._rows():
+                f.write(','.join(f"{value:.3f}" if isinstance(value, float) else str(value) for value in row) + "\n")
+
+assign_policy = AssignPolicy()
+volume_load = VolumeLoad()
+inflight_limits = InflightLimiter()
+
+DEFAULT_LOCATION_TTL = 60.0
+# Weight of the newest read in a replica's running latency average
+REPLICA_LATENCY_SMOOTHING = 0.2
+# Seconds a failed read counts as in the latency average of its replica
+READ_ERROR_PENALTY = 1.0
+
+class LocationCache:
+    """
+    Volume id -> publicUrls of the volume's replicas, from the master's /dir/lookup.
+
+    Entries expire after ttl seconds. invalidate() drops an entry after a failed
+    read, so the next read of the volume looks it up again.
+    """
+
+    def __init__(self, master_addr, ttl=DEFAULT_LOCATION_TTL):
+        self.master_addr = master_addr
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # volume id -> (expiry time, publicUrls)
+        self.entries = {}
+        self.hits = 0
+        self.lookups = 0
+        self.invalidations = 0
+
+    def locations(self, volume_id):
+        """PublicUrls of the volume's replicas; empty when the lookup fails."""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(volume_id)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.lookups += 1
+        try:
+            with inflight_limits.slot(self.master_addr, master=True):
+                response = requests.get(f"{self.master_addr}/dir/lookup", params={'volumeId': volume_id})
+            locations = response.json().get('locations') or []
+        except Exception as e:
+            logging.error(f"Lookup of volume {volume_id} failed: {e}")
+            return []
+        servers = [location.get('publicUrl') or location.get('url') for location in locations]
+        servers = [server for server in servers if server]
+        if servers:
+            with self.lock:
+                self.entries[volume_id] = (now + self.ttl, servers)
+        return servers
+
+    def invalidate(self, volume_id):
+        with self.lock:
+            if self.entries.pop(volume_id, None) is not None:
+                self.invalidations += 1
+
+    def report(self):
+        print(f"Location cache: {self.hits} hits, {self.lookups} lookups, "
+              f"{self.invalidations} entries dropped after failed reads")
+
+class ReplicaBalancer:
+    """
+    Picks the replica of each read: the one with the fewest outstanding reads,
+    weighted by its recent read latency. Replicas not read from yet go first.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # publicUrl -> outstanding reads, running latency in seconds, reads, failed reads
+        self.outstanding = {}
+        self.latency = {}
+        self.reads = {}
+        self.errors = {}
+
+    def choose(self, servers):
+        """Pick a server for a read and count it outstanding until done()."""
+        with self.lock:
+            server = min(servers, key=lambda server: ((self.outstanding.get(server, 0) + 1) * self.latency.get(server, 0.0),
+                                                      self.outstanding.get(server, 0), random.random()))
+            self.outstanding[server] = self.outstanding.get(server, 0) + 1
+        return server
+
+    def done(self, server, seconds=None, failed=False):
+        """Finish a read of server; seconds None leaves the latency alone (the read was never sent)."""
+        with self.lock:
+            self.outstanding[server] -= 1
+            if seconds is None:
+                return
+            self.reads[server] = self.reads.get(server, 0) + 1
+            if failed:
+                self.errors[server] = self.errors.get(server, 0) + 1
+                seconds = max(seconds, READ_ERROR_PENALTY)
+            latency = self.latency.get(server)
+            self.latency[server] = seconds if latency is None else latency + REPLICA_LATENCY_SMOOTHING * (seconds - latency)
+
+    def report(self):
+        if not self.reads:
+            return
+        print("Replica reads:")
+        for server in sorted(self.reads):
+            print(f"  {server}: {self.reads[server]} reads, {self.errors.get(server, 0)} failed, "
+                  f"recent latency {self.latency[server] * 1000:.1f} ms")
+
+# Set to a LocationCache to spread reads over replicas, see read_needle()
+location_cache = None
+replica_balancer = ReplicaBalancer()
+
+# First-byte times the hedge delay is taken from, and how many are needed before hedging starts
+HEDGE_WINDOW = 1000
+HEDGE_MIN_SAMPLES = 20
+# The hedge delay percentile is recomputed after this many new samples
+HEDGE_RECOMPUTE = 32
+
+class HedgePolicy:
+    """
+    When to send a duplicate GET to another replica, and what hedging achieved.
+
+    The hedge delay is the given percentile of the last HEDGE_WINDOW first-byte
+    times, at least min_delay_ms. At most budget of all reads are hedged, so a
+    slow cluster is not flooded with duplicates. Every read records its first-byte
+    time and that of its primary (first) attempt, both from the start of the read;
+    for a hedged read the primary's time, once it answers, is what the read would
+    have taken without hedging. Only a 200/206 answer counts: a read or primary
+    that failed or was cut short is counted as censored, at the end of its race,
+    so slow and failing replicas are not left out of the figures. The delay percentile is taken over the attempts'
+    own first-byte times, which leave out queueing and the wait before a hedge.
+    Attempts share one keep-alive session of pool_size connections per server;
+    the connection of an attempt that loses is shut down at once.
+    """
+
+    def __init__(self, percentile=95.0, min_delay_ms=1.0, budget=0.1, pool_size=DEFAULT_POOL_SIZE):
+        self.percentile = percentile
+        self.min_delay = min_delay_ms / 1000
+        self.budget = budget
+        self.session = pooled_session(pool_size)
+        poolmanager = self.session.get_adapter('http://').poolmanager
+        poolmanager.pool_classes_by_scheme = {**poolmanager.pool_classes_by_scheme, 'http': _AbortablePool}
+        self.lock = threading.Lock()
+        self.started = 0
+        self.hedges_sent = 0
+        self.samples = deque(maxlen=HEDGE_WINDOW)
+        self.new_samples = 0
+        self.current_delay = None
+        self.reads = 0
+        self.hedged = 0
+        self.hedges_won = 0
+        # First-byte seconds of every read, with hedging and of the primary attempt alone,
+        # and how many of each are censored at the end of the race
+        self.hedged_latency = array('d')
+        self.primary_latency = array('d')
+        self.hedged_censored = 0
+        self.primary_censored = 0
+
+    def start(self):
+        """Count a new read towards the hedge budget."""
+        with self.lock:
+            self.started += 1
+
+    def delay(self):
+        """Seconds to wait for a first byte before hedging, None while warming up."""
+        with self.lock:
+            if len(self.samples) < HEDGE_MIN_SAMPLES:
+                return None
+            if self.current_delay is None or self.new_samples >= HEDGE_RECOMPUTE:
+                ordered = sorted(self.samples)
+                index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+                self.current_delay = max(self.min_delay, ordered[index])
+                self.new_samples = 0
+            return self.current_delay
+
+    def take_hedge(self):
+        """Whether the budget allows one more hedge; counts it if so."""
+        with self.lock:
+            if self.hedges_sent >= self.budget * self.started:
+                return False
+            self.hedges_sent += 1
+            return True
+
+    def sample(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.new_samples += 1
+
+    def record(self, race):
+        """Account for a finished read race."""
+        primary = race.attempts[0]
+        end = time.time() - race.started
+        with self.lock:
+            self.reads += 1
+            if len(race.attempts) > 1:
+                self.hedged += 1
+                if race.winner is not None and race.winner is not primary:
+                    self.hedges_won += 1
+            if race.winner is not None:
+                self.hedged_latency.append(race.winner.first_byte_at - race.started)
+            else:
+                self.hedged_latency.append(end)
+                self.hedged_censored += 1
+            if primary.ok:
+                self.primary_latency.append(primary.first_byte_at - race.started)
+            else:
+                self.primary_latency.append(end)
+                self.primary_censored += 1
+
+    def report(self):
+        if not self.reads:
+            return
+        delay = f"{self.current_delay * 1000:.1f} ms" if self.current_delay is not None else "not reached"
+        print(f"Hedged GETs: {self.hedged} of {self.reads} reads hedged ({self.hedged / self.reads:.2%}, "
+              f"budget {self.budget:.0%}), {self.hedges_won} won by the hedge; "
+              f"delay p{self.percentile:g} of first-byte time, last {delay}")
+        if not self.hedged_latency:
+            return
+        for label, latencies, censored in (('with hedging', self.hedged_latency, self.hedged_censored),
+                                           ('primary only', self.primary_latency, self.primary_censored)):
+            ordered = sorted(latencies)
+            percentiles = ', '.join(f"p{q} {ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))] * 1000:.1f} ms"
+                                    for q in (50, 95, 99))
+            print(f"  First-byte time {label}: {percentiles}, max {ordered[-1] * 1000:.1f} ms "
+                  f"({censored} censored at the end of their race)")
+
+# Read attempt running on the current thread, see _AbortableConnection
+_current_attempt = threading.local()
+# Guards which attempt each connection serves, see _ReadAttempt.abort()
+_attempts_lock = threading.Lock()
+
+class _AbortableConnection(HTTPConnection):
+    """Connection that registers with the read attempt of its thread, so the race can abort it."""
+
+    attempt = None
+
+    def connect(self):
+        super().connect()
+        self._attach()
+
+    def request(self, *args, **kwargs):
+        self._attach()
+        super().request(*args, **kwargs)
+
+    def _attach(self):
+        attempt = getattr(_current_attempt, 'attempt', None)
+        if attempt is not None:
+            attempt.attach(self)
+
+class _AbortablePool(HTTPConnectionPool):
+    ConnectionCls = _AbortableConnection
+
+    def _put_conn(self, conn):
+        # Back in the pool, the connection no longer belongs to the attempt that used it.
+        if conn is not None:
+            with _attempts_lock:
+                conn.attempt = None
+        super()._put_conn(conn)
+
+class _ReadAttempt:
+    def __init__(self, server):
+        self.server = server
+        # Seconds from sending the request to its first byte, and the time of that first byte
+        self.first_byte = None
+        self.first_byte_at = None
+        # Whether the answer was a 200/206
+        self.ok = False
+        # Seconds in the in-flight slot, up to the end of the body or the error
+        self.elapsed = None
+        self.response = None
+        self.error = None
+        self.finished = False
+        self.connection = None
+        self.aborted = False
+
+    def attach(self, connection):
+        """Note the connection the attempt runs on; raises if it has been aborted meanwhile."""
+        with _attempts_lock:
+            if self.aborted:
+                raise ConnectionAbortedError(f"Read from {self.server} lost the race")
+            connection.attempt = self
+            self.connection = connection
+
+    def abort(self):
+        """Shut down the attempt's connection, failing a request still waiting for its answer."""
+        with _attempts_lock:
+            self.aborted = True
+            connection = self.connection
+            # A connection back in the pool may already serve another read.
+            if connection is not None and connection.attempt is self and connection.sock is not None:
+                try:
+                    connection.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+class _ReadRace:
+    """Attempts of one hedged read; the first to answer with 200/206 wins, the others are aborted."""
+
+    def __init__(self, fid, headers, started):
+        self.fid = fid
+        self.headers = headers
+        # Start of the read; first-byte times of the race are recorded from it
+        self.started = started
+        self.attempts = []
+        self.winner = None
+        # Set once no more attempts will be launched; the race is recorded when they have all finished
+        self.closed = False
+        self.recorded = False
+        self.condition = threading.Condition()
+
+    def launch(self, server):
+        attempt = _ReadAttempt(server)
+        with self.condition:
+            self.attempts.append(attempt)
+            # A hedge launched just as the primary won has nothing left to do.
+            attempt.aborted = self.winner is not None
+        threading.Thread(target=self._run, args=(attempt,)).start()
+        return attempt
+
+    def _run(self, attempt):
+        _current_attempt.attempt = attempt
+        start_time = time.time()
+        ok = False
+        try:
+            with inflight_limits.slot(attempt.server):
+                start_time = time.time()
+                response = hedge_policy.session.get(f"http://{attempt.server}/{self.fid}", headers=self.headers,
+                                                    stream=True)
+                attempt.first_byte_at = time.time()
+                attempt.first_byte = attempt.first_byte_at - start_time
+                ok = attempt.ok = response.status_code in (200, 206)
+                with self.condition:
+                    if self.winner is None and ok:
+                        self.winner = attempt
+                        self.condition.notify_all()
+                if self.winner is attempt:
+                    for other in self.attempts:
+                        if other is not attempt:
+                            other.abort()
+                if self.winner is attempt or not ok:
+                    # Read the body of the winner, and of errors to log them.
+                    response.content
+                    attempt.response = response
+                else:
+                    # Lost the race: drop the connection instead of reading the body.
+                    response.close()
+        except Exception as e:
+            attempt.error = e
+        finally:
+            attempt.elapsed = time.time() - start_time
+            if attempt.aborted and attempt.error is not None:
+                # Cut short by the winner: says nothing about this replica.
+                replica_balancer.done(attempt.server)
+            else:
+                replica_balancer.done(attempt.server, attempt.elapsed, failed=not ok)
+            if ok:
+                hedge_policy.sample(attempt.first_byte)
+            with self.condition:
+                attempt.finished = True
+                self.condition.notify_all()
+            self._record_when_done()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+        self._record_when_done()
+
+    def _record_when_done(self):
+        with self.condition:
+            if self.recorded or not self.closed or not all(attempt.finished for attempt in self.attempts):
+                return
+            self.recorded = True
+        hedge_policy.record(self)
+
+    def wait(self, timeout=None):
+        """Wait up to timeout for a winner or for every attempt to finish; returns the winner or None."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.winner is not None or all(a.finished for a in self.attempts), timeout)
+            return self.winner
+
+def _hedged_read(fid, volume_id, public_url, headers):
+    """
+    GET a needle from the replica the balancer picks, and from a second replica
+    too if the first has failed, or has not answered within the hedge delay and
+    the hedge budget allows. The first successful answer wins; the other request
+    is aborted right away. If every attempt fails, the volume's cached
+    locations are dropped and the read is raced once more on the other replicas.
+    """
+    start_time = time.time()
+    hedge_policy.start()
+    failed = []
+    for _ in range(2):
+        servers = [server for server in location_cache.locations(volume_id) if server not in failed]
+        race = _ReadRace(fid, headers, start_time)
+        primary = race.launch(replica_balancer.choose(servers or [public_url]))
+        others = [server for server in servers if server != primary.server]
+        # Without a delay yet, only a failed primary is retried on another replica.
+        if race.wait(hedge_policy.delay()) is None and others and (primary.finished or hedge_policy.take_hedge()):
+            race.launch(replica_balancer.choose(others))
+        race.close()
+        winner = race.wait()
+        if winner is not None:
+            # The winner has had its first byte; wait for its body.
+            with race.condition:
+                race.condition.wait_for(lambda: winner.finished)
+            if winner.response is not None:
+                return winner.response, winner.server, winner.elapsed
+            raise winner.error
+        location_cache.invalidate(volume_id)
+        failed.extend(attempt.server for attempt in race.attempts)
+    for attempt in race.attempts:
+        if attempt.response is not None:
+            return attempt.response, attempt.server, attempt.elapsed
+    raise race.attempts[-1].error
+
+# Set to a HedgePolicy to hedge reads across replicas (needs location_cache)
+hedge_policy = None
+
+def read_needle(fid, public_url, headers=None, session=requests):
+    """
+    GET a needle from public_url, or, with the location cache on, from the replica
+    the balancer picks among the volume's locations. With the cache, a failed read
+    drops the volume's cached locations and is retried once on another replica.
+
+    Returns:
+        tuple: (response, publicUrl read from, seconds taken inside the in-flight slot)
+    """
+    try:
+        volume_id = int(fid.partition(',')[0])
+    except ValueError:
+        volume_id = None
+    if location_cache is None or volume_id is None:
+        with inflight_limits.slot(public_url):
+            start_time = time.time()
+            response = session.get(f"http://{public_url}/{fid}", headers=headers)
+            return response, public_url, time.time() - start_time
+    if hedge_policy is not None:
+        return _hedged_read(fid, volume_id, public_url, headers)
+    failed = []
+    for attempt in range(2):
+        servers = [server for server in location_cache.locations(volume_id) if server not in failed]
+        server = replica_balancer.choose(servers or [public_url])
+        start_time = time.time()
+        try:
+            with inflight_limits.slot(server):
+                start_time = time.time()
+                response = session.get(f"http://{server}/{fid}", headers=headers)
+        except QueueRejected:
+            replica_balancer.done(server)
+            raise
+        except Exception as e:
+            replica_balancer.done(server, time.time() - start_time, failed=True)
+            if attempt:
+                raise
+            logging.debug(f"Read of {fid} from {server} failed, retrying on another replica: {e}")
+        else:
+            elapsed = time.time() - start_time
+            ok = response.status_code in (200, 206)
+            replica_balancer.done(server, elapsed, failed=not ok)
+            if ok or attempt:
+                return response, server, elapsed
+            logging.debug(f"Read of {fid} from {server} returned {response.status_code}, retrying on another replica")
+        location_cache.invalidate(volume_id)
+        failed.append(server)
+
+# Chunked uploads, see put_chunked(): objects above chunk_threshold bytes (None disables)
+# are split into chunk_size chunks, assigned chunk_batch needles per assign
+DEFAULT_CHUNK_SIZE = 8 << 20
+CHUNK_BATCH = 4
+TRANSFER_WORKERS = 32
+chunk_threshold = None
+chunk_size = DEFAULT_CHUNK_SIZE
+chunk_batch = CHUNK_BATCH
+# Large reads, see fetch_object(): GETs of at least fanout_threshold bytes (None disables)
+# are split into fanout_part_size ranges fetched in parallel
+DEFAULT_FANOUT_PART_SIZE = 8 << 20
+# Ranged GETs up to this size are coalesced when a coalescing window is set, see RangeCoalescer
+COALESCE_MAX_BYTES = 1 << 20
+fanout_threshold = None
+fanout_part_size = DEFAULT_FANOUT_PART_SIZE
+# Chunk assigns and uploads and parallel reads of all operation threads run on this pool
+transfer_pool = None
+# Object key -> chunks of a chunked object as (offset, size, fid, public_url), by offset
+chunk_manifests = {}
+transfer_sessions = threading.local()
+
+def _transfer_session():
+    session = getattr(transfer_sessions, 'session', None)
+    if session is None:
+        session = transfer_sessions.session = requests.Session()
+    return session
+
+def _assign_needles(master_addr, assign_params, count):
+    """Assign count needles with /dir/assign?count=N; returns their (fid, public_url)."""
+    needles = []
+    while len(needles) < count:
+        remaining = count - len(needles)
+        with inflight_limits.slot(master_addr, master=True):
+            assign_data = _transfer_session().get(f"{master_addr}/dir/assign",
+                                                  params={**assign_params, 'count': remaining}).json()
+        fid, public_url = assign_data.get("fid"), assign_data.get("publicUrl")
+        if not fid or not public_url:
+            raise RuntimeError(f"Missing publicUrl or fid in response: {assign_data}")
+        # The master may grant fewer needles than requested.
+        granted = max(1, min(int(assign_data.get("count", 1)), remaining))
+        needles.extend((_offset_fid(fid, delta), public_url) for delta in range(granted))
+    return needles
+
+def _upload_needle(public_url, path, data, content_type):
+    url = f"http://{public_url}/{path}"
+    with inflight_limits.slot(public_url):
+        response = _transfer_session().post(url, files={'file': upload_part(data, content_type)})
+    if response.status_code != 201:
+        raise RuntimeError(f"Upload to {url} failed with status code {response.status_code}. Response: {response.text}")
+
+def _fetch_range(public_url, fid, first, last, out):
+    """GET bytes first..last of a needle into the memoryview out; returns the publicUrl read from."""
+    response, server, _ = read_needle(fid, public_url, {'Range': f'bytes={first}-{last}'}, _transfer_session())
+    if response.status_code not in (200, 206):
+        raise RuntimeError(f"GET of {fid} from {server} failed with status code {response.status_code}. "
+                           f"Response: {response.text}")
+    content = response.content if response.status_code == 206 else response.content[first:last + 1]
+    if len(content) != len(out):
+        raise RuntimeError(f"GET of {fid} from {server} returned {len(content)} of {len(out)} bytes")
+    out[:] = content
+    return server
+
+def put_chunked(master_addr, object_id, size_bytes, assign_params):
+    """
+    Upload an object as chunks plus a chunk manifest, the way the filer stores large files.
+
+    Needles are assigned chunk_batch at a time with /dir/assign?count=N, so the
+    batches spread over volumes and servers, and all chunks upload in parallel on
+    transfer_pool. The manifest, an operation.ChunkManifest JSON with the fid, offset
+    and size of every chunk, goes to a needle of its own with ?cm=true: the volume
+    server serves the whole object from the manifest fid and deletes the chunks with
+    it. The logged PUT time covers the chunk and manifest uploads, not the assigns.
+    """
+    offsets = range(0, size_bytes, chunk_size)
+    # One more needle than chunks, the first, holds the manifest.
+    counts = [min(chunk_batch, len(offsets) + 1 - first) for first in range(0, len(offsets) + 1, chunk_batch)]
+    batches = transfer_pool.map(lambda count: _assign_needles(master_addr, assign_params, count), counts)
+    needles = [needle for batch in batches for needle in batch]
+    (manifest_fid, manifest_url), chunk_needles = needles[0], needles[1:]
+    chunks = tuple((offset, min(chunk_size, size_bytes - offset), fid, public_url)
+                   for offset, (fid, public_url) in zip(offsets, chunk_needles))
+    logging.debug(f"Uploading {object_id} as {len(chunks)} chunks, manifest {manifest_fid} on {manifest_url}")
+
+    start_time = time.time()
+    uploads = [transfer_pool.submit(_upload_needle, public_url, fid,
+                                    largest_file_data[offset:offset + size], payload_content_type)
+               for offset, size, fid, public_url in chunks]
+    for upload in uploads:
+        upload.result()
+    manifest = {'name': object_id, 'size': size_bytes,
+                'chunks': [{'fid': fid, 'offset': offset, 'size': size} for offset, size, fid, _ in chunks]}
+    if payload_content_type:
+        manifest['mime'] = payload_content_type
+    _upload_needle(manifest_url, f"{manifest_fid}?cm=true",
+                   json.dumps(manifest, separators=(',', ':')).encode(), 'application/json')
+    elapsed = time.time() - start_time
+    throughput = size_bytes / elapsed if elapsed > 0 else 0
+    logging.info(f"PUT,{object_id},{size_bytes},{elapsed},{throughput:.2f}")
+    for offset, size, fid, public_url in chunks:
+        volume_load.record('write', fid, public_url, size, assign_params.get('collection'))
+
+    object_key = id_codec.encode(object_id)
+    with mappings_lock:
+        object_mappings[object_key] = pack_location(object_key, manifest_fid, manifest_url)
+        stored_sizes[object_key] = size_bytes
+        chunk_manifests[object_key] = chunks
+    logging.debug(f"Saved mapping for chunked object {object_id}: fid={manifest_fid}, publicUrl={manifest_url}")
+
+def put_object(master_addr, object_id, size_bytes, timestamp=None):
     """Execute PUT operation using a slice of the pre-created in-memory buffer."""
     logging.debug(f"Executing PUT for object {object_id} with size {size_bytes} bytes")
     
-    if object_id not in object_sizes:
+    if id_codec.encode(object_id) not in object_sizes:
         logging.error(f"No size mapping found for object {object_id}. Skipping PUT operation.")
         return
     
     try:
+        assign_params = assign_policy.params(object_id, size_bytes, timestamp)
+        if chunk_threshold is not None and size_bytes > chunk_threshold:
+            put_chunked(master_addr, object_id, size_bytes, assign_params)
+            return
+
         # Get assignment from master server
         assign_url = f"{master_addr}/dir/assign"
-        logging.debug(f"Requesting directory assignment from {assign_url}")
-        assign_response = requests.get(assign_url)
+        logging.debug(f"Requesting directory assignment from {assign_url} with {assign_params}")
+        with inflight_limits.slot(master_addr, master=True):
+            assign_response = requests.get(assign_url, params=assign_params)
         assign_data = assign_response.json()
         
         public_url = assign_data.get("publicUrl")
@@ -78,66 +1015,253 @@ def put_object(master_addr, object_id, size_bytes):
         # Slice out the needed portion of the in-memory buffer and wrap it in a BytesIO stream
         upload_url = f"http://{public_url}/{fid}"
         data_slice = largest_file_data[:size_bytes]
-        file_obj = io.BytesIO(data_slice)
         logging.debug(f"Uploading data slice of size {len(data_slice)} bytes to {upload_url}")
-        start_time = time.time()
-        upload_response = requests.post(
-            upload_url,
-            files={'file': ('file', file_obj)}
-        )
-        end_time = time.time()
+        with inflight_limits.slot(public_url):
+            start_time = time.time()
+            upload_response = requests.post(
+                upload_url,
+                files={'file': upload_part(data_slice, payload_content_type)}
+            )
+            end_time = time.time()
         elapsed = end_time - start_time
         throughput = size_bytes / elapsed if elapsed > 0 else 0
         logging.info(f"PUT,{object_id},{size_bytes},{elapsed},{throughput:.2f}")
         logging.debug(f"PUT response: {upload_response.json()}")
+        volume_load.record('write', fid, public_url, size_bytes, assign_params.get('collection'))
         
         # Store the mapping for later GET and DELETE operations
-        object_mappings[object_id] = (fid, public_url)
+        object_key = id_codec.encode(object_id)
+        with mappings_lock:
+            object_mappings[object_key] = pack_location(object_key, fid, public_url)
+            stored_sizes[object_key] = size_bytes
+            chunk_manifests.pop(object_key, None)
         logging.debug(f"Saved mapping for object {object_id}: fid={fid}, publicUrl={public_url}")
     
     except Exception as e:
         logging.error(f"Error during PUT operation for object {object_id}: {e}")
 
+class ObjectThroughput:
+    """
+    Reads, bytes, transfer time and requests per object over every GET fetch of it.
+
+    Objects are listed by id_codec key; ids that are not 16-digit hex show as their hash.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # object key -> (fetches, bytes, microseconds, requests)
+        self.objects = id_codec.IdMap(width=4)
+
+    def record(self, object_key, num_bytes, seconds, num_requests=1):
+        with self.lock:
+            fetches, total_bytes, micros, total_requests = self.objects.get(object_key, (0, 0, 0, 0))
+            self.objects[object_key] = (fetches + 1, total_bytes + num_bytes, micros + int(seconds * 1e6),
+                                        total_requests + num_requests)
+
+    def report(self, top=10):
+        rows = sorted(self.objects.items(), key=lambda item: item[1][1], reverse=True)
+        rates = sorted(total_bytes / micros for _, (_, total_bytes, micros, _) in rows if micros)
+        if not rates:
+            return
+        percentiles = ', '.join(f"p{q} {rates[min(len(rates) - 1, int(len(rates) * q / 100))]:.2f} MB/s"
+                                for q in (10, 50, 90))
+        print(f"Per-object read throughput over {len(rates)} objects: {percentiles}")
+        print(f"Largest {min(top, len(rows))} objects by bytes read:")
+        for object_key, (fetches, total_bytes, micros, total_requests) in rows[:top]:
+            rate = total_bytes / micros if micros else float('nan')
+            print(f"  {id_codec.format_id(object_key)}: {fetches} reads, {total_bytes} B in {total_requests} requests, "
+                  f"{rate:.2f} MB/s")
+
+    def write_csv(self, path):
+        with open(path, 'w') as f:
+            f.write("object,reads,bytes,seconds,requests,mb_per_s\n")
+            for object_key, (fetches, total_bytes, micros, total_requests) in self.objects.items():
+                rate = total_bytes / micros if micros else 0
+                f.write(f"{id_codec.format_id(object_key)},{fetches},{total_bytes},{micros / 1e6},"
+                        f"{total_requests},{rate:.3f}\n")
+
+object_throughput = ObjectThroughput()
+
+def _fetch_parallel(object_id, chunks, range_start=None, range_end=None):
+    """
+    Read a range of an object laid out as chunks, (offset, size, fid, public_url).
+
+    The part of every chunk overlapping the range, split further into pieces of at
+    most fanout_part_size while fan-out is on, is fetched with a Range request on
+    transfer_pool, straight into one buffer allocated for the whole response.
+    Returns the buffer, or None, and the seconds from the first request to the last answer.
+    """
+    object_size = chunks[-1][0] + chunks[-1][1]
+    start = 0 if range_start is None else range_start
+    end = object_size - 1 if range_end is None else min(range_end, object_size - 1)
+    if start > end:
+        logging.error(f"GET range {range_start}-{range_end} is outside object {object_id} of {object_size} bytes")
+        return None, 0.0
+    piece_size = fanout_part_size if fanout_threshold is not None else object_size
+    buffer = bytearray(end - start + 1)
+    view = memoryview(buffer)
+    parts = []
+    for offset, size, fid, public_url in chunks:
+        first, last = max(start, offset), min(end, offset + size - 1)
+        for piece in range(first, last + 1, piece_size):
+            piece_end = min(last, piece + piece_size - 1)
+            parts.append((fid, public_url, piece - offset, piece_end - offset, view[piece - start:piece_end - start + 1]))
+    start_time = time.time()
+    fetches = [transfer_pool.submit(_fetch_range, public_url, fid, first, last, out)
+               for fid, public_url, first, last, out in parts]
+    servers = [fetch.result() for fetch in fetches]
+    elapsed = time.time() - start_time
+    for (fid, _, first, last, _), server in zip(parts, servers):
+        volume_load.record('read', fid, server, last - first + 1)
+    object_throughput.record(id_codec.encode(object_id), len(buffer), elapsed, len(parts))
+    return buffer, elapsed
+
+def fetch_object(object_id, range_start=None, range_end=None):
+    """
+    Read an object, or bytes range_start..range_end of it, from the volume servers.
+
+    Chunked objects, and other reads of at least fanout_threshold bytes, go through
+    _fetch_parallel(); everything else is a single request. Returns the content, or
+    None after logging why there is none, and the seconds the volume servers took,
+    without the waits for in-flight slots.
+    """
+    object_key = id_codec.encode(object_id)
+    with mappings_lock:
+        location = object_mappings.get(object_key)
+        location = None if location is None else unpack_location(object_key, location)
+        chunks = chunk_manifests.get(object_key)
+        object_size = stored_sizes.get(object_key)
+    if location is None:
+        logging.error(f"No mapping found for object {object_id}. Cannot execute GET operation.")
+        return None, 0.0
+    fid, public_url = location
+    if chunks is None and fanout_threshold is not None and object_size is not None:
+        read_size = object_size
+        if range_start is not None and range_end is not None:
+            read_size = min(range_end, object_size - 1) - range_start + 1
+        if read_size >= fanout_threshold:
+            chunks = ((0, object_size, fid, public_url),)
+    if chunks is not None:
+        return _fetch_parallel(object_id, chunks, range_start, range_end)
+
+    headers = {}
+    if range_start is not None and range_end is not None:
+        logging.debug(f"With range: {range_start}-{range_end}")
+        headers['Range'] = f'bytes={range_start}-{range_end}'
+    logging.debug(f"Sending GET request for {fid}")
+    response, server, elapsed = read_needle(fid, public_url, headers)
+    if response.status_code not in (200, 206):
+        logging.error(f"GET operation for {object_id} failed with status code {response.status_code}. Response: {response.text}")
+        return None, elapsed
+    volume_load.record('read', fid, server, len(response.content))
+    object_throughput.record(object_key, len(response.content), elapsed)
+    return response.content, elapsed
+
+def _log_get(object_id, range_start, range_end, content, elapsed, wait):
+    """
+    Log a completed GET and save its content under ./temp.
+
+    elapsed is the service time of the read, as fetch_object() returns it; wait is
+    the rest of the GET's time since its dispatch, spent in the client queues, the
+    location lookup, the hedge delay or a coalescing window. It follows as an extra
+    field, so the time and throughput fields hold service time only.
+    """
+    content_length = len(content)
+    logging.debug(f"GET operation for {object_id} completed successfully")
+    logging.debug(f"Received {content_length} bytes of data")
+    throughput = content_length / elapsed if elapsed > 0 else 0
+    logging.info(f"GET,{object_id},{content_length},{elapsed},{throughput:.2f},{wait:.6f}")
+
+    if range_start is not None and range_end is not None:
+        output_path = f"./temp/{object_id}_range_{range_start}_{range_end}"
+    else:
+        output_path = f"./temp/{object_id}_full"
+    with open(output_path, 'wb') as f:
+        f.write(content)
+    logging.debug(f"Saved response to {output_path}")
+
+class _RangeBatch:
+    def __init__(self, range_start, range_end):
+        self.start = range_start
+        self.end = range_end
+        self.content = None
+        self.elapsed = 0.0
+        self.done = threading.Event()
+
+class RangeCoalescer:
+    """
+    Merge small ranged GETs of one object arriving within a short window into one request.
+
+    The first GET of an object opens a batch and waits window_ms. Ranged GETs of at
+    most max_bytes that start or end within max_gap bytes of the batch's range join
+    it and widen it. The batch then fetches its whole range once, and every GET
+    takes its slice, logged with the batch's service time and, as its wait, the
+    rest of the time since its own dispatch.
+    """
+
+    def __init__(self, window_ms, max_bytes, max_gap=0):
+        self.window = window_ms / 1000
+        self.max_bytes = max_bytes
+        self.max_gap = max_gap
+        self.lock = threading.Lock()
+        # object id -> batch still accepting GETs
+        self.open = {}
+        self.requests = 0
+        self.coalesced = 0
+
+    def eligible(self, range_start, range_end):
+        return range_start is not None and range_end is not None and range_end - range_start + 1 <= self.max_bytes
+
+    def get(self, object_id, range_start, range_end):
+        start_time = time.time()
+        with self.lock:
+            batch = self.open.get(object_id)
+            joined = (batch is not None and range_start <= batch.end + self.max_gap + 1
+                      and range_end + self.max_gap + 1 >= batch.start)
+            if joined:
+                batch.start, batch.end = min(batch.start, range_start), max(batch.end, range_end)
+                self.coalesced += 1
+            else:
+                # A batch of another part of the object stops accepting GETs but still completes.
+                batch = self.open[object_id] = _RangeBatch(range_start, range_end)
+                self.requests += 1
+        if joined:
+            batch.done.wait()
+        else:
+            time.sleep(self.window)
+            with self.lock:
+                if self.open.get(object_id) is batch:
+                    del self.open[object_id]
+            try:
+                batch.content, batch.elapsed = fetch_object(object_id, batch.start, batch.end)
+            except Exception as e:
+                logging.error(f"Error during coalesced GET operation for object {object_id}: {e}")
+            finally:
+                batch.done.set()
+        if batch.content is not None:
+            part = batch.content[range_start - batch.start:range_end - batch.start + 1]
+            _log_get(object_id, range_start, range_end, part, batch.elapsed,
+                     max(0.0, time.time() - start_time - batch.elapsed))
+
+    def report(self):
+        if self.requests:
+            print(f"Coalesced {self.requests + self.coalesced} small ranged GETs into {self.requests} requests")
+
+range_coalescer = None
+
 def get_object(master_addr, object_id, range_start=None, range_end=None):
     """Execute GET operation."""
     logging.debug(f"Executing GET for object {object_id}")
-    
-    if object_id not in object_mappings:
-        logging.error(f"No mapping found for object {object_id}. Cannot execute GET operation.")
+    if range_coalescer is not None and range_coalescer.eligible(range_start, range_end):
+        range_coalescer.get(object_id, range_start, range_end)
         return
     
-    fid, public_url = object_mappings[object_id]
-    url = f"http://{public_url}/{fid}"
-    
     try:
-        headers = {}
-        if range_start is not None and range_end is not None:
-            logging.debug(f"With range: {range_start}-{range_end}")
-            headers['Range'] = f'bytes={range_start}-{range_end}'
-        
-        logging.debug(f"Sending GET request to {url}")
         start_time = time.time()
-        response = requests.get(url, headers=headers)
-        end_time = time.time()
-        elapsed = end_time - start_time
-        
-        if response.status_code in (200, 206):
-            content_length = len(response.content)
-            logging.debug(f"GET operation for {object_id} completed successfully")
-            logging.debug(f"Received {content_length} bytes of data")
-            throughput = content_length / elapsed if elapsed > 0 else 0
-            logging.info(f"GET,{object_id},{content_length},{elapsed},{throughput:.2f}")
-            
-            if range_start is not None and range_end is not None:
-                output_path = f"./temp/{object_id}_range_{range_start}_{range_end}"
-            else:
-                output_path = f"./temp/{object_id}_full"
-                
-            with open(output_path, 'wb') as f:
-                f.write(response.content)
-            logging.debug(f"Saved response to {output_path}")
-        else:
-            logging.error(f"GET operation for {object_id} failed with status code {response.status_code}. Response: {response.text}")
+        content, elapsed = fetch_object(object_id, range_start, range_end)
+        if content is not None:
+            _log_get(object_id, range_start, range_end, content, elapsed,
+                     max(0.0, time.time() - start_time - elapsed))
     
     except Exception as e:
         logging.error(f"Error during GET operation: {e}")
@@ -146,20 +1270,37 @@ def delete_object(master_addr, object_id):
     """Execute DELETE operation."""
     logging.debug(f"Executing DELETE for object {object_id}")
     
-    if object_id not in object_mappings:
+    location = lookup_location(object_id)
+    if location is None:
         logging.error(f"No mapping found for object {object_id}. Cannot execute DELETE operation.")
         return
     
-    fid, public_url = object_mappings[object_id]
+    fid, public_url = location
     url = f"http://{public_url}/{fid}"
     
     try:
         logging.debug(f"Sending DELETE request to {url}")
-        response = requests.delete(url)
+        with inflight_limits.slot(public_url):
+            response = requests.delete(url)
+        if response.status_code in (200, 202, 204):
+            with mappings_lock:
+                chunks = chunk_manifests.get(id_codec.encode(object_id))
+                stored_size = stored_sizes.get(id_codec.encode(object_id), 0)
+            if chunks:
+                # The volume server deleted the chunks along with their manifest.
+                for _, size, chunk_fid, chunk_url in chunks:
+                    volume_load.record('delete', chunk_fid, chunk_url, size)
+            else:
+                volume_load.record('delete', fid, public_url, stored_size)
         
         if response.status_code in (200, 204):
             logging.debug(f"DELETE operation for {object_id} completed successfully")
-            del object_mappings[object_id]
+            object_key = id_codec.encode(object_id)
+            with mappings_lock:
+                object_mappings.pop(object_key)
+                stored_sizes.pop(object_key, None)
+                irregular_locations.pop(object_key, None)
+                chunk_manifests.pop(object_key, None)
             logging.debug(f"Removed mapping for object {object_id}")
         elif response.status_code == 202:
             logging.debug(f"DELETE operation for {object_id} returns 202")
@@ -169,26 +1310,388 @@ def delete_object(master_addr, object_id):
     except Exception as e:
         logging.error(f"Error during DELETE operation: {e}")
 
-def execute_trace(trace_file, master_addr):
-    """Execute operations from trace file with timing in separate threads."""
+# Preload defaults: objects per /dir/assign?count=N request and concurrent upload batches
+PRELOAD_BATCH = 64
+PRELOAD_WORKERS = 64
+# Seconds between preload progress messages
+PRELOAD_PROGRESS_INTERVAL = 10
+preload_sessions = threading.local()
+
+def collect_preload_set(trace_file, source='puts'):
+    """
+    Collect the objects to preload, in order of first reference.
+
+    Args:
+        trace_file (str): Path to trace file (text or binary)
+        source (str): 'puts' for every object PUT by the trace, 'gets' for every
+            object read by a GET (sized by the object size or the end of the range)
+
+    Returns:
+        tuple: numpy.ndarrays of the object keys, the largest size referenced of each
+            and the timestamp of its first reference
+    """
+    keys, sizes, timestamps = array('Q'), array('q'), array('q')
+    for op in trace_format.iter_ops(trace_file):
+        if source == 'puts' and op.operation == "REST.PUT.OBJECT":
+            size = op.size
+        elif source == 'gets' and op.operation == "REST.GET.OBJECT":
+            size = op.size if op.size is not None else (op.range_end + 1 if op.range_end is not None else None)
+        else:
+            continue
+        if size is None:
+            continue
+        keys.append(id_codec.encode(op.object_id))
+        sizes.append(size)
+        timestamps.append(op.timestamp)
+    keys, sizes = np.frombuffer(keys, dtype=np.uint64), np.frombuffer(sizes, dtype=np.int64)
+    timestamps = np.frombuffer(timestamps, dtype=np.int64)
+    unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    largest = np.zeros(len(unique_keys), dtype=np.int64)
+    np.maximum.at(largest, inverse.ravel(), sizes)
+    order = np.argsort(first)
+    return unique_keys[order], largest[order], timestamps[first[order]]
+
+def load_checkpoint(checkpoint_file):
+    """
+    Restore the locations of objects uploaded by an earlier preload.
+
+    Each checkpoint line is "<object key hex> <fid> <publicUrl>". A torn last line
+    is cut off, so the lines appended by the resumed preload start on a line of their own.
+
+    Returns:
+        numpy.ndarray: Sorted keys of the objects already uploaded
+    """
+    done = array('Q')
+    complete_bytes = 0
+    try:
+        with open(checkpoint_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                complete_bytes += len(line)
+                parts = line.decode('utf-8', errors='replace').split()
+                if len(parts) != 3:
+                    continue
+                object_key = int(parts[0], 16)
+                with mappings_lock:
+                    object_mappings[object_key] = pack_location(object_key, parts[1], parts[2])
+                done.append(object_key)
+    except FileNotFoundError:
+        return np.empty(0, dtype=np.uint64)
+    if os.path.getsize(checkpoint_file) > complete_bytes:
+        os.truncate(checkpoint_file, complete_bytes)
+    return np.unique(np.frombuffer(done, dtype=np.uint64))
+
+def _offset_fid(fid, delta):
+    """Fid of the delta-th needle of an assign with count > 1: the needle key plus delta, same cookie."""
+    if delta == 0:
+        return fid
+    volume_id, _, needle = fid.partition(',')
+    try:
+        key_hex = f"{int(needle[:-8], 16) + delta:x}"
+    except ValueError:
+        return f"{fid}_{delta}"
+    key_hex = key_hex.zfill(len(key_hex) + len(key_hex) % 2)
+    return f"{volume_id},{key_hex}{needle[-8:]}"
+
+def _preload_batch(master_addr, keys, sizes, collection=None):
+    """
+    Upload one batch of objects of one collection on locations from a single multi-needle assign.
+
+    Returns:
+        list: (object key, size, fid, public_url) of every object uploaded
+    """
+    session = getattr(preload_sessions, 'session', None)
+    if session is None:
+        session = preload_sessions.session = requests.Session()
+    params = dict(assign_policy.base)
+    if collection:
+        params['collection'] = collection
+    uploaded = []
+    while len(uploaded) < len(keys):
+        remaining = len(keys) - len(uploaded)
+        try:
+            assign_data = session.get(f"{master_addr}/dir/assign", params={**params, 'count': remaining}).json()
+        except Exception as e:
+            logging.error(f"Preload assign failed: {e}")
+            return uploaded
+        fid, public_url = assign_data.get("fid"), assign_data.get("publicUrl")
+        if not fid or not public_url:
+            logging.error(f"Error: Missing publicUrl or fid in response: {assign_data}")
+            return uploaded
+        # The master may grant fewer needles than requested.
+        granted = max(1, min(int(assign_data.get("count", 1)), remaining))
+        for delta in range(granted):
+            object_key, size = keys[len(uploaded)], sizes[len(uploaded)]
+            object_fid = _offset_fid(fid, delta)
+            try:
+                response = session.post(f"http://{public_url}/{object_fid}",
+                                        files={'file': upload_part(largest_file_data[:size], payload_content_type)})
+            except Exception as e:
+                logging.error(f"Preload upload of {object_fid} failed: {e}")
+                return uploaded
+            if response.status_code != 201:
+                logging.error(f"Preload upload of {object_fid} failed with status code {response.status_code}")
+                return uploaded
+            uploaded.append((object_key, size, object_fid, public_url))
+    return uploaded
+
+def preload(trace_file, master_addr, source='puts', checkpoint_file=None,
+            workers=PRELOAD_WORKERS, batch_size=PRELOAD_BATCH):
+    """
+    Upload the preload set of a trace as fast as possible, without trace pacing.
+
+    Batches of objects of the same collection (see AssignPolicy; lifetimes count
+    from the first PUT) share one /dir/assign?count=N and go to the volume server
+    it names, with many batches in flight so every volume server stays busy.
+    Uploaded locations are stored in object_mappings for the replay and appended
+    to checkpoint_file after every batch; objects found in an existing checkpoint
+    are not uploaded again.
+
+    Returns:
+        tuple: (objects uploaded now, objects restored from the checkpoint, objects failed)
+    """
+    global largest_file_data, largest_put_size
+    keys, sizes, timestamps = collect_preload_set(trace_file, source)
+    done = load_checkpoint(checkpoint_file) if checkpoint_file else np.empty(0, dtype=np.uint64)
+    restored = len(done)
+    is_done = id_codec.lookup_sorted(done, keys) >= 0
+    for key, size in zip(keys.tolist(), sizes.tolist()):
+        if key not in object_sizes:
+            object_sizes[key] = size
+    with mappings_lock:
+        # Checkpoint lines carry no size; restored objects were uploaded from this preload set.
+        for key, size in zip(keys[is_done].tolist(), sizes[is_done].tolist()):
+            stored_sizes[key] = size
+    pending, pending_sizes = keys[~is_done].tolist(), sizes[~is_done].tolist()
+    groups = {}
+    for key, size, collection in zip(pending, pending_sizes,
+                                     assign_policy.collections(keys[~is_done], sizes[~is_done], timestamps[~is_done])):
+        group_keys, group_sizes = groups.setdefault(collection, ([], []))
+        group_keys.append(key)
+        group_sizes.append(size)
+    largest = max(pending_sizes, default=0)
+    if largest > largest_put_size:
+        largest_file_data = make_payload(largest)
+        largest_put_size = largest
+    logging.info(f"Preloading {len(pending)} of {len(keys)} objects ({restored} restored from checkpoint)")
+
+    uploaded = uploaded_bytes = 0
+    start = last_progress = time.time()
+    checkpoint = open(checkpoint_file, 'a') if checkpoint_file else None
+    batches = ((collection, group_keys[i:i + batch_size], group_sizes[i:i + batch_size])
+               for collection, (group_keys, group_sizes) in groups.items()
+               for i in range(0, len(group_keys), batch_size))
+    in_flight = {}
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            # Keep a bounded number of batches queued rather than submitting them all up front.
+            for collection, batch_keys, batch_sizes in batches:
+                in_flight[executor.submit(_preload_batch, master_addr, batch_keys, batch_sizes, collection)] = collection
+                if len(in_flight) >= 2 * workers:
+                    break
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                collection = in_flight.pop(future)
+                results = future.result()
+                with mappings_lock:
+                    for object_key, size, fid, public_url in results:
+                        object_mappings[object_key] = pack_location(object_key, fid, public_url)
+                        stored_sizes[object_key] = size
+                for object_key, size, fid, public_url in results:
+                    volume_load.record('write', fid, public_url, size, collection)
+                if checkpoint:
+                    checkpoint.writelines(f"{object_key:x} {fid} {public_url}\n" for object_key, _, fid, public_url in results)
+                    checkpoint.flush()
+                uploaded += len(results)
+                uploaded_bytes += sum(size for _, size, _, _ in results)
+            now = time.time()
+            if now - last_progress >= PRELOAD_PROGRESS_INTERVAL:
+                last_progress = now
+                logging.info(f"Preloaded {uploaded}/{len(pending)} objects, {uploaded / (now - start):.0f} objects/s, "
+                             f"{uploaded_bytes / (now - start) / 1e6:.1f} MB/s")
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if checkpoint:
+            checkpoint.close()
+    failed = len(pending) - uploaded
+    return uploaded, restored, failed
+
+# Upper edges in ms of the dispatch lag histogram buckets; the last bucket is open
+LAG_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+# Weight of the newest op in the running lag average behind the saturation signal
+LAG_SMOOTHING = 0.05
+
+class DispatchTracker:
+    """
+    Per-op scheduled, dispatch and completion times of a trace replay.
+
+    The dispatch lag of an op is the time from its trace-scheduled start to the
+    moment its request thread starts running. An op is on time when its lag is at
+    most lag_bound_ms. A running average of the lag drives a "client saturated"
+    signal: a warning is logged when the average exceeds the bound and again when
+    it drops below half of it. With abort_lag_ms set, the replay stops dispatching
+    once an op is that late.
+    """
+
+    def __init__(self, lag_bound_ms=10.0, abort_lag_ms=None):
+        self.lag_bound_ms = lag_bound_ms
+        self.abort_lag_ms = abort_lag_ms
+        self.lock = threading.Lock()
+        # Wall clock times in ms, indexed by op; completion is NaN until the op finishes
+        self.scheduled = array('d')
+        self.dispatched = array('d')
+        self.completed = array('d')
+        self.operations = array('B')
+        self.operation_names = []
+        self.histogram = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.average_lag_ms = 0.0
+        self.saturated = False
+        self.saturated_episodes = 0
+        self.aborted = False
+
+    def schedule(self, operation, scheduled_ms):
+        """Register an op about to be dispatched; returns its index."""
+        if operation not in self.operation_names:
+            self.operation_names.append(operation)
+        with self.lock:
+            self.scheduled.append(scheduled_ms)
+            self.dispatched.append(math.nan)
+            self.completed.append(math.nan)
+            self.operations.append(self.operation_names.index(operation))
+            return len(self.scheduled) - 1
+
+    def start(self, index):
+        """Record the dispatch of op index and update the saturation signal."""
+        now = time.time() * 1000
+        with self.lock:
+            self.dispatched[index] = now
+            lag = max(0.0, now - self.scheduled[index])
+            self.histogram[_lag_bucket(lag)] += 1
+            self.average_lag_ms += LAG_SMOOTHING * (lag - self.average_lag_ms)
+            if not self.saturated and self.average_lag_ms > self.lag_bound_ms:
+                self.saturated = True
+                self.saturated_episodes += 1
+                logging.warning(f"Client saturated: dispatch lag averages {self.average_lag_ms:.1f} ms "
+                                f"(bound {self.lag_bound_ms} ms) at op {index}")
+            elif self.saturated and self.average_lag_ms < self.lag_bound_ms / 2:
+                self.saturated = False
+                logging.warning(f"Client caught up: dispatch lag averages {self.average_lag_ms:.1f} ms at op {index}")
+            if self.abort_lag_ms is not None and lag > self.abort_lag_ms and not self.aborted:
+                self.aborted = True
+                logging.error(f"Aborting replay: op {index} dispatched {lag:.1f} ms late "
+                              f"(abort bound {self.abort_lag_ms} ms)")
+
+    def finish(self, index):
+        self.completed[index] = time.time() * 1000
+
+    def run(self, index, func, *args):
+        """Thread target: run one op between start() and finish()."""
+        self.start(index)
+        try:
+            func(*args)
+        finally:
+            self.finish(index)
+
+    def lags(self):
+        """Dispatch lag in ms of every dispatched op."""
+        lags = [dispatched - scheduled for scheduled, dispatched in zip(self.scheduled, self.dispatched)
+                if dispatched == dispatched]
+        return [max(0.0, lag) for lag in lags]
+
+    def write_log(self, path):
+        """Write one CSV row per op: operation, scheduled, dispatched and completed ms, lag ms."""
+        with open(path, 'w') as f:
+            f.write("operation,scheduled_ms,dispatched_ms,completed_ms,lag_ms\n")
+            for operation, scheduled, dispatched, completed in zip(self.operations, self.scheduled,
+                                                                    self.dispatched, self.completed):
+                f.write(f"{self.operation_names[operation]},{scheduled:.3f},{dispatched:.3f},"
+                        f"{completed:.3f},{dispatched - scheduled:.3f}\n")
+
+    def report(self):
+        """Print the share of ops dispatched on time, lag percentiles and the lag histogram."""
+        lags = sorted(self.lags())
+        if not lags:
+            print("No operations dispatched")
+            return
+        on_time = sum(1 for lag in lags if lag <= self.lag_bound_ms)
+        print(f"Dispatched {len(lags)} of {len(self.scheduled)} operations, "
+              f"{on_time / len(lags):.2%} on time (lag <= {self.lag_bound_ms} ms)")
+        percentiles = ', '.join(f"p{q} {lags[min(len(lags) - 1, int(len(lags) * q / 100))]:.1f} ms"
+                                for q in (50, 95, 99))
+        print(f"Dispatch lag: {percentiles}, max {lags[-1]:.1f} ms")
+        if self.saturated_episodes:
+            print(f"Client was saturated {self.saturated_episodes} time(s); latencies measured while "
+                  f"saturated include client queueing")
+        if self.aborted:
+            print(f"Replay aborted: dispatch lag exceeded {self.abort_lag_ms} ms")
+        service = [completed - dispatched for dispatched, completed in zip(self.dispatched, self.completed)
+                   if completed == completed and dispatched == dispatched]
+        if service:
+            print(f"Mean op duration after dispatch: {sum(service) / len(service):.1f} ms")
+        print("Dispatch lag histogram:")
+        lower = 0
+        last = max(bucket for bucket, count in enumerate(self.histogram) if count)
+        for upper, count in zip((LAG_BUCKETS_MS + [None])[:last + 1], self.histogram):
+            label = f"{lower}-{upper} ms" if upper is not None else f">{lower} ms"
+            print(f"  {label:>14}: {count}")
+            lower = upper
+
+def _lag_bucket(lag_ms):
+    for bucket, upper in enumerate(LAG_BUCKETS_MS):
+        if lag_ms <= upper:
+            return bucket
+    return len(LAG_BUCKETS_MS)
+
+class FidBackend:
+    """Replay backend for the master /dir/assign plus volume server fid path."""
+
+    name = 'fid'
+
+    def __init__(self, master_addr):
+        self.master_addr = master_addr
+
+    def setup(self):
+        pass
+
+    def put(self, object_id, size_bytes, timestamp=None):
+        put_object(self.master_addr, object_id, size_bytes, timestamp)
+
+    def get(self, object_id, range_start=None, range_end=None):
+        get_object(self.master_addr, object_id, range_start, range_end)
+
+    def delete(self, object_id):
+        delete_object(self.master_addr, object_id)
+
+def execute_trace(trace_file, backend, tracker=None):
+    """
+    Execute operations from trace file with timing in separate threads.
+
+    Operations go to backend, a FidBackend, S3Backend or FilerBackend; a master
+    address string selects the fid path. Every op is scheduled, dispatched and
+    completed through tracker, a DispatchTracker, which is returned after all
+    threads have finished.
+    """
     threads = []
     start_time = None
+    tracker = tracker or DispatchTracker()
+    if isinstance(backend, str):
+        backend = FidBackend(backend)
     
     logging.debug(f"Reading trace file: {trace_file}")
-    with open(trace_file, 'r') as f:
-        lines = f.readlines()
-        
-    logging.debug(f"Found {len(lines)} operations in trace file")
     
-    for line in lines:
-        parts = line.strip().split()
-        if len(parts) < 3:
-            logging.debug(f"Invalid trace line: {line}")
-            continue
-        
-        timestamp_ms = int(parts[0])
-        operation = parts[1]
-        object_id = parts[2]
+    def log_invalid(line):
+        logging.debug(f"Invalid trace line: {line}")
+    
+    for op in trace_format.iter_ops(trace_file, on_invalid=log_invalid):
+        if tracker.aborted:
+            break
+        timestamp_ms = op.timestamp
+        operation = op.operation
+        object_id = op.object_id
         
         if start_time is None:
             start_time = time.time() * 1000 - timestamp_ms
@@ -203,28 +1706,31 @@ def execute_trace(trace_file, master_addr):
             time.sleep(wait_time)
         
         if operation == "REST.PUT.OBJECT":
-            if len(parts) >= 4:
-                size_bytes = int(parts[3])
-                thread = threading.Thread(target=put_object, args=(master_addr, object_id, size_bytes))
+            if op.size is not None:
+                size_bytes = op.size
+                index = tracker.schedule(operation, target_time)
+                thread = threading.Thread(target=tracker.run, args=(index, backend.put, object_id, size_bytes, timestamp_ms))
                 thread.start()
                 threads.append(thread)
             else:
-                logging.error(f"Missing size for PUT operation: {line}")
+                logging.error(f"Missing size for PUT operation: {op}")
         
         elif operation == "REST.GET.OBJECT":
-            if len(parts) >= 6:
-                range_start = int(parts[4])
-                range_end = int(parts[5])
-                thread = threading.Thread(target=get_object, args=(master_addr, object_id, range_start, range_end))
+            index = tracker.schedule(operation, target_time)
+            if op.range_start is not None and op.range_end is not None:
+                range_start = op.range_start
+                range_end = op.range_end
+                thread = threading.Thread(target=tracker.run, args=(index, backend.get, object_id, range_start, range_end))
                 thread.start()
                 threads.append(thread)
             else:
-                thread = threading.Thread(target=get_object, args=(master_addr, object_id))
+                thread = threading.Thread(target=tracker.run, args=(index, backend.get, object_id))
                 thread.start()
                 threads.append(thread)
         
         elif operation == "REST.DELETE.OBJECT":
-            thread = threading.Thread(target=delete_object, args=(master_addr, object_id))
+            index = tracker.schedule(operation, target_time)
+            thread = threading.Thread(target=tracker.run, args=(index, backend.delete, object_id))
             thread.start()
             threads.append(thread)
         
@@ -233,19 +1739,203 @@ def execute_trace(trace_file, master_addr):
     
     for thread in threads:
         thread.join()
+    return tracker
 
 def main():
     parser = argparse.ArgumentParser(description='Execute operations from trace file.')
-    parser.add_argument('trace_file', help='Path to trace file')
-    parser.add_argument('--master', required=True, help='Master server address (e.g., http://localhost:9333)')
+    parser.add_argument('trace_file', help='Path to trace file (text or binary)')
+    parser.add_argument('--backend', choices=['fid', 's3', 'filer'], default='fid',
+                        help='Replay path: master assign plus volume server fids, the S3 gateway, or the filer HTTP API')
+    parser.add_argument('--master', help='Master server address (e.g., http://localhost:9333), for the fid backend')
+    parser.add_argument('--s3_endpoint', help='S3 gateway address (e.g., http://localhost:8333), for the s3 backend')
+    parser.add_argument('--bucket', default='bench', help='Bucket for the s3 backend, created if missing')
+    parser.add_argument('--access_key', default=os.environ.get('AWS_ACCESS_KEY_ID', ''),
+                        help='S3 access key (default: $AWS_ACCESS_KEY_ID; requests are unsigned when empty)')
+    parser.add_argument('--secret_key', default=os.environ.get('AWS_SECRET_ACCESS_KEY', ''),
+                        help='S3 secret key (default: $AWS_SECRET_ACCESS_KEY)')
+    parser.add_argument('--region', default=DEFAULT_REGION, help='S3 signing region')
+    parser.add_argument('--filer', help='Filer address (e.g., http://localhost:8888), for the filer backend')
+    parser.add_argument('--filer_prefix', default='/bench', help='Filer directory for the trace objects')
+    parser.add_argument('--pool_size', type=int, default=DEFAULT_POOL_SIZE,
+                        help='Keep-alive connections of the s3 and filer backends and of hedged reads')
+    parser.add_argument('--collection', help='Collection of every assign (fid backend)')
+    parser.add_argument('--replication', help='Replication of every assign, e.g. 001')
+    parser.add_argument('--ttl', help='TTL of every assign, e.g. 3d')
+    parser.add_argument('--data_center', help='Data center to assign in')
+    parser.add_argument('--rack', help='Rack to assign in')
+    parser.add_argument('--collection_by', choices=['size', 'lifetime'],
+                        help='Choose the collection of each PUT by object size (bytes) or lifetime until its DELETE (seconds)')
+    parser.add_argument('--collection_classes',
+                        help='Classes for --collection_by as "BOUND=COLLECTION,...,COLLECTION", e.g. "1048576=small,large"')
+    parser.add_argument('--volume_report', help='Write per-volume and per-server request and byte counters to this CSV file')
+    parser.add_argument('--compressibility', type=float,
+                        help='Build payloads from blocks this fraction of which compresses away (default: os.urandom payloads)')
+    parser.add_argument('--duplicate_ratio', type=float, default=0.0,
+                        help='Fraction of payload blocks repeating a block within the 32 KiB gzip window before them (with --compressibility)')
+    parser.add_argument('--payload_block_size', type=int, default=payload_gen.DEFAULT_BLOCK_SIZE,
+                        help='Payload block size in bytes (with --compressibility)')
+    parser.add_argument('--payload_seed', type=int, default=0, help='Seed of the generated payload')
+    parser.add_argument('--payload_mime', help='Content-Type of uploads, e.g. text/plain to let the volume server gzip them')
+    parser.add_argument('--chunk_threshold', type=int,
+                        help='Upload objects larger than this many bytes as parallel chunks plus a chunk manifest (fid backend)')
+    parser.add_argument('--chunk_size', type=int, default=DEFAULT_CHUNK_SIZE, help='Chunk size in bytes')
+    parser.add_argument('--chunk_batch', type=int, default=CHUNK_BATCH,
+                        help='Chunks per assign request; successive batches go to different volumes')
+    parser.add_argument('--fanout_threshold', type=int,
+                        help='Split GETs of at least this many bytes into parallel ranged requests (fid backend)')
+    parser.add_argument('--fanout_part_size', type=int, default=DEFAULT_FANOUT_PART_SIZE,
+                        help='Bytes per ranged request of a split GET')
+    parser.add_argument('--transfer_workers', type=int, default=TRANSFER_WORKERS,
+                        help='Concurrent chunk assigns, uploads and ranged reads across all operations')
+    parser.add_argument('--coalesce_window_ms', type=float,
+                        help='Merge small ranged GETs of one object arriving within this many ms into one request (fid backend)')
+    parser.add_argument('--coalesce_max_bytes', type=int, default=COALESCE_MAX_BYTES,
+                        help='Largest ranged GET that is coalesced')
+    parser.add_argument('--coalesce_gap', type=int, default=0,
+                        help='Bytes allowed between coalesced ranges (0: only touching or overlapping ranges)')
+    parser.add_argument('--location_cache', action='store_true',
+                        help="Read from the replica with the fewest outstanding reads and lowest latency among the volume's "
+                             "locations from /dir/lookup, instead of the assigned server (fid backend)")
+    parser.add_argument('--location_ttl', type=float, default=DEFAULT_LOCATION_TTL,
+                        help='Seconds a looked up volume location is reused')
+    parser.add_argument('--hedge_percentile', type=float,
+                        help='Send a duplicate GET to another replica when the first has not answered within this '
+                             'percentile of recent first-byte times, e.g. 95 (needs --location_cache)')
+    parser.add_argument('--hedge_min_delay_ms', type=float, default=1.0, help='Shortest hedge delay in ms')
+    parser.add_argument('--hedge_budget', type=float, default=0.1, help='Largest fraction of reads that are hedged')
+    parser.add_argument('--server_inflight', type=int,
+                        help='Most requests in flight per volume server; more wait in a client-side queue (fid backend)')
+    parser.add_argument('--master_inflight', type=int, help='Most assign requests in flight to the master')
+    parser.add_argument('--queue_limit', type=int, help='Reject requests finding this many already queued for their server')
+    parser.add_argument('--queue_timeout_ms', type=float, help='Reject requests queued longer than this many ms')
+    parser.add_argument('--queue_report', help='Write per-server queue depth, wait and rejection counts to this CSV file')
+    parser.add_argument('--throughput_report', help='Write per-object read throughput to this CSV file')
+    parser.add_argument('--disk_report', action='store_true',
+                        help="Compare bytes written per volume with the volume's size from /status after the replay (fid backend)")
+    parser.add_argument('--lag_bound_ms', type=float, default=10.0,
+                        help='Dispatch lag in ms up to which an op counts as on time; a higher average lag marks the client saturated')
+    parser.add_argument('--abort_lag_ms', type=float, default=None,
+                        help='Stop dispatching once an op is dispatched this many ms late')
+    parser.add_argument('--dispatch_log', help='Write per-op scheduled, dispatch and completion times to this CSV file')
+    parser.add_argument('--preload', choices=['puts', 'gets'],
+                        help='Before the replay, upload every object PUT by the trace (puts) or read by a GET (gets) without pacing')
+    parser.add_argument('--preload_only', action='store_true', help='Exit after the preload instead of replaying the trace')
+    parser.add_argument('--preload_workers', type=int, default=PRELOAD_WORKERS, help='Concurrent preload upload batches')
+    parser.add_argument('--preload_batch', type=int, default=PRELOAD_BATCH, help='Objects per preload assign request')
+    parser.add_argument('--checkpoint', help='Preload checkpoint file, resumed when it exists (default: <trace_file>.preload)')
     
     args = parser.parse_args()
+    payload = lambda size: largest_file_data[:size]
+    if args.backend == 'fid':
+        if not args.master:
+            parser.error('--master is required for the fid backend')
+        backend, target = FidBackend(args.master), f"master {args.master}"
+    elif args.backend == 's3':
+        if not args.s3_endpoint:
+            parser.error('--s3_endpoint is required for the s3 backend')
+        backend = S3Backend(args.s3_endpoint, args.bucket, args.access_key, args.secret_key, payload,
+                            args.region, args.pool_size, args.payload_mime)
+        target = f"S3 gateway {args.s3_endpoint}, bucket {args.bucket}"
+    else:
+        if not args.filer:
+            parser.error('--filer is required for the filer backend')
+        backend = FilerBackend(args.filer, args.filer_prefix, payload, args.pool_size, args.payload_mime)
+        target = f"filer {args.filer}{args.filer_prefix}"
+    if args.preload and args.backend != 'fid':
+        parser.error('--preload needs the fid backend')
+    if args.chunk_threshold is not None and args.backend != 'fid':
+        parser.error('--chunk_threshold needs the fid backend')
+    if args.chunk_size <= 0 or args.chunk_batch <= 0:
+        parser.error('--chunk_size and --chunk_batch must be positive')
+    if (args.fanout_threshold is not None or args.coalesce_window_ms is not None) and args.backend != 'fid':
+        parser.error('--fanout_threshold and --coalesce_window_ms need the fid backend')
+    if (args.server_inflight is not None or args.master_inflight is not None) and args.backend != 'fid':
+        parser.error('--server_inflight and --master_inflight need the fid backend')
+    if args.location_cache and args.backend != 'fid':
+        parser.error('--location_cache needs the fid backend')
+    if args.hedge_percentile is not None and not args.location_cache:
+        parser.error('--hedge_percentile needs --location_cache')
+    if args.hedge_percentile is not None and not 0 < args.hedge_percentile < 100:
+        parser.error('--hedge_percentile must be between 0 and 100')
+    if not 0 <= args.hedge_budget <= 1:
+        parser.error('--hedge_budget must be in [0, 1]')
+    if any(limit is not None and limit <= 0 for limit in (args.server_inflight, args.master_inflight)):
+        parser.error('--server_inflight and --master_inflight must be positive')
+    if args.fanout_part_size <= 0:
+        parser.error('--fanout_part_size must be positive')
+    if args.collection_by and not args.collection_classes:
+        parser.error('--collection_by needs --collection_classes')
+    global assign_policy, payload_options, payload_content_type, chunk_threshold, chunk_size, chunk_batch
+    global fanout_threshold, fanout_part_size, transfer_pool, range_coalescer, inflight_limits, location_cache
+    global hedge_policy
+    if args.compressibility is not None:
+        if not 0 <= args.compressibility <= 1 or not 0 <= args.duplicate_ratio < 1:
+            parser.error('--compressibility must be in [0, 1] and --duplicate_ratio in [0, 1)')
+        payload_options = {'compressibility': args.compressibility, 'duplicate_ratio': args.duplicate_ratio,
+                           'block_size': args.payload_block_size, 'seed': args.payload_seed}
+    payload_content_type = args.payload_mime
+    if args.chunk_threshold is not None:
+        chunk_threshold, chunk_size, chunk_batch = args.chunk_threshold, args.chunk_size, args.chunk_batch
+    if args.fanout_threshold is not None:
+        fanout_threshold, fanout_part_size = args.fanout_threshold, args.fanout_part_size
+    if chunk_threshold is not None or fanout_threshold is not None:
+        transfer_pool = ThreadPoolExecutor(max_workers=args.transfer_workers)
+    inflight_limits = InflightLimiter(args.server_inflight, args.master_inflight, args.queue_limit, args.queue_timeout_ms)
+    if args.location_cache:
+        location_cache = LocationCache(args.master, args.location_ttl)
+    if args.hedge_percentile is not None:
+        hedge_policy = HedgePolicy(args.hedge_percentile, args.hedge_min_delay_ms, args.hedge_budget, args.pool_size)
+    if args.coalesce_window_ms is not None:
+        range_coalescer = RangeCoalescer(args.coalesce_window_ms, args.coalesce_max_bytes, args.coalesce_gap)
+    assign_policy = AssignPolicy(args.collection, args.replication, args.ttl, args.data_center, args.rack,
+                                 args.collection_by,
+                                 AssignPolicy.parse_classes(args.collection_classes) if args.collection_by else None)
     
-    print(f"Starting trace execution from {args.trace_file} with master {args.master}")
+    print(f"Starting trace execution from {args.trace_file} with {target}")
     prepare_memory_buffer(args.trace_file)
+    assign_policy.prepare(args.trace_file)
+    if payload_options is not None and largest_file_data:
+        print(f"Payload gzip ratio: {payload_gen.gzip_ratio(largest_file_data):.3f}")
     print("Data preparation completed")
-    execute_trace(args.trace_file, args.master)
+    backend.setup()
+    if args.preload:
+        checkpoint_file = args.checkpoint or f"{args.trace_file}.preload"
+        try:
+            uploaded, restored, failed = preload(args.trace_file, args.master, args.preload, checkpoint_file,
+                                                 args.preload_workers, args.preload_batch)
+        except KeyboardInterrupt:
+            print(f"Preload interrupted; run again to resume from {checkpoint_file}")
+            return
+        print(f"Preload completed: {uploaded} objects uploaded, {restored} restored from {checkpoint_file}, {failed} failed")
+        if args.preload_only:
+            return
+    tracker = execute_trace(args.trace_file, backend, DispatchTracker(args.lag_bound_ms, args.abort_lag_ms))
     print("Trace execution completed")
+    tracker.report()
+    volume_load.report()
+    object_throughput.report()
+    if range_coalescer is not None:
+        range_coalescer.report()
+    inflight_limits.report()
+    if location_cache is not None:
+        location_cache.report()
+        replica_balancer.report()
+    if hedge_policy is not None:
+        hedge_policy.report()
+    if args.disk_report:
+        volume_load.report_disk_usage()
+    if args.volume_report:
+        volume_load.write_csv(args.volume_report)
+        print(f"Volume load saved to {args.volume_report}")
+    if args.queue_report:
+        inflight_limits.write_csv(args.queue_report)
+        print(f"Client queue statistics saved to {args.queue_report}")
+    if args.throughput_report:
+        object_throughput.write_csv(args.throughput_report)
+        print(f"Per-object throughput saved to {args.throughput_report}")
+    if args.dispatch_log:
+        tracker.write_log(args.dispatch_log)
+        print(f"Dispatch times saved to {args.dispatch_log}")
 
 if __name__ == "__main__":
     main()
@@ -5,6 +5,7 @@ import hashlib
 import requests
 import argparse
 from pathlib import Path
+import trace_format
 
 # Create temp directory if it doesn't exist
 Path("./temp").mkdir(exist_ok=True)
@@ -239,20 +240,14 @@ def execute_trace(trace_file, master_addr):
     #start_time = None
     
     print(f"Reading trace file: {trace_file}")
-    with open(trace_file, 'r') as f:
-        lines = f.readlines()
-        
-    print(f"Found {len(lines)} operations in trace file")
     
-    for line in lines:
-        parts = line.strip().split()
-        if len(parts) < 3:
-            print(f"Invalid trace line: {line}")
-            continue
-        
-        #timestamp_ms = int(parts[0])
-        operation = parts[1]
-        object_id = parts[2]
+    def report_invalid(line):
+        print(f"Invalid trace line: {line}")
+    
+    for op in trace_format.iter_ops(trace_file, on_invalid=report_invalid):
+        #timestamp_ms = op.timestamp
+        operation = op.operation
+        object_id = op.object_id
         
         # Set start time on first operation
         #if start_time is None:
@@ -270,16 +265,16 @@ def execute_trace(trace_file, master_addr):
         
         # Execute operation based on type
         if operation == "REST.PUT.OBJECT":
-            if len(parts) >= 4:
-                size_bytes = int(parts[3])
+            if op.size is not None:
+                size_bytes = op.size
                 put_object(master_addr, object_id, size_bytes)
             else:
-                print(f"Missing size for PUT operation: {line}")
+                print(f"Missing size for PUT operation: {op}")
         
         elif operation == "REST.GET.OBJECT":
-            if len(parts) >= 6:
-                range_start = int(parts[4])
-                range_end = int(parts[5])
+            if op.range_start is not None and op.range_end is not None:
+                range_start = op.range_start
+                range_end = op.range_end
                 get_object(master_addr, object_id, range_start, range_end)
             else:
                 get_object(master_addr, object_id)
@@ -292,7 +287,7 @@ def execute_trace(trace_file, master_addr):
 
 def main():
     parser = argparse.ArgumentParser(description='Execute operations from trace file with content verification.')
-    parser.add_argument('trace_file', help='Path to trace file')
+    parser.add_argument('trace_file', help='Path to trace file (text or binary)')
     parser.add_argument('--master', required=True, help='Master server address (e.g., http://localhost:9333)')
     parser.add_argument('--cleanup', action='store_true', help='Clean up temporary files after execution')
     
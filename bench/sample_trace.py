@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Sample Trace - downscale a trace by spatial sampling of objects (SHARDS-style).
+
+An object is kept, together with every one of its operations, when the hash of
+its id falls below rate * 2**64. Unlike truncating the trace in time, this keeps
+object lifetimes and the PUT/GET/DELETE mix of the sampled objects intact, and
+counts and byte totals of the sample estimate those of the full trace when
+divided by the rate.
+
+Timestamps can be compressed (e.g. --time_scale equal to the rate keeps the
+original request rate) and sizes scaled. The sample is written in the format of
+the input, so run_bench.py replays it directly.
+"""
+
+import os
+import argparse
+import numpy as np
+import trace_format
+import id_codec
+from get_stats import compute_stats
+from trace_filter import default_output_file
+
+IO_BUFFER_SIZE = 1 << 20
+
+# get_stats totals compared by the fidelity report: (key, label, scales with sizes)
+REPORT_METRICS = [
+    ('total', 'Total requests', False),
+    ('count_put', 'REST.PUT.OBJECT requests', False),
+    ('count_get', 'REST.GET.OBJECT requests', False),
+    ('count_delete', 'REST.DELETE.OBJECT requests', False),
+    ('put_size', 'Total PUT data size', True),
+    ('get_size', 'Total GET data size', True),
+    ('deleted_size', 'Total deleted object size', True),
+]
+
+
+def _scale_size(size, size_scale):
+    return max(1, int(round(size * size_scale))) if size > 0 else size
+
+
+def _rescale_fields(parts, first_timestamp, time_scale, size_scale):
+    """Rescale the timestamp, size and range fields of a text trace line in place."""
+    timestamp = int(parts[0])
+    parts[0] = str(first_timestamp + int(round((timestamp - first_timestamp) * time_scale)))
+    if size_scale == 1.0:
+        return
+    for index in (3, 4, 5):
+        if len(parts) > index:
+            try:
+                value = int(parts[index])
+            except ValueError:
+                continue
+            # Range offsets scale like sizes but may be 0.
+            parts[index] = str(_scale_size(value, size_scale) if index == 3 else int(value * size_scale))
+
+
+def _sample_text(input_file, output_file, threshold, seed, time_scale, size_scale):
+    kept = total = 0
+    first_timestamp = None
+    rescale = time_scale != 1.0 or size_scale != 1.0
+    with open(input_file, 'r', buffering=IO_BUFFER_SIZE) as infile, \
+            open(output_file, 'w', buffering=IO_BUFFER_SIZE) as outfile:
+        for line in infile:
+            parts = line.split()
+            if len(parts) < 3:
+                continue
+            try:
+                timestamp = int(parts[0])
+            except ValueError:
+                continue
+            total += 1
+            if first_timestamp is None:
+                first_timestamp = timestamp
+            if threshold is not None and id_codec.hash_key(id_codec.encode(parts[2]), seed) >= threshold:
+                continue
+            kept += 1
+            if rescale:
+                _rescale_fields(parts, first_timestamp, time_scale, size_scale)
+                line = ' '.join(parts) + '\n'
+            outfile.write(line)
+    return kept, total
+
+
+def _sample_binary(input_file, output_file, rate, seed, time_scale, size_scale):
+    threshold = id_codec.sampling_threshold(rate)
+    trace = trace_format.BinaryTrace(input_file)
+    object_ids = trace.object_ids
+    if threshold is None:
+        sampled = np.ones(len(object_ids), dtype=bool)
+    else:
+        sampled = id_codec.hash_keys(id_codec.encode_array(object_ids), seed) < np.uint64(threshold)
+    # The sample gets its own, smaller dictionary.
+    new_index = np.cumsum(sampled, dtype=np.int64) - 1
+    records = trace.records
+    first_timestamp = int(records['timestamp'][0]) if len(records) else 0
+    kept = 0
+    with trace_format.TraceWriter(output_file, op_names=trace.op_names,
+                                  object_ids=[oid for oid, keep in zip(object_ids, sampled.tolist()) if keep],
+                                  meta={'source': os.path.basename(input_file)}) as writer:
+        for chunk_start in range(0, len(records), trace_format.ITER_CHUNK):
+            chunk = records[chunk_start:chunk_start + trace_format.ITER_CHUNK]
+            chunk = np.array(chunk[sampled[chunk['object']]])
+            chunk['object'] = new_index[chunk['object']]
+            if time_scale != 1.0:
+                offset = np.rint((chunk['timestamp'] - first_timestamp) * time_scale).astype(np.int64)
+                chunk['timestamp'] = first_timestamp + offset
+            if size_scale != 1.0:
+                sizes = chunk['size']
+                chunk['size'] = np.where(sizes > 0, np.maximum(1, np.rint(sizes * size_scale)), sizes)
+                has_range = chunk['range_start'] >= 0
+                for field in ('range_start', 'range_end'):
+                    chunk[field] = np.where(has_range, (chunk[field] * size_scale).astype(np.int64), chunk[field])
+            writer.write_records(chunk)
+            kept += len(chunk)
+        writer.meta.update(sample_rate=rate, sample_seed=seed)
+    return kept, len(records)
+
+
+def sample_trace(input_file, output_file, rate, seed=0, time_scale=1.0, size_scale=1.0):
+    """
+    Write the operations of the objects sampled at rate to output_file.
+
+    Args:
+        input_file (str): Path to the trace file, text or binary
+        output_file (str): Path to the sampled trace, in the same format as the input
+        rate (float): Fraction of objects to keep, in (0, 1]
+        seed (int): Selects a different, independent sample of the objects
+        time_scale (float): Factor applied to time offsets from the first operation
+        size_scale (float): Factor applied to object sizes and range offsets
+
+    Returns:
+        tuple: (operations kept, operations read)
+    """
+    if trace_format.is_binary_trace(input_file):
+        return _sample_binary(input_file, output_file, rate, seed, time_scale, size_scale)
+    return _sample_text(input_file, output_file, id_codec.sampling_threshold(rate), seed, time_scale, size_scale)
+
+
+def fidelity_report(original, sample, rate, size_scale=1.0):
+    """
+    Compare get_stats totals of the full trace with those estimated from the sample.
+
+    Args:
+        original (dict): Totals of the full trace, from get_stats.compute_stats()
+        sample (dict): Totals of the sampled trace
+        rate (float): Sampling rate the sample was taken at
+        size_scale (float): Size factor the sample was written with
+
+    Returns:
+        list: (label, original value, estimate, relative error) per metric
+    """
+    rows = []
+    for key, label, scales_with_size in REPORT_METRICS:
+        estimate = sample[key] / rate / (size_scale if scales_with_size else 1.0)
+        error = (estimate - original[key]) / original[key] if original[key] else float('nan')
+        rows.append((label, original[key], estimate, error))
+    return rows
+
+
+def print_fidelity_report(rows):
+    print(f"{'Metric':<30} {'Full trace':>18} {'Sample estimate':>18} {'Error':>8}")
+    for label, original, estimate, error in rows:
+        print(f"{label:<30} {original:>18} {estimate:>18.0f} {error:>8.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Downscale a trace by sampling objects by hashed id')
+    parser.add_argument('input_file', help='Path to input trace file (text or binary)')
+    parser.add_argument('output_file', nargs='?', help='Path to output trace file (default: <input>_sample_<rate>)')
+    parser.add_argument('--rate', type=float, required=True, help='Fraction of objects to keep, e.g. 0.01')
+    parser.add_argument('--seed', type=int, default=0, help='Hash seed; different seeds give independent samples')
+    parser.add_argument('--time_scale', type=float, default=1.0,
+                        help='Scale time offsets from the first operation (use the rate to keep the request rate)')
+    parser.add_argument('--size_scale', type=float, default=1.0, help='Scale object sizes and range offsets')
+    parser.add_argument('--no_report', action='store_true', help='Skip the get_stats fidelity report')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for the fidelity report')
+    parser.add_argument('--no_cache', action='store_true', help='Re-parse traces instead of using the parse cache')
+
+    args = parser.parse_args()
+    if not 0 < args.rate <= 1:
+        parser.error('--rate must be in (0, 1]')
+    output_file = args.output_file or default_output_file(args.input_file, f"sample_{args.rate:g}")
+
+    try:
+        kept, total = sample_trace(args.input_file, output_file, args.rate, args.seed,
+                                   args.time_scale, args.size_scale)
+    except FileNotFoundError:
+        print(f"Error: File '{args.input_file}' not found.")
+        return
+    print(f"Kept {kept} of {total} operations ({kept / total if total else 0:.2%}) in {output_file}")
+
+    if not args.no_report:
+        use_cache = not args.no_cache
+        workers = args.workers if args.workers > 0 else os.cpu_count()
+        original = compute_stats(args.input_file, use_cache, workers)
+        sample = compute_stats(output_file, use_cache, workers)
+        print_fidelity_report(fidelity_report(original, sample, args.rate, args.size_scale))
+
+
+if __name__ == "__main__":
+    main()
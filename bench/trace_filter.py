@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+Trace Filter - clean and slice an IBM object store trace in a single streaming pass.
+
+Filters are chained and every line is tokenized once. Each stage only sees the
+lines kept by the stages before it, so its counters match what the standalone
+rm_head.py, rm_copy.py and rm_non_existing.py scripts print when they are run
+one after another. Without any filter options the standard
+cleaning chain (drop HEAD, drop COPY, drop GET/DELETE of non-existing objects)
+is applied.
+"""
+
+import os
+import argparse
+from array import array
+from itertools import islice, groupby
+from operator import attrgetter
+import numpy as np
+import trace_format
+import id_codec
+
+# Buffer size for reading and writing traces
+IO_BUFFER_SIZE = 1 << 20
+# Text lines filtered per batch, see run_pipeline()
+TEXT_CHUNK_LINES = 1 << 12
+
+
+def _matching_codes(trace, tokens):
+    """Operation codes of a binary trace whose names contain any of tokens."""
+    return [code for code, name in enumerate(trace.op_names) if any(token in name for token in tokens)]
+
+
+def _operation_kind(name):
+    """Classify an operation name the way ExistenceFilter does."""
+    for kind in ("PUT", "DELETE", "GET"):
+        if kind in name:
+            return kind
+    return None
+
+
+class _LineFilter:
+    """
+    Base of the filter stages: keep() decides one tokenized line. Batched stages
+    also decide a whole batch of tokenized lines at once with keep_lines().
+    """
+
+    batched = False
+
+
+class MethodFilter(_LineFilter):
+    """Remove lines whose method contains a given token, e.g. HEAD or COPY."""
+
+    def __init__(self, token):
+        self.name = f"remove {token}"
+        self.token = token
+        self.total = 0
+        self.removed = 0
+
+    def keep(self, fields):
+        self.total += 1
+        if len(fields) >= 2 and self.token in fields[1]:
+            self.removed += 1
+            return False
+        return True
+
+    def keep_records(self, records, trace):
+        keep = ~np.isin(records['op'], _matching_codes(trace, (self.token,)))
+        self.total += len(records)
+        self.removed += len(records) - int(keep.sum())
+        return keep
+
+    def report(self):
+        print(f"Total lines processed: {self.total}")
+        print(f"Lines removed: {self.removed}")
+        print(f"Remaining lines: {self.total - self.removed}")
+
+
+class ExistenceFilter(_LineFilter):
+    """Remove GET and DELETE operations on objects that were never PUT or are already deleted."""
+
+    batched = True
+    # Operation kinds of a batch of lines
+    OTHER, PUT, DELETE, GET, MALFORMED = range(5)
+    KIND_CODES = {"PUT": PUT, "DELETE": DELETE, "GET": GET}
+
+    def __init__(self):
+        self.name = "remove non-existing"
+        # Sorted keys (id_codec.encode) of the objects existing when recent_keys was last folded
+        # in, and sorted keys of the objects PUT or DELETEd since, with whether they exist now.
+        # Batches only merge into the smaller recent arrays; see _update().
+        self.existing_keys = np.empty(0, dtype=np.uint64)
+        self.recent_keys = np.empty(0, dtype=np.uint64)
+        self.recent_exists = np.empty(0, dtype=bool)
+        # Operation kind of every method name seen
+        self.kind_codes = {}
+        # Binary traces flag existing objects by their dense interned index, sized on the first chunk
+        self.existing_indices = None
+        self.stats = {
+            "total": 0,
+            "filtered_out": 0,
+            "put": 0,
+            "get_valid": 0,
+            "get_invalid": 0,
+            "delete_valid": 0,
+            "delete_invalid": 0
+        }
+
+    def keep(self, fields):
+        return bool(self.keep_lines([fields])[0])
+
+    def keep_lines(self, lines):
+        """
+        Decide a batch of lines with numpy.
+
+        A stable sort by object key lists the operations of every object in trace
+        order. An object exists at a GET or DELETE if the last PUT or DELETE of it
+        before that is a PUT, or, without one in the batch, if it existed after
+        the earlier batches. A DELETE removes the object whether or not it existed.
+        """
+        kind_codes, encode = self.kind_codes, id_codec.encode
+        for fields in lines:
+            if len(fields) >= 3 and fields[1] not in kind_codes:
+                kind_codes[fields[1]] = self.KIND_CODES.get(_operation_kind(fields[1]), self.OTHER)
+        kinds = bytes(kind_codes[fields[1]] if len(fields) >= 3 else self.MALFORMED for fields in lines)
+        keys = array('Q', (encode(fields[2]) if self.PUT <= kind <= self.GET else 0
+                           for fields, kind in zip(lines, kinds)))
+        kinds = np.frombuffer(kinds, dtype=np.uint8)
+        keys = np.frombuffer(keys, dtype=np.uint64)
+        keep = kinds != self.MALFORMED
+
+        rows = np.flatnonzero((kinds >= self.PUT) & (kinds <= self.GET))
+        rows = rows[np.argsort(keys[rows], kind='stable')]
+        sorted_keys, ops = keys[rows], kinds[rows]
+        position = np.arange(len(rows))
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        group_start = np.maximum.accumulate(np.where(first, position, 0))
+        # Last PUT or DELETE strictly before every row, and whether it belongs to the same object
+        is_update = ops != self.GET
+        previous_update = np.full(len(rows), -1)
+        previous_update[1:] = np.maximum.accumulate(np.where(is_update, position, -1))[:-1]
+        in_batch = previous_update >= group_start
+        existed = self._exists(sorted_keys)
+        existed[in_batch] = ops[previous_update[in_batch]] == self.PUT
+        checked = ops != self.PUT
+        keep[rows[checked]] = existed[checked]
+
+        stats = self.stats
+        gets, deletes = ops == self.GET, ops == self.DELETE
+        stats["total"] += len(lines)
+        stats["put"] += int(np.count_nonzero(~checked))
+        stats["get_valid"] += int(np.count_nonzero(gets & existed))
+        stats["get_invalid"] += int(np.count_nonzero(gets & ~existed))
+        stats["delete_valid"] += int(np.count_nonzero(deletes & existed))
+        stats["delete_invalid"] += int(np.count_nonzero(deletes & ~existed))
+        stats["filtered_out"] += int(np.count_nonzero(checked & ~existed))
+
+        # Objects exist after the batch exactly when their last PUT or DELETE is a PUT.
+        updates = np.flatnonzero(is_update)
+        last = np.ones(len(updates), dtype=bool)
+        last[:-1] = sorted_keys[updates[1:]] != sorted_keys[updates[:-1]]
+        updates = updates[last]
+        self._update(sorted_keys[updates], ops[updates] == self.PUT)
+        return keep
+
+    def _exists(self, keys):
+        """Whether each of the sorted keys exists after the batches seen so far."""
+        existed = id_codec.lookup_sorted(self.existing_keys, keys) >= 0
+        recent = id_codec.lookup_sorted(self.recent_keys, keys)
+        existed[recent >= 0] = self.recent_exists[recent[recent >= 0]]
+        return existed
+
+    def _update(self, keys, exists):
+        """
+        Record the state of the sorted, distinct keys after a batch.
+
+        Merging into recent_keys costs its length per batch, and folding it into
+        existing_keys the length of that; folding once recent_keys outgrows
+        sqrt(len(existing_keys) * TEXT_CHUNK_LINES) balances the two.
+        """
+        def merged(sorted_keys, values, keys, new_values):
+            unchanged = np.ones(len(sorted_keys), dtype=bool)
+            replaced = id_codec.lookup_sorted(sorted_keys, keys)
+            unchanged[replaced[replaced >= 0]] = False
+            merged_keys = np.concatenate([sorted_keys[unchanged], keys])
+            # Two sorted runs: the stable sort merges them in linear time.
+            order = np.argsort(merged_keys, kind='stable')
+            return merged_keys[order], np.concatenate([values[unchanged], new_values])[order]
+
+        self.recent_keys, self.recent_exists = merged(self.recent_keys, self.recent_exists, keys, exists)
+        if len(self.recent_keys) ** 2 > max(len(self.existing_keys), 1) * TEXT_CHUNK_LINES:
+            existing, exists = merged(self.existing_keys, np.ones(len(self.existing_keys), dtype=bool),
+                                      self.recent_keys, self.recent_exists)
+            self.existing_keys = existing[exists]
+            self.recent_keys = np.empty(0, dtype=np.uint64)
+            self.recent_exists = np.empty(0, dtype=bool)
+
+    def keep_records(self, records, trace):
+        if self.existing_indices is None:
+            self.existing_indices = bytearray(trace.id_count)
+        existing = self.existing_indices
+        kinds = [_operation_kind(name) for name in trace.op_names]
+        stats = self.stats
+        keep = np.ones(len(records), dtype=bool)
+        for i, (op, object_index) in enumerate(zip(records['op'].tolist(), records['object'].tolist())):
+            kind = kinds[op]
+            if kind == "PUT":
+                existing[object_index] = 1
+                stats["put"] += 1
+            elif kind == "DELETE":
+                if existing[object_index]:
+                    existing[object_index] = 0
+                    stats["delete_valid"] += 1
+                else:
+                    stats["delete_invalid"] += 1
+                    stats["filtered_out"] += 1
+                    keep[i] = False
+            elif kind == "GET":
+                if existing[object_index]:
+                    stats["get_valid"] += 1
+                else:
+                    stats["get_invalid"] += 1
+                    stats["filtered_out"] += 1
+                    keep[i] = False
+        stats["total"] += len(records)
+        return keep
+
+    def report(self):
+        stats = self.stats
+        print(f"Total lines processed: {stats['total']}")
+        print(f"Lines filtered out: {stats['filtered_out']}")
+        print(f"PUT operations: {stats['put']}")
+        print(f"Valid GET operations: {stats['get_valid']}")
+        print(f"Invalid GET operations (filtered out): {stats['get_invalid']}")
+        print(f"Valid DELETE operations: {stats['delete_valid']}")
+        print(f"Invalid DELETE operations (filtered out): {stats['delete_invalid']}")
+
+
+class OpTypeFilter(_LineFilter):
+    """Keep only lines whose method contains one of the given operation tokens, e.g. PUT or GET."""
+
+    def __init__(self, op_types):
+        self.name = f"keep {','.join(op_types)}"
+        self.op_types = tuple(op_types)
+        self.total = 0
+        self.removed = 0
+
+    def keep(self, fields):
+        self.total += 1
+        if len(fields) >= 2 and any(op_type in fields[1] for op_type in self.op_types):
+            return True
+        self.removed += 1
+        return False
+
+    def keep_records(self, records, trace):
+        keep = np.isin(records['op'], _matching_codes(trace, self.op_types))
+        self.total += len(records)
+        self.removed += len(records) - int(keep.sum())
+        return keep
+
+    def report(self):
+        print(f"Total lines processed: {self.total}")
+        print(f"Lines removed: {self.removed}")
+        print(f"Remaining lines: {self.total - self.removed}")
+
+
+class TimeWindowFilter(_LineFilter):
+    """Keep only lines whose millisecond timestamp lies in [start_ms, end_ms)."""
+
+    def __init__(self, start_ms=None, end_ms=None):
+        self.name = f"time window [{start_ms}, {end_ms})"
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.total = 0
+        self.removed = 0
+
+    def keep(self, fields):
+        self.total += 1
+        try:
+            timestamp = int(fields[0])
+        except (IndexError, ValueError):
+            self.removed += 1
+            return False
+        if (self.start_ms is not None and timestamp < self.start_ms) or \
+                (self.end_ms is not None and timestamp >= self.end_ms):
+            self.removed += 1
+            return False
+        return True
+
+    def keep_records(self, records, trace):
+        keep = np.ones(len(records), dtype=bool)
+        if self.start_ms is not None:
+            keep &= records['timestamp'] >= self.start_ms
+        if self.end_ms is not None:
+            keep &= records['timestamp'] < self.end_ms
+        self.total += len(records)
+        self.removed += len(records) - int(keep.sum())
+        return keep
+
+    def report(self):
+        print(f"Total lines processed: {self.total}")
+        print(f"Lines removed: {self.removed}")
+        print(f"Remaining lines: {self.total - self.removed}")
+
+
+class SizeRangeFilter(_LineFilter):
+    """Keep only lines whose object size lies in [min_size, max_size]; lines without a size pass through."""
+
+    def __init__(self, min_size=None, max_size=None):
+        self.name = f"size range [{min_size}, {max_size}]"
+        self.min_size = min_size
+        self.max_size = max_size
+        self.total = 0
+        self.removed = 0
+
+    def keep(self, fields):
+        self.total += 1
+        if len(fields) < 4:
+            return True
+        try:
+            size = int(fields[3])
+        except ValueError:
+            return True
+        if (self.min_size is not None and size < self.min_size) or \
+                (self.max_size is not None and size > self.max_size):
+            self.removed += 1
+            return False
+        return True
+
+    def keep_records(self, records, trace):
+        # Records without a valid size pass through, like lines without one.
+        sizes = records['size']
+        out_of_range = np.zeros(len(records), dtype=bool)
+        if self.min_size is not None:
+            out_of_range |= sizes < self.min_size
+        if self.max_size is not None:
+            out_of_range |= sizes > self.max_size
+        keep = ~out_of_range | (records['nfields'] < 4) | (sizes < 0)
+        self.total += len(records)
+        self.removed += len(records) - int(keep.sum())
+        return keep
+
+    def report(self):
+        print(f"Total lines processed: {self.total}")
+        print(f"Lines removed: {self.removed}")
+        print(f"Remaining lines: {self.total - self.removed}")
+
+
+def default_cleaning_chain():
+    """The filters of rm_head.py, rm_copy.py and rm_non_existing.py in the order they are usually run."""
+    return [MethodFilter("HEAD"), MethodFilter("COPY"), ExistenceFilter()]
+
+
+def _run_binary_pipeline(input_file, output_file, stages):
+    """Filter a binary trace chunk by chunk into a binary trace sharing its dictionary."""
+    trace = trace_format.BinaryTrace(input_file)
+    records = trace.records
+    with trace_format.TraceWriter(output_file, op_names=trace.op_names, object_ids=trace.object_ids,
+                                  meta={'source': os.path.basename(input_file)}) as writer:
+        for chunk_start in range(0, len(records), trace_format.ITER_CHUNK):
+            chunk = records[chunk_start:chunk_start + trace_format.ITER_CHUNK]
+            mask = np.ones(len(chunk), dtype=bool)
+            for stage in stages:
+                if not mask.any():
+                    break
+                mask[mask] = stage.keep_records(chunk[mask], trace)
+            writer.write_records(chunk[mask])
+
+
+def _filter_batch(lines, groups):
+    """Run a batch of text lines through the stage groups; return the kept lines."""
+    fields = None
+    for batched, group in groups:
+        if batched:
+            if fields is None:
+                fields = [line.split() for line in lines]
+            for stage in group:
+                keep = stage.keep_lines(fields).tolist()
+                lines = [line for line, kept in zip(lines, keep) if kept]
+                fields = [line_fields for line_fields, kept in zip(fields, keep) if kept]
+            continue
+        kept_lines, kept_fields = [], []
+        for line, line_fields in zip(lines, fields if fields is not None else map(str.split, lines)):
+            for stage in group:
+                if not stage.keep(line_fields):
+                    break
+            else:
+                kept_lines.append(line)
+                kept_fields.append(line_fields)
+        lines, fields = kept_lines, kept_fields
+    return lines
+
+
+def _run_text_pipeline(input_file, output_file, stages):
+    """
+    Filter a text trace line by line, or, with batched stages, TEXT_CHUNK_LINES
+    lines at a time: runs of per-line stages stop at the first stage dropping a
+    line, batched stages decide all lines of the batch kept so far at once.
+    """
+    with open(input_file, 'r', buffering=IO_BUFFER_SIZE) as infile, \
+            open(output_file, 'w', buffering=IO_BUFFER_SIZE) as outfile:
+        if not any(stage.batched for stage in stages):
+            write = outfile.write
+            for line in infile:
+                fields = line.split()
+                for stage in stages:
+                    if not stage.keep(fields):
+                        break
+                else:
+                    write(line)
+            return
+        groups = [(batched, list(group)) for batched, group in groupby(stages, key=attrgetter('batched'))]
+        while True:
+            lines = list(islice(infile, TEXT_CHUNK_LINES))
+            if not lines:
+                break
+            outfile.writelines(_filter_batch(lines, groups))
+
+
+def run_pipeline(input_file, output_file, stages):
+    """
+    Stream a trace through the filter stages and write the kept lines.
+
+    Args:
+        input_file (str): Path to the input trace file, text or binary
+        output_file (str): Path to the output trace file, in the same format as the input
+        stages (list): Filter stages applied in order to every line
+
+    Returns:
+        bool: True if the trace was processed
+    """
+    try:
+        if trace_format.is_binary_trace(input_file):
+            _run_binary_pipeline(input_file, output_file, stages)
+        else:
+            _run_text_pipeline(input_file, output_file, stages)
+
+        print(f"Processing complete!")
+        for stage in stages:
+            if len(stages) > 1:
+                print(f"Stage '{stage.name}':")
+            stage.report()
+        print(f"Output written to: {output_file}")
+        return True
+
+    except FileNotFoundError:
+        print(f"Error: File '{input_file}' not found.")
+    except Exception as e:
+        print(f"Error processing file: {e}")
+    return False
+
+
+def default_output_file(input_file, suffix):
+    base, ext = os.path.splitext(input_file)
+    return f"{base}_{suffix}{ext}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Filter a trace file in a single pass')
+    parser.add_argument('input_file', help='Path to input trace file (text or binary)')
+    parser.add_argument('output_file', nargs='?', help='Path to output trace file (default: <input>_filtered)')
+    parser.add_argument('--rm_head', action='store_true', help='Remove HEAD operations')
+    parser.add_argument('--rm_copy', action='store_true', help='Remove COPY operations')
+    parser.add_argument('--rm_non_existing', action='store_true',
+                        help='Remove GET and DELETE operations on objects that do not exist')
+    parser.add_argument('--ops', help='Comma-separated operation types to keep, e.g. PUT,GET,DELETE')
+    parser.add_argument('--start_ms', type=int, help='Drop operations before this trace timestamp')
+    parser.add_argument('--end_ms', type=int, help='Drop operations at or after this trace timestamp')
+    parser.add_argument('--min_size', type=int, help='Drop operations on objects smaller than this many bytes')
+    parser.add_argument('--max_size', type=int, help='Drop operations on objects larger than this many bytes')
+
+    args = parser.parse_args()
+
+    # Stages run in a fixed order: slicing first, so the existence check sees the
+    # same operations that end up in the output, then cleaning.
+    stages = []
+    if args.ops:
+        stages.append(OpTypeFilter([op.strip() for op in args.ops.split(',') if op.strip()]))
+    if args.start_ms is not None or args.end_ms is not None:
+        stages.append(TimeWindowFilter(args.start_ms, args.end_ms))
+    if args.min_size is not None or args.max_size is not None:
+        stages.append(SizeRangeFilter(args.min_size, args.max_size))
+    if args.rm_head:
+        stages.append(MethodFilter("HEAD"))
+    if args.rm_copy:
+        stages.append(MethodFilter("COPY"))
+    if args.rm_non_existing:
+        stages.append(ExistenceFilter())
+    if not stages:
+        stages = default_cleaning_chain()
+
+    output_file = args.output_file or default_output_file(args.input_file, "filtered")
+    run_pipeline(args.input_file, output_file, stages)
+
+
+if __name__ == "__main__":
+    main()
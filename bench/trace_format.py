@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Trace Format - a compact, memory-mappable binary form of the IBM object store traces.
+
+A text trace line looks like:
+
+    <timestamp_ms> <operation> <object_id> [<size> [<range_start> <range_end>]]
+
+The binary form stores one fixed-width record per valid line (see RECORD_DTYPE),
+with operations as small integer codes and object ids interned into a dictionary.
+File layout:
+
+    header       HEADER struct, padded to RECORDS_ALIGN bytes
+    records      record_count x RECORD_DTYPE
+    dictionary   (id_count + 1) x uint64 offsets, then the concatenated ASCII ids
+    metadata     JSON with the operation names and conversion statistics
+
+Every bench tool accepts either form: iter_ops() yields the same TraceOp tuples for
+both, and tools that work on whole columns use BinaryTrace directly.
+"""
+
+import os
+import sys
+import json
+import struct
+import argparse
+from collections import namedtuple
+import numpy as np
+
+MAGIC = b'SWTRACE\0'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIIQQQQQQ')
+RECORDS_ALIGN = 64
+
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('size', '<i8'),         # -1 when the line has no valid size
+    ('range_start', '<i8'),  # -1 when the line has no range
+    ('range_end', '<i8'),
+    ('object', '<u4'),       # index into the object id dictionary
+    ('op', '<u2'),           # index into the operation name table
+    ('nfields', '<u2'),      # number of fields of the original line, capped at 6
+])
+
+# Operation codes are stable for the common operations; others are appended per file.
+DEFAULT_OP_NAMES = ['REST.PUT.OBJECT', 'REST.GET.OBJECT', 'REST.DELETE.OBJECT',
+                    'REST.HEAD.OBJECT', 'REST.COPY.OBJECT']
+OP_PUT, OP_GET, OP_DELETE, OP_HEAD, OP_COPY = range(5)
+
+CONVERT_CHUNK = 1 << 20
+ITER_CHUNK = 1 << 16
+
+# One trace operation; size and range fields are None when the line does not carry them
+TraceOp = namedtuple('TraceOp', ['timestamp', 'operation', 'object_id', 'size', 'range_start', 'range_end'])
+
+
+def _to_int(token):
+    try:
+        return int(token)
+    except ValueError:
+        return None
+
+
+def parse_line(line):
+    """
+    Parse one text trace line.
+
+    Returns:
+        TraceOp: The parsed operation, or None for lines with fewer than three
+        fields or a non-integer timestamp
+    """
+    return parse_fields(line.split())
+
+
+def parse_fields(parts):
+    """Parse the whitespace-separated fields of a text trace line; see parse_line()."""
+    if len(parts) < 3:
+        return None
+    timestamp = _to_int(parts[0])
+    if timestamp is None:
+        return None
+    size = _to_int(parts[3]) if len(parts) >= 4 else None
+    range_start = range_end = None
+    if len(parts) >= 6:
+        range_start = _to_int(parts[4])
+        range_end = _to_int(parts[5])
+    return TraceOp(timestamp, parts[1], parts[2], size, range_start, range_end)
+
+
+def is_binary_trace(path):
+    """Return True if path starts with the binary trace magic."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class BinaryTrace:
+    """Read-only view of a binary trace with the records memory-mapped."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            (magic, version, _, record_count, records_offset, ids_offset, id_count,
+             meta_offset, meta_length) = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a binary trace")
+            if version != FORMAT_VERSION:
+                raise ValueError(f"{path} has unsupported trace format version {version}")
+            f.seek(meta_offset)
+            self.meta = json.loads(f.read(meta_length))
+
+        self.op_names = self.meta['op_names']
+        self.id_count = id_count
+        self._ids_offset = ids_offset
+        self._object_ids = None
+        if record_count:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=records_offset,
+                                     shape=(record_count,))
+        else:
+            self.records = np.empty(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def object_ids(self):
+        """List of object id strings indexed by the records' 'object' field."""
+        if self._object_ids is None:
+            with open(self.path, 'rb') as f:
+                f.seek(self._ids_offset)
+                offsets = np.frombuffer(f.read(8 * (self.id_count + 1)), dtype='<u8')
+                blob = f.read(int(offsets[-1])) if self.id_count else b''
+            text = blob.decode('ascii')
+            self._object_ids = [text[offsets[i]:offsets[i + 1]] for i in range(self.id_count)]
+        return self._object_ids
+
+    def op_code(self, name):
+        """Operation code of name in this file, or -1 if the file has no such operation."""
+        try:
+            return self.op_names.index(name)
+        except ValueError:
+            return -1
+
+    def iter_ops(self, start=0, stop=None):
+        """Yield TraceOp tuples for records[start:stop], decoded in chunks."""
+        object_ids = self.object_ids
+        op_names = self.op_names
+        stop = len(self.records) if stop is None else stop
+        for chunk_start in range(start, stop, ITER_CHUNK):
+            chunk = self.records[chunk_start:min(chunk_start + ITER_CHUNK, stop)]
+            for timestamp, size, range_start, range_end, obj, op, nfields in chunk.tolist():
+                yield TraceOp(timestamp, op_names[op], object_ids[obj],
+                              size if nfields >= 4 and size >= 0 else None,
+                              range_start if nfields >= 6 and range_start >= 0 else None,
+                              range_end if nfields >= 6 and range_end >= 0 else None)
+
+
+class TraceWriter:
+    """
+    Stream records into a binary trace file.
+
+    Records are appended with write_records(); the dictionary and metadata are
+    written and the header is patched when the writer is closed.
+    """
+
+    def __init__(self, path, op_names=None, object_ids=None, meta=None):
+        self.path = path
+        self.op_names = list(op_names or DEFAULT_OP_NAMES)
+        self._op_codes = {name: code for code, name in enumerate(self.op_names)}
+        self.object_ids = list(object_ids or [])
+        self._id_index = None if object_ids else {}
+        self.meta = dict(meta or {})
+        self.record_count = 0
+        self.records_offset = -(-HEADER.size // RECORDS_ALIGN) * RECORDS_ALIGN
+        self._file = open(path, 'wb')
+        self._file.write(b'\0' * self.records_offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def op_code(self, name):
+        code = self._op_codes.get(name)
+        if code is None:
+            code = len(self.op_names)
+            self.op_names.append(name)
+            self._op_codes[name] = code
+        return code
+
+    def intern(self, object_id):
+        """Return the dictionary index of object_id, adding it if needed."""
+        if self._id_index is None:
+            self._id_index = {oid: index for index, oid in enumerate(self.object_ids)}
+        index = self._id_index.get(object_id)
+        if index is None:
+            index = len(self.object_ids)
+            self.object_ids.append(object_id)
+            self._id_index[object_id] = index
+        return index
+
+    def write_records(self, records):
+        records = np.ascontiguousarray(records, dtype=RECORD_DTYPE)
+        self._file.write(records.tobytes())
+        self.record_count += len(records)
+
+    def close(self):
+        if self._file is None:
+            return
+        f = self._file
+        ids_offset = f.tell()
+        encoded = [oid.encode('ascii') for oid in self.object_ids]
+        offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+        if encoded:
+            np.cumsum([len(oid) for oid in encoded], out=offsets[1:])
+        f.write(offsets.tobytes())
+        f.write(b''.join(encoded))
+
+        meta_offset = f.tell()
+        meta = dict(self.meta, op_names=self.op_names)
+        meta_bytes = json.dumps(meta).encode('utf-8')
+        f.write(meta_bytes)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, self.record_count, self.records_offset,
+                            ids_offset, len(encoded), meta_offset, len(meta_bytes)))
+        f.close()
+        self._file = None
+
+
+def iter_ops(path, on_invalid=None):
+    """
+    Yield TraceOp tuples from a text or binary trace.
+
+    Args:
+        path (str): Path to the trace file
+        on_invalid (callable): Called with each text line that cannot be parsed
+
+    Yields:
+        TraceOp: One tuple per valid operation, in file order
+    """
+    if is_binary_trace(path):
+        yield from BinaryTrace(path).iter_ops()
+        return
+    with open(path, 'r', buffering=1 << 20) as f:
+        for line in f:
+            op = parse_line(line)
+            if op is None:
+                if on_invalid is not None:
+                    on_invalid(line)
+                continue
+            yield op
+
+
+def convert(input_file, output_file):
+    """
+    Convert a text trace into the binary format.
+
+    Returns:
+        tuple: (records written, lines skipped)
+    """
+    skipped = 0
+    with TraceWriter(output_file, meta={'source': os.path.basename(input_file)}) as writer, \
+            open(input_file, 'r', buffering=1 << 20) as f:
+        columns = {name: [] for name in RECORD_DTYPE.names}
+        intern = writer.intern
+        op_code = writer.op_code
+
+        def flush():
+            records = np.empty(len(columns['timestamp']), dtype=RECORD_DTYPE)
+            for name, values in columns.items():
+                records[name] = values
+                values.clear()
+            writer.write_records(records)
+
+        for line in f:
+            parts = line.split()
+            op = parse_fields(parts)
+            if op is None:
+                skipped += 1
+                continue
+            nfields = min(len(parts), 6)
+            columns['timestamp'].append(op.timestamp)
+            columns['size'].append(-1 if op.size is None else op.size)
+            columns['range_start'].append(-1 if op.range_start is None else op.range_start)
+            columns['range_end'].append(-1 if op.range_end is None else op.range_end)
+            columns['object'].append(intern(op.object_id))
+            columns['op'].append(op_code(op.operation))
+            columns['nfields'].append(nfields)
+            if len(columns['timestamp']) >= CONVERT_CHUNK:
+                flush()
+        flush()
+        writer.meta['skipped_lines'] = skipped
+        return writer.record_count, skipped
+
+
+def dump(input_file, output_file=None):
+    """Write a binary trace back out as text, to output_file or stdout."""
+    trace = BinaryTrace(input_file)
+    out = open(output_file, 'w') if output_file else sys.stdout
+    try:
+        for op in trace.iter_ops():
+            fields = [str(op.timestamp), op.operation, op.object_id]
+            if op.size is not None:
+                fields.append(str(op.size))
+            if op.range_start is not None:
+                fields.extend((str(op.range_start), str(op.range_end)))
+            out.write(' '.join(fields) + '\n')
+    finally:
+        if output_file:
+            out.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert traces between the text and binary formats')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    convert_parser = subparsers.add_parser('convert', help='Convert a text trace to the binary format')
+    convert_parser.add_argument('input_file', help='Path to text trace file')
+    convert_parser.add_argument('output_file', nargs='?', help='Path to binary trace file (default: <input>.bin)')
+    dump_parser = subparsers.add_parser('dump', help='Print a binary trace as text')
+    dump_parser.add_argument('input_file', help='Path to binary trace file')
+    dump_parser.add_argument('output_file', nargs='?', help='Path to text output file (default: stdout)')
+    info_parser = subparsers.add_parser('info', help='Show the header of a binary trace')
+    info_parser.add_argument('input_file', help='Path to binary trace file')
+
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        output_file = args.output_file or args.input_file + '.bin'
+        records, skipped = convert(args.input_file, output_file)
+        print(f"Converted {records} operations ({skipped} invalid lines skipped) to {output_file}")
+    elif args.command == 'dump':
+        dump(args.input_file, args.output_file)
+    else:
+        trace = BinaryTrace(args.input_file)
+        print(f"Operations: {len(trace)}")
+        print(f"Distinct objects: {trace.id_count}")
+        print(f"Operation names: {trace.op_names}")
+        print(f"Metadata: {trace.meta}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ import volume_server_pb2_grpc
 from typing import Optional
 import requests
 import time
+import argparse
+import threading
 
 # Setup logging
 logging.basicConfig(
@@ -68,12 +70,13 @@ class VolumeServerClient:
             logging.error(f"RPC error in vacuum_volume_check: {e}")
             raise
     
-    def vacuum_volume_compact(self, volume_id: int, preallocate: int = 0):
+    def vacuum_volume_compact(self, volume_id: int, preallocate: int = 0, timeout: Optional[int] = None):
         """Compact a volume and yield progress updates.
         
         Args:
             volume_id: The ID of the volume to compact
             preallocate: Size to preallocate for compaction
+            timeout: Deadline for the whole compaction stream, defaults to the client timeout
             
         Yields:
             tuple: (processed_bytes, load_avg_1m) for each update
@@ -85,7 +88,7 @@ class VolumeServerClient:
             )
             responses = self.stub.VacuumVolumeCompact(
                 request,
-                timeout=self.timeout
+                timeout=timeout if timeout is not None else self.timeout
             )
             
             for response in responses:
@@ -137,10 +140,50 @@ class VolumeServerClient:
 
 
 
+def vacuum_volume(client: VolumeServerClient, volume_id: int, garbage_ratio: float, volume_size: int,
+                  compact_timeout: int):
+    """Compact and commit one volume, logging every step for later correlation.
+    
+    Log lines use the form "Vacuum <event>: key=value ..." so analysis tools can
+    time-join them with the benchmark and garbage ratio logs.
+    
+    Args:
+        client: Client connected to the volume server holding the volume
+        volume_id: The ID of the volume to vacuum
+        garbage_ratio: Garbage ratio that triggered the vacuum
+        volume_size: Size of the volume in bytes before compaction
+        compact_timeout: Deadline in seconds for the compaction stream
+    """
+    logging.info(f"Vacuum start: volume={volume_id} garbage_ratio={garbage_ratio} size={volume_size}")
+    try:
+        for processed_bytes, load_avg_1m in client.vacuum_volume_compact(volume_id, timeout=compact_timeout):
+            logging.info(f"Vacuum compact: volume={volume_id} processed_bytes={processed_bytes} "
+                         f"load_avg_1m={load_avg_1m:.2f}")
+        is_read_only, committed_size = client.vacuum_volume_commit(volume_id)
+        logging.info(f"Vacuum commit: volume={volume_id} is_read_only={is_read_only} volume_size={committed_size}")
+    except grpc.RpcError as e:
+        logging.error(f"Vacuum of volume {volume_id} failed, cleaning up: {e}")
+        try:
+            client.vacuum_volume_cleanup(volume_id)
+            logging.info(f"Vacuum cleanup: volume={volume_id}")
+        except grpc.RpcError:
+            pass
+
+
 def main():
-    ip_addr = '10.111.6.13'
-    server_address = ip_addr+':18081'
-    status_url = "http://"+ip_addr+':8081'+"/status"
+    parser = argparse.ArgumentParser(description='Probe volume garbage ratios and optionally vacuum volumes.')
+    parser.add_argument('--ip', default='10.111.6.13', help='Volume server IP address')
+    parser.add_argument('--http_port', type=int, default=8081, help='Volume server HTTP port')
+    parser.add_argument('--grpc_port', type=int, default=18081, help='Volume server gRPC port')
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between probes')
+    parser.add_argument('--vacuum_threshold', type=float, default=None,
+                        help='Compact and commit a volume once its garbage ratio exceeds this value')
+    parser.add_argument('--compact_timeout', type=int, default=3600, help='Deadline in seconds for one compaction')
+    args = parser.parse_args()
+
+    server_address = f"{args.ip}:{args.grpc_port}"
+    status_url = f"http://{args.ip}:{args.http_port}/status"
+    vacuum_thread = None
 
     with VolumeServerClient(server_address) as client:
         while True:
@@ -156,6 +199,7 @@ def main():
                     logging.info("No volumes found in the service status.")
                 else:
                     garbage_ratios = {}
+                    volume_sizes = {}
                     for volume in volumes:
                         volume_id = volume.get("Id")
                         if volume_id is None:
@@ -163,12 +207,26 @@ def main():
                             continue
                         garbage_ratio = client.vacuum_volume_check(volume_id)
                         garbage_ratios[volume_id] = garbage_ratio
+                        volume_sizes[volume_id] = volume.get("Size", 0)
                     logging.info(f"Volumes: {garbage_ratios}")
 
+                    # Vacuum one volume at a time in the background so probing continues during compaction.
+                    if args.vacuum_threshold is not None and (vacuum_thread is None or not vacuum_thread.is_alive()):
+                        candidates = [vid for vid, ratio in garbage_ratios.items() if ratio > args.vacuum_threshold]
+                        if candidates:
+                            volume_id = max(candidates, key=garbage_ratios.get)
+                            vacuum_thread = threading.Thread(
+                                target=vacuum_volume,
+                                args=(client, volume_id, garbage_ratios[volume_id], volume_sizes[volume_id],
+                                      args.compact_timeout),
+                                daemon=True
+                            )
+                            vacuum_thread.start()
+
             except Exception as e:
                 logging.error(f"Error during processing: {e}")
-            # Wait for one second before the next probe.
-            time.sleep(1)
+            # Wait before the next probe.
+            time.sleep(args.interval)
 
 if __name__ == '__main__':
     main()